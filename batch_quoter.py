@@ -0,0 +1,181 @@
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+from web3 import Web3
+from multicall import Multicall, gas_capped_batch_size
+from state_store import get_state_store, write_json_atomic
+from bsc_provider import get_web3
+from token_graph import (MIXED_ROUTE_QUOTER_ABI, MIXED_ROUTE_QUOTER_ADDRESS, QUOTE_CALL_GAS_LIMIT,
+                         resolve_token, route_path)
+
+# QuoterV2合约地址 (BSC主网)
+QUOTER_V2_ADDRESS = "0xB048Bbc1Ee6b733FFfCFb9e9CeF7375518e25997"
+
+# 加载QuoterV2 ABI
+with open("ABI/QuoterV2.json", "r") as f:
+    QUOTER_V2_ABI = json.load(f)
+
+# 状态库中没有该交易对的池子时尝试的费率
+DEFAULT_FEE_TIERS = [100, 500, 2500, 10000]
+
+# 每次multicall打包的报价数量：报价需要模拟swap，按子调用gas上限拆分，使一批不超过节点的gas上限
+QUOTE_BATCH_SIZE = gas_capped_batch_size(QUOTE_CALL_GAS_LIMIT)
+
+Pair = Tuple[str, str]
+
+class BatchQuoter:
+    """把 交易对 × 数量 × 费率 的报价矩阵打包为multicall，在同一个区块执行
+
+    第一批确定区块号，其余批次固定在该区块上并行执行
+    """
+
+    def __init__(self, w3: Web3, multicall: Multicall = None, max_workers: int = 8):
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3, batch_size=QUOTE_BATCH_SIZE, call_gas_limit=QUOTE_CALL_GAS_LIMIT)
+        self.max_workers = max_workers
+        self.quoter = w3.eth.contract(address=Web3.to_checksum_address(QUOTER_V2_ADDRESS), abi=QUOTER_V2_ABI)
+        self.mixed_quoter = w3.eth.contract(address=Web3.to_checksum_address(MIXED_ROUTE_QUOTER_ADDRESS),
+                                            abi=MIXED_ROUTE_QUOTER_ABI)
+
+    def execute(self, calls: list, block_identifier="latest") -> Tuple[int, list]:
+        """执行全部报价调用，返回 (区块号, 结果)"""
+        batch_size = self.multicall.batch_size
+        block_number, results = self.multicall.aggregate(calls[:batch_size], block_identifier=block_identifier)
+        batches = [calls[start:start + batch_size] for start in range(batch_size, len(calls), batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for _, batch_results in executor.map(
+                        lambda batch: self.multicall.aggregate(batch, block_identifier=block_number), batches):
+                    results.extend(batch_results)
+        return block_number, results
+
+    def pair_fees(self, token_in: str, token_out: str) -> List[int]:
+        """状态库中该交易对已有池子的费率，没有记录时返回所有默认费率"""
+        fees = sorted({pool["fee"] for pool in get_state_store().get_pair_pools(token_in, token_out)})
+        return fees or DEFAULT_FEE_TIERS
+
+    def quote_matrix(self, pairs: List[Pair], amounts: Union[List[int], Dict[Pair, List[int]]],
+                     fees: List[int] = None, block_identifier="latest") -> Dict[Pair, Dict]:
+        """批量获取每个交易对在每个数量和费率下的QuoterV2报价，并计算滑点曲线
+
+        Args:
+            pairs: [(token_in, token_out), ...]
+            amounts: 所有交易对共用的输入数量列表（最小单位），或按交易对指定 {pair: [数量, ...]}
+            fees: 报价的费率，默认使用状态库中该交易对已有池子的费率
+            block_identifier: 报价所在的区块
+
+        Returns:
+            {pair: slippage_curve(...) 的结果}
+        """
+        pairs = [(Web3.to_checksum_address(a), Web3.to_checksum_address(b)) for a, b in pairs]
+        if isinstance(amounts, dict):
+            amounts = {(Web3.to_checksum_address(a), Web3.to_checksum_address(b)): v for (a, b), v in amounts.items()}
+
+        calls, keys = [], []
+        for pair in pairs:
+            pair_amounts = sorted(amounts[pair] if isinstance(amounts, dict) else amounts)
+            for fee in fees or self.pair_fees(*pair):
+                for amount in pair_amounts:
+                    calls.append(self.quoter.functions.quoteExactInputSingle((pair[0], pair[1], amount, fee, 0)))
+                    keys.append((pair, fee, amount))
+
+        block_number, results = self.execute(calls, block_identifier)
+
+        quotes: Dict[Pair, Dict[int, Dict[int, Optional[int]]]] = {pair: {} for pair in pairs}
+        for (pair, fee, amount), result in zip(keys, results):
+            quotes[pair].setdefault(fee, {})[amount] = result[0] if result else None
+        return {pair: slippage_curve(block_number, fee_quotes) for pair, fee_quotes in quotes.items()}
+
+    def quote_routes(self, routes: List[Dict], amounts: List[int], block_identifier="latest") -> Tuple[int, List[Dict]]:
+        """用MixedRouteQuoterV1获取多条路径（TokenGraph.find_routes的结果）在多个数量下的报价
+
+        Returns:
+            (区块号, [{amount_in: amount_out}, ...])，与routes一一对应，失败的报价为None
+        """
+        amounts = sorted(amounts)
+        calls = [self.mixed_quoter.functions.quoteExactInput(*route_path(route), amount)
+                 for route in routes for amount in amounts]
+        block_number, results = self.execute(calls, block_identifier)
+        curves = []
+        for index in range(len(routes)):
+            route_results = results[index * len(amounts):(index + 1) * len(amounts)]
+            curves.append({amount: result[0] if result else None for amount, result in zip(amounts, route_results)})
+        return block_number, curves
+
+def slippage_curve(block_number: int, fee_quotes: Dict[int, Dict[int, Optional[int]]]) -> Dict:
+    """按输入数量汇总各费率的报价：每个数量取输出最多的费率，滑点相对最小数量的成交价计算
+
+    Returns:
+        {"block": 区块号, "quotes": {fee: {amount_in: amount_out}},
+         "curve": [{"amount_in", "amount_out", "fee", "price", "slippage"}, ...]}
+    """
+    amounts = sorted({amount for by_amount in fee_quotes.values() for amount in by_amount})
+    curve = []
+    reference_price = None
+    for amount in amounts:
+        candidates = [(by_amount.get(amount), fee) for fee, by_amount in fee_quotes.items()
+                      if by_amount.get(amount)]
+        if not candidates:
+            curve.append({"amount_in": amount, "amount_out": None, "fee": None, "price": None, "slippage": None})
+            continue
+        amount_out, fee = max(candidates)
+        price = amount_out / amount
+        if reference_price is None:
+            reference_price = price
+        curve.append({
+            "amount_in": amount,
+            "amount_out": amount_out,
+            "fee": fee,
+            "price": price,
+            "slippage": 1 - price / reference_price,
+        })
+    return {"block": block_number, "quotes": fee_quotes, "curve": curve}
+
+def main():
+    parser = argparse.ArgumentParser(description='批量获取交易对在不同数量下的报价和滑点曲线')
+    parser.add_argument('pairs', nargs='+', help='交易对，格式为 输入代币/输出代币，例如 CAKE/USDT')
+    parser.add_argument('--amounts', default='1,10,100,1000,10000',
+                        help='逗号分隔的输入数量（按输入代币精度换算）')
+    parser.add_argument('--fees', help='逗号分隔的费率，默认使用已有池子的费率')
+    parser.add_argument('--workers', type=int, default=8, help='并行执行multicall批次的线程数')
+    parser.add_argument('--output', help='把滑点曲线写入JSON文件')
+    args = parser.parse_args()
+
+    tokens = get_state_store().load_tokens()
+    pairs, amounts = [], {}
+    for text in args.pairs:
+        token_in, _, token_out = text.partition('/')
+        addresses = resolve_token(token_in, tokens), resolve_token(token_out, tokens)
+        if not all(addresses):
+            print(f"未找到交易对中的代币: {text}")
+            return
+        decimals = tokens.get(addresses[0], {}).get("decimals") or 18
+        pairs.append(addresses)
+        amounts[addresses] = [int(float(value) * 10 ** decimals) for value in args.amounts.split(',')]
+    fees = [int(fee) for fee in args.fees.split(',')] if args.fees else None
+
+    quoter = BatchQuoter(get_web3(), max_workers=args.workers)
+    curves = quoter.quote_matrix(pairs, amounts, fees)
+
+    output = {}
+    for text, pair in zip(args.pairs, pairs):
+        result = curves[pair]
+        decimals_in = tokens.get(pair[0], {}).get("decimals") or 18
+        decimals_out = tokens.get(pair[1], {}).get("decimals") or 18
+        print(f"\n{text} (区块 {result['block']})")
+        print(f"{'输入数量':>16}{'输出数量':>22}{'费率':>8}{'滑点':>10}")
+        for point in result["curve"]:
+            if point["amount_out"] is None:
+                print(f"{point['amount_in'] / 10 ** decimals_in:>16g}{'无报价':>22}")
+                continue
+            print(f"{point['amount_in'] / 10 ** decimals_in:>16g}{point['amount_out'] / 10 ** decimals_out:>22.6f}"
+                  f"{point['fee'] / 10000:>7}%{point['slippage'] * 100:>9.2f}%")
+        output[text] = {"block": result["block"], "curve": result["curve"]}
+
+    if args.output:
+        write_json_atomic(args.output, output, indent=2)
+        print(f"\n滑点曲线已保存到 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+import requests
+from rpc_replay import ReplayServer, RpcRecording
+
+# 仓库目录（脚本按相对路径加载ABI，每个流程在临时目录中运行并链接ABI目录）
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 默认录制文件和报告目录
+BENCHMARK_DIR = "benchmarks"
+DEFAULT_RECORDING = os.path.join(BENCHMARK_DIR, "rpc_recording.json")
+
+# 复制到临时目录的数据文件，状态库首次创建时从中导入
+DATA_FILES = ["bsc_tokens.json", "known_pools.json"]
+
+# get_pool_info使用的交易对
+WBNB = "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c"
+USDT = "0x55d398326f99059fF775485246999027B3197955"
+
+def config_path(recording_path: str) -> str:
+    return f"{recording_path}.config.json"
+
+def build_pipelines(config: Dict) -> Dict[str, List[str]]:
+    """各流程的命令行，区块范围在录制时固定下来"""
+    head = config["head"]
+    monitor_args = ["--start-block", str(head - config["monitor_blocks"] + 1), "--stop-block", str(head)]
+    return {
+        "pool_scan": [sys.executable, os.path.join(REPO_DIR, "get_pancakeswap_v3_pools.py"), "--restart",
+                      "--from-block", str(head - config["pool_scan_blocks"]), "--to-block", str(head)],
+        "token_monitor": [sys.executable, os.path.join(REPO_DIR, "bsc_token_monitor.py")] + monitor_args,
+        "token_monitor_sharded": [sys.executable, os.path.join(REPO_DIR, "bsc_token_monitor.py"),
+                                  "--workers", str(config["workers"])] + monitor_args,
+        "pool_info": [sys.executable, "-c",
+                      f"from get_v3_pool_info import get_pool_info; get_pool_info('{WBNB}', '{USDT}')"],
+    }
+
+def run_pipeline(name: str, command: List[str], server: ReplayServer, timeout: float) -> Dict:
+    """在独立的临时目录中运行一个流程，返回请求数、耗时和峰值内存"""
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    os.symlink(os.path.join(REPO_DIR, "ABI"), os.path.join(work_dir, "ABI"))
+    for data_file in DATA_FILES:
+        if os.path.exists(os.path.join(REPO_DIR, data_file)):
+            shutil.copy(os.path.join(REPO_DIR, data_file), work_dir)
+    env = dict(os.environ, BSC_RPC_OVERRIDE=server.url, PYTHONPATH=REPO_DIR, PYTHONUNBUFFERED="1")
+    log_path = os.path.join(work_dir, "output.log")
+
+    server.reset_stats()
+    started = time.perf_counter()
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                   stdin=subprocess.DEVNULL)
+        deadline = started + timeout
+        status, rusage = 0, None
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.perf_counter() > deadline:
+                process.kill()
+                _, status, rusage = os.wait4(process.pid, 0)
+                break
+            time.sleep(0.05)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - started
+
+    stats = server.stats
+    result = {
+        "exit_code": process.returncode,
+        "wall_time": round(wall_time, 3),
+        "requests": stats["requests"],
+        "requests_per_second": round(stats["requests"] / wall_time, 2) if wall_time else 0,
+        "not_recorded": stats["not_recorded"],
+        "injected_errors": stats["injected_errors"],
+        "by_method": dict(stats["by_method"].most_common()),
+        # Linux上ru_maxrss的单位为KB，只包含该流程的主进程
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+    }
+    if process.returncode == 0:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    else:
+        result["log"] = log_path
+    return result
+
+def record(upstream: str, recording_path: str, pool_scan_blocks: int, monitor_blocks: int,
+           workers: int, timeout: float):
+    """通过录制服务器运行所有流程，保存响应和固定的区块范围"""
+    head = int(requests.post(upstream, json={"jsonrpc": "2.0", "method": "eth_blockNumber", "params": [], "id": 1},
+                             timeout=30).json()["result"], 16)
+    config = {"head": head, "pool_scan_blocks": pool_scan_blocks, "monitor_blocks": monitor_blocks,
+              "workers": workers, "upstream": upstream,
+              "recorded_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+    os.makedirs(os.path.dirname(recording_path) or ".", exist_ok=True)
+    server = ReplayServer(RpcRecording(recording_path), upstream=upstream)
+    server.start()
+    try:
+        for name, command in build_pipelines(config).items():
+            print(f"录制 {name} ...")
+            result = run_pipeline(name, command, server, timeout)
+            print(f"  退出码 {result['exit_code']}，{result['requests']} 个请求，耗时 {result['wall_time']} 秒")
+            if "log" in result:
+                print(f"  运行失败，日志: {result['log']}")
+    finally:
+        server.stop()
+
+    with open(config_path(recording_path), "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"录制结果已保存到 {recording_path}")
+
+def replay(recording_path: str, latency_ms: float, jitter_ms: float, error_rate: float, error_kind: str,
+           timeout: float, only: List[str] = None, baseline: str = None) -> Dict:
+    """离线回放录制的响应并运行各流程，输出报告"""
+    with open(config_path(recording_path), "r") as f:
+        config = json.load(f)
+
+    report = {
+        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "recording": recording_path,
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate": error_rate,
+        "pipelines": {}
+    }
+    for name, command in build_pipelines(config).items():
+        if only and name not in only:
+            continue
+        # 每个流程使用新的回放状态，保证多次运行的结果一致
+        server = ReplayServer(RpcRecording(recording_path), latency_ms=latency_ms, jitter_ms=jitter_ms,
+                              error_rate=error_rate, error_kind=error_kind)
+        server.start()
+        try:
+            report["pipelines"][name] = run_pipeline(name, command, server, timeout)
+        finally:
+            server.stop()
+
+    previous = {}
+    if baseline and os.path.exists(baseline):
+        with open(baseline, "r") as f:
+            previous = json.load(f).get("pipelines", {})
+
+    print(f"\n{'流程':<24}{'退出码':>6}{'耗时(秒)':>12}{'请求数':>10}{'未录制':>8}{'峰值内存(MB)':>14}")
+    for name, result in report["pipelines"].items():
+        line = (f"{name:<24}{result['exit_code']:>6}{result['wall_time']:>12}{result['requests']:>10}"
+                f"{result['not_recorded']:>8}{result['peak_rss_mb']:>14}")
+        if name in previous:
+            old = previous[name]
+            line += (f"  (耗时 {result['wall_time'] - old['wall_time']:+.3f}秒, "
+                     f"请求 {result['requests'] - old['requests']:+d})")
+        print(line)
+        if "log" in result:
+            print(f"  运行失败，日志: {result['log']}")
+
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    report_path = os.path.join(BENCHMARK_DIR, f"report-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n报告已保存到 {report_path}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='基于录制RPC响应的离线流程基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='连接真实节点录制各流程的RPC响应')
+    record_parser.add_argument('--upstream', required=True, help='录制使用的节点URL')
+    record_parser.add_argument('--recording', default=DEFAULT_RECORDING, help='录制文件')
+    record_parser.add_argument('--pool-scan-blocks', type=int, default=20000, help='池子扫描的区块数')
+    record_parser.add_argument('--monitor-blocks', type=int, default=20, help='代币监控处理的区块数')
+    record_parser.add_argument('--workers', type=int, default=4, help='分片监控的工作进程数')
+    record_parser.add_argument('--timeout', type=float, default=1800, help='单个流程的超时（秒）')
+
+    run_parser = subparsers.add_parser('run', help='离线回放并输出报告')
+    run_parser.add_argument('--recording', default=DEFAULT_RECORDING, help='录制文件')
+    run_parser.add_argument('--latency-ms', type=float, default=0, help='每个请求注入的延迟（毫秒）')
+    run_parser.add_argument('--jitter-ms', type=float, default=0, help='额外的随机延迟上限（毫秒）')
+    run_parser.add_argument('--error-rate', type=float, default=0, help='注入错误的概率')
+    run_parser.add_argument('--error-kind', choices=['http429', 'rpc'], default='http429', help='注入的错误类型')
+    run_parser.add_argument('--only', nargs='+', help='只运行指定的流程')
+    run_parser.add_argument('--baseline', help='与之前的报告比较')
+    run_parser.add_argument('--timeout', type=float, default=600, help='单个流程的超时（秒）')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.upstream, args.recording, args.pool_scan_blocks, args.monitor_blocks, args.workers, args.timeout)
+    else:
+        replay(args.recording, args.latency_ms, args.jitter_ms, args.error_rate, args.error_kind,
+               args.timeout, args.only, args.baseline)
+
+if __name__ == "__main__":
+    main()
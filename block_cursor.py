@@ -0,0 +1,79 @@
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from hexbytes import HexBytes
+
+# 保留的最近区块数量，BSC的重组深度通常只有几个区块
+DEFAULT_DEPTH = 64
+
+class BlockCursor:
+    """跟踪已处理的区块，用最近区块哈希的环形缓冲区检测链重组
+
+    每个区块处理后连同它的统计结果一起压入缓冲区；下一个区块的parentHash与缓冲区末尾的哈希不一致时，
+    说明末尾区块已被重组掉，调用rollback取回它的统计结果并撤销，然后重新处理该高度
+    """
+
+    def __init__(self, start_block: int, depth: int = DEFAULT_DEPTH,
+                 checkpoint_blocks: int = 20, checkpoint_seconds: float = 60.0):
+        """
+        Args:
+            start_block: 最后一个已处理的区块号，从start_block + 1开始处理
+            depth: 环形缓冲区保留的区块数量，超过该深度的重组无法回滚
+            checkpoint_blocks: 每处理多少个区块触发一次检查点
+            checkpoint_seconds: 距上次检查点超过多少秒触发一次检查点
+        """
+        self.depth = depth
+        self.recent: Deque[Tuple[int, HexBytes, Dict]] = deque(maxlen=depth)
+        self.start_block = start_block
+        self.checkpoint_blocks = checkpoint_blocks
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_block = start_block
+        self.checkpoint_time = time.time()
+        self.rolled_back_blocks = 0
+
+    @property
+    def last_block(self) -> int:
+        """最后一个已处理的区块号"""
+        return self.recent[-1][0] if self.recent else self.start_block
+
+    @property
+    def next_block(self) -> int:
+        return self.last_block + 1
+
+    @property
+    def confirmed_block(self) -> int:
+        """已离开环形缓冲区、不会再被回滚的最高区块号"""
+        return self.last_block - self.depth
+
+    def is_child(self, block) -> bool:
+        """判断区块是否接在最后一个已处理区块之后，缓冲区为空时无法判断，视为连续"""
+        if not self.recent:
+            return True
+        _, last_hash, _ = self.recent[-1]
+        return HexBytes(block["parentHash"]) == last_hash
+
+    def push(self, block, data: Dict):
+        """记录已处理的区块及其统计结果"""
+        self.recent.append((block["number"], HexBytes(block["hash"]), data))
+
+    def rollback(self) -> Optional[Tuple[int, HexBytes, Dict]]:
+        """移除最后一个已处理的区块，返回 (区块号, 哈希, 统计结果)"""
+        if not self.recent:
+            return None
+        number, block_hash, data = self.recent.pop()
+        if not self.recent:
+            # 缓冲区已清空，从被移除区块的上一个区块继续（更深的重组无法检测）
+            self.start_block = number - 1
+        self.rolled_back_blocks += 1
+        return number, block_hash, data
+
+    def should_checkpoint(self) -> bool:
+        """是否已经处理了足够多的区块或经过了足够长的时间"""
+        if self.last_block <= self.checkpoint_block:
+            return False
+        return (self.last_block - self.checkpoint_block >= self.checkpoint_blocks
+                or time.time() - self.checkpoint_time >= self.checkpoint_seconds)
+
+    def mark_checkpoint(self):
+        self.checkpoint_block = self.last_block
+        self.checkpoint_time = time.time()
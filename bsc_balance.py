@@ -1,7 +1,7 @@
 from web3 import Web3
-import json
-import requests
-from decimal import Decimal
+from wallet_snapshot import get_portfolio_snapshot
+from bsc_provider import get_web3
+from price_table import get_price_table
 
 # BSC RPC节点
 BSC_RPC = "https://bsc-dataseed.binance.org/"
@@ -16,48 +16,46 @@ TOKENS = {
     "AIOT": "0x55ad16Bd573B3365f43A9dAeB0Cc66A73821b4a5",  # 转换为小写以通过校验
 }
 
-def get_token_balance(token_address, wallet_address):
+def get_token_balances(token_addresses, wallet_address, w3=None):
+    """一次multicall查询钱包的多个代币余额，返回 {代币地址: 余额}，失败时返回None"""
     # 创建Web3实例
-    w3 = Web3(Web3.HTTPProvider(BSC_RPC))
-
-    # 检查连接
-    if not w3.is_connected():
-        print("无法连接到BSC网络")
-        return None
-
-    # 如果是BNB，直接获取余额
-    if token_address == "0x0000000000000000000000000000000000000000":
-        balance = w3.eth.get_balance(wallet_address)
-        return w3.from_wei(balance, 'ether')
-
-    # 代币ABI - 只包含balanceOf函数
-    token_abi = json.loads('[{"constant":true,"inputs":[{"name":"_owner","type":"address"}],"name":"balanceOf","outputs":[{"name":"balance","type":"uint256"}],"type":"function"}]')
-
-    # 创建代币合约实例
-    token_contract = w3.eth.contract(address=token_address, abi=token_abi)
+    w3 = w3 or get_web3(BSC_RPC)
 
     try:
-        # 获取代币余额
-        balance = token_contract.functions.balanceOf(wallet_address).call()
-
-        # 获取代币精度
-        decimals_abi = json.loads('[{"constant":true,"inputs":[],"name":"decimals","outputs":[{"name":"","type":"uint8"}],"type":"function"}]')
-        decimals_contract = w3.eth.contract(address=token_address, abi=decimals_abi)
-        decimals = decimals_contract.functions.decimals().call()
-
-        # 转换余额为可读格式
-        return Decimal(balance) / Decimal(10 ** decimals)
+        snapshot = get_portfolio_snapshot(w3, [wallet_address], token_addresses)
+        return snapshot['balances'][Web3.to_checksum_address(wallet_address)]
     except Exception as e:
         print(f"获取代币余额时出错: {e}")
         return None
 
+def get_token_balance(token_address, wallet_address):
+    balances = get_token_balances([token_address], wallet_address)
+    if balances is None:
+        return None
+    return balances[Web3.to_checksum_address(token_address)]
+
 def main():
     print(f"正在查询钱包地址 {WALLET_ADDRESS} 的BSC代币余额...\n")
 
+    balances = get_token_balances(list(TOKENS.values()), WALLET_ADDRESS)
+    if balances is None:
+        return
+
+    # 从价格表读取美元价格，没有价格的代币只显示余额
+    price_table = get_price_table(get_web3(BSC_RPC))
+    total_usd = 0.0
     for token_name, token_address in TOKENS.items():
-        balance = get_token_balance(token_address, WALLET_ADDRESS)
-        if balance is not None:
+        balance = balances[Web3.to_checksum_address(token_address)]
+        if balance is None:
+            continue
+        value = price_table.value_usd(token_address, balance)
+        if value is None:
             print(f"{token_name}: {balance:,.8f}")
+            continue
+        total_usd += value
+        print(f"{token_name}: {balance:,.8f} (${value:,.2f})")
+
+    print(f"\n总价值: ${total_usd:,.2f}")
 
 if __name__ == "__main__":
     main()
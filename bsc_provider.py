@@ -0,0 +1,81 @@
+import json
+import os
+from typing import Dict, List
+from web3 import Web3
+from call_cache import CallCache, construct_call_cache_middleware
+from state_store import get_state_store
+from rpc_metrics import get_rpc_metrics, instrument_web3, with_size_hook
+
+# 默认BSC节点
+DEFAULT_BSC_NODE = "https://bsc-dataseed.binance.org/"
+
+# test_bsc_nodes.py --benchmark 写出的节点评分文件
+BENCHMARK_FILE = "node_benchmark.json"
+
+# 设置后所有脚本都连接到该节点（例如rpc_replay.py的回放服务器）
+RPC_OVERRIDE = os.environ.get("BSC_RPC_OVERRIDE")
+
+# 设置后eth_call缓存同时写入该SQLite文件，在多次运行之间复用（例如 call_cache.db）
+CALL_CACHE_DB = os.environ.get("BSC_CALL_CACHE_DB")
+
+# 进程内共享的Web3实例和调用缓存，按节点URL区分
+web3_instances: Dict[str, Web3] = {}
+call_cache: CallCache = None
+
+def get_call_cache() -> CallCache:
+    """获取进程内共享的eth_call缓存，池子基本属性只对状态库中的池子永久缓存"""
+    global call_cache
+    if call_cache is None:
+        call_cache = CallCache(disk_path=CALL_CACHE_DB,
+                               pool_loader=lambda: [pool["pool"] for pool in get_state_store().load_pools()])
+    return call_cache
+
+def load_node_scores(path: str = BENCHMARK_FILE) -> Dict[str, float]:
+    """读取基准测试评分 {url: score}，分数越小越好，没有结果文件时返回空字典"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            nodes = json.load(f).get("nodes", {})
+    except Exception as e:
+        print(f"读取节点基准测试结果失败: {str(e)}")
+        return {}
+    return {url: r["score"] for url, r in nodes.items() if r.get("status") == "成功" and r.get("score") is not None}
+
+def resolve_node_url(url: str) -> str:
+    """设置了BSC_RPC_OVERRIDE环境变量时返回覆盖的节点"""
+    return RPC_OVERRIDE or url
+
+def rank_node_urls(urls: List[str], path: str = BENCHMARK_FILE) -> List[str]:
+    """按基准测试评分排序节点，没有评分的节点排在后面并保持原顺序"""
+    if RPC_OVERRIDE:
+        return [RPC_OVERRIDE]
+    scores = load_node_scores(path)
+    return sorted(urls, key=lambda url: (url not in scores, scores.get(url, 0)))
+
+def get_best_node_url(default: str = DEFAULT_BSC_NODE, path: str = BENCHMARK_FILE) -> str:
+    """返回评分最好的节点，没有基准测试结果时返回default"""
+    scores = load_node_scores(path)
+    return min(scores, key=scores.get) if scores else default
+
+def get_web3(url: str = None, timeout: int = 30, cache: bool = True) -> Web3:
+    """获取连接指定节点的共享Web3实例
+
+    Args:
+        url: 节点URL，默认使用基准测试评分最好的节点
+        timeout: 请求超时（秒）
+        cache: 是否启用eth_call结果缓存
+    """
+    url = resolve_node_url(url or get_best_node_url())
+    key = f"{url}|{cache}"
+    if key not in web3_instances:
+        w3 = Web3(Web3.HTTPProvider(url, request_kwargs=with_size_hook({'timeout': timeout})))
+        if cache:
+            # 放在内层，validation中间件发出的eth_chainId请求也会经过缓存
+            on_hit = lambda method: get_rpc_metrics().record_cache_hit(method, url)
+            w3.middleware_onion.inject(construct_call_cache_middleware(get_call_cache(), on_hit),
+                                       name="call_cache", layer=0)
+        # 统计中间件在最内层，只记录实际发往节点的请求
+        instrument_web3(w3, url)
+        web3_instances[key] = w3
+    return web3_instances[key]
@@ -1,13 +1,27 @@
 from web3 import Web3
-import json
 import time
-from typing import Dict, Set
+from typing import Dict, Set, List, Tuple
+from collections import Counter
 from datetime import datetime
 import sys
+import argparse
+import logging
 from web3.middleware import geth_poa_middleware
+from log_decoder import get_default_decoder
+from pool_export import export_block_counts, export_tokens
+from state_store import get_state_store
+from bsc_provider import get_web3
+from block_cursor import BlockCursor
+from token_shards import ShardedScanner, ThreadedScanner
+from rpc_metrics import get_rpc_metrics, profile_section
+from structured_log import get_logger, log_event
+from token_validator import VERDICT_OK, get_token_validator
+
+# BSC节点URL
+BSC_NODE_URL = 'https://bsc-dataseed1.binance.org/'
 
 # 连接到BSC节点
-w3 = Web3(Web3.HTTPProvider('https://bsc-dataseed1.binance.org/'))
+w3 = get_web3(BSC_NODE_URL)
 
 # 添加POA中间件
 w3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -17,47 +31,16 @@ if not w3.is_connected():
     print("无法连接到BSC节点，请检查网络连接")
     sys.exit(1)
 
-# 完整的ERC20 ABI
-ERC20_ABI = json.loads('''[
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "name",
-        "outputs": [{"name": "", "type": "string"}],
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "symbol",
-        "outputs": [{"name": "", "type": "string"}],
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "decimals",
-        "outputs": [{"name": "", "type": "uint8"}],
-        "type": "function"
-    },
-    {
-        "constant": true,
-        "inputs": [],
-        "name": "totalSupply",
-        "outputs": [{"name": "", "type": "uint256"}],
-        "type": "function"
-    },
-    {
-        "anonymous": false,
-        "inputs": [
-            {"indexed": true, "name": "from", "type": "address"},
-            {"indexed": true, "name": "to", "type": "address"},
-            {"indexed": false, "name": "value", "type": "uint256"}
-        ],
-        "name": "Transfer",
-        "type": "event"
-    }
-]''')
+# 落后最新区块超过该数量时进入追赶模式
+CATCH_UP_THRESHOLD = 50
+
+# 追赶模式每批处理的区块数
+CATCH_UP_BATCH_SIZE = 500
+
+# 状态库中的监控进度检查点名称
+CHECKPOINT_NAME = "token_monitor"
+
+logger = get_logger("token_monitor")
 
 # 已知的主要代币地址
 KNOWN_TOKENS = {
@@ -66,67 +49,81 @@ KNOWN_TOKENS = {
 # 存储发现的代币
 discovered_tokens: Dict[str, Dict] = {}
 
+# 未通过验证的代币（转账收费、转账失败或元数据异常），不记录出现次数
+rejected_tokens: Set[str] = set()
+
+# 尚未导出的每区块代币Transfer计数 [(block_number, {token_address: count})]
+pending_block_counts: List[Tuple[int, Dict[str, int]]] = []
+
+# 上次保存后新发现的代币和新增的出现次数，保存时以增量方式写入状态库
+new_tokens: Dict[str, Dict] = {}
+pending_counts: Counter = Counter()
+
 def load_existing_data():
     """
     加载已存在的数据
     """
     global discovered_tokens
-    try:
-        with open('bsc_tokens.json', 'r', encoding='utf-8') as f:
-            discovered_tokens = json.load(f)
-    except FileNotFoundError:
-        discovered_tokens = {}
+    discovered_tokens = get_state_store().load_tokens()
 
-def get_token_info(token_address: str) -> Dict:
+def get_token_infos(token_addresses: List[str]) -> Dict[str, Dict]:
     """
-    获取代币信息
+    批量验证并获取代币信息，未通过TokenValidator验证的代币不会返回
     """
     try:
-        # 创建代币合约实例
-        token_contract = w3.eth.contract(
-            address=Web3.to_checksum_address(token_address),
-            abi=ERC20_ABI
-        )
-
-        # 获取代币信息
-        try:
-            name = token_contract.functions.name().call()
-        except:
-            name = "Unknown"
-
-        try:
-            symbol = token_contract.functions.symbol().call()
-        except:
-            symbol = "Unknown"
-
-        try:
-            decimals = token_contract.functions.decimals().call()
-        except:
-            decimals = 18
-
-        try:
-            total_supply = token_contract.functions.totalSupply().call()
-        except:
-            total_supply = 0
-
-        return {
-            "name": name,
-            "symbol": symbol,
-            "decimals": decimals,
-            "total_supply": str(total_supply),
+        validator = get_token_validator(w3)
+        verdicts = validator.validate(token_addresses)
+        # 之前只保存了验证结果、没有元数据的代币重新读取一次
+        missing_metadata = [address for address, verdict in verdicts.items()
+                            if verdict['verdict'] == VERDICT_OK and verdict.get('symbol') is None]
+        if missing_metadata:
+            verdicts.update(validator.validate(missing_metadata, refresh=True))
+    except Exception as e:
+        print(f"验证代币失败 {token_addresses}: {str(e)}")
+        return {}
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    infos = {}
+    for token_address, verdict in verdicts.items():
+        if verdict['verdict'] != VERDICT_OK:
+            if token_address not in rejected_tokens:
+                rejected_tokens.add(token_address)
+                log_event(logger, logging.INFO, "token_rejected", "代币未通过验证",
+                          address=token_address, verdict=verdict['verdict'], reason=verdict.get('reason'))
+            continue
+        infos[token_address] = {
+            "name": verdict['name'],
+            "symbol": verdict['symbol'],
+            "decimals": verdict['decimals'],
+            "total_supply": str(verdict['total_supply']),
             "address": token_address,
-            "first_seen": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "first_seen": now,
             "count": 1,  # 初始化为1，因为发现时就是第一次出现
-            "last_seen": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "last_seen": now,
             "rank": 0  # 初始排名为0
         }
-    except Exception as e:
-        print(f"获取代币信息失败 {token_address}: {str(e)}")
-        return None
+    return infos
+
+def is_skipped_token(token_address: str) -> bool:
+    """代币未通过验证，或最近验证失败、尚未到重试时间"""
+    return token_address in rejected_tokens or get_token_validator(w3).retry_pending(token_address)
 
-def process_transaction(tx_hash: str):
+def get_token_info(token_address: str) -> Dict:
+    """
+    获取代币信息，未通过验证时返回None
+    """
+    return get_token_infos([token_address]).get(token_address)
+
+def log_new_token(token_address: str, token_info: Dict):
+    """记录新发现的代币"""
+    log_event(logger, logging.INFO, "new_token", "发现新代币",
+              address=token_address, name=token_info['name'], symbol=token_info['symbol'],
+              decimals=token_info['decimals'], total_supply=token_info['total_supply'],
+              first_seen=token_info['first_seen'], count=token_info['count'])
+
+def process_transaction(tx_hash: str, block_counts: Counter = None):
     """
-    处理交易
+    处理交易，block_counts用于累计本区块内每个代币的Transfer次数
     """
     try:
         # 获取交易收据
@@ -136,91 +133,205 @@ def process_transaction(tx_hash: str):
         if tx_receipt['status'] != 1:
             return
 
-        # 处理交易日志
-        for log in tx_receipt['logs']:
-            # 检查是否是Transfer事件
-            if len(log['topics']) > 0 and log['topics'][0].hex() == '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef':
-                token_address = log['address']
-
-                # 如果是新发现的代币
-                if token_address not in discovered_tokens and token_address not in KNOWN_TOKENS:
-                    token_info = get_token_info(token_address)
-                    if token_info:
-                        discovered_tokens[token_address] = token_info
-                        print(f"\n发现新代币:")
-                        print(f"名称: {token_info['name']}")
-                        print(f"符号: {token_info['symbol']}")
-                        print(f"地址: {token_address}")
-                        print(f"小数位: {token_info['decimals']}")
-                        print(f"总供应量: {token_info['total_supply']}")
-                        print(f"首次发现时间: {token_info['first_seen']}")
-                        print(f"出现次数: 1")
-                        print("-" * 50)
-
-                        # 保存到文件
+        # 一次遍历解码交易日志，只处理ERC20 Transfer事件
+        with profile_section("process_transaction"):
+            transfers = get_default_decoder().decode_receipt(tx_receipt, 'Transfer')
+        for log in transfers:
+            # PositionManager的NFT Transfer不是代币转账
+            if 'value' not in log['args']:
+                continue
+            token_address = log['address']
+            if block_counts is not None:
+                block_counts[token_address] += 1
+
+            # 如果是新发现的代币
+            if token_address in rejected_tokens:
+                continue
+            if token_address not in discovered_tokens and token_address not in KNOWN_TOKENS:
+                if is_skipped_token(token_address):
+                    continue
+                token_info = get_token_info(token_address)
+                if token_info:
+                    discovered_tokens[token_address] = token_info
+                    new_tokens[token_address] = token_info
+                    pending_counts[token_address] += 1
+                    log_new_token(token_address, token_info)
+
+                    # 保存到文件
+                    save_data_to_file()
+            else:
+                # 更新已知代币的出现次数
+                if token_address in discovered_tokens:
+                    discovered_tokens[token_address]['count'] += 1
+                    pending_counts[token_address] += 1
+                    discovered_tokens[token_address]['last_seen'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    # 每100次出现保存一次文件
+                    if discovered_tokens[token_address]['count'] % 100 == 0:
                         save_data_to_file()
-                else:
-                    # 更新已知代币的出现次数
-                    if token_address in discovered_tokens:
-                        discovered_tokens[token_address]['count'] += 1
-                        discovered_tokens[token_address]['last_seen'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        # 每100次出现保存一次文件
-                        if discovered_tokens[token_address]['count'] % 100 == 0:
-                            save_data_to_file()
 
     except Exception as e:
         print(f"处理交易失败 {tx_hash}: {str(e)}")
 
 def save_data_to_file():
     """
-    保存数据到文件，按出现次数排序
+    保存数据到状态库（增量写入，不会覆盖其他脚本的修改），并导出按出现次数排序的bsc_tokens.json
     """
     try:
-        # 将字典转换为列表并排序
-        sorted_tokens = sorted(
-            discovered_tokens.items(),
-            key=lambda x: x[1]['count'],
-            reverse=True
-        )
-
-        # 更新排名并转换回有序字典
-        sorted_dict = {}
-        for rank, (address, token_info) in enumerate(sorted_tokens, 1):
-            token_info['rank'] = rank
-            sorted_dict[address] = token_info
-
-        # 保存到文件
-        with open('bsc_tokens.json', 'w', encoding='utf-8') as f:
-            json.dump(sorted_dict, f, ensure_ascii=False, indent=2)
+        store = get_state_store()
+
+        # 新代币先以0次插入，出现次数统一通过增量累加
+        if new_tokens:
+            store.upsert_tokens({address: {**info, 'count': 0} for address, info in new_tokens.items()})
+            new_tokens.clear()
+        if pending_counts:
+            store.increment_token_counts(dict(pending_counts))
+            pending_counts.clear()
+
+        # 兼容旧格式，导出bsc_tokens.json
+        store.export_tokens_json()
     except Exception as e:
         print(f"保存文件失败: {str(e)}")
 
-def get_block_transactions(block_number: int) -> list:
+def flush_block_counts(up_to_block: int = None):
+    """把累计的每区块计数导出为列式分片，up_to_block用于只导出不会再被重组回滚的区块"""
+    ready = [entry for entry in pending_block_counts if up_to_block is None or entry[0] <= up_to_block]
+    if not ready:
+        return
+    try:
+        export_block_counts(ready)
+        del pending_block_counts[:len(ready)]
+    except Exception as e:
+        print(f"导出区块计数失败: {str(e)}")
+
+def process_block(block) -> Dict[str, int]:
     """
-    获取区块中的交易
+    处理区块中的交易，返回本区块每个代币的Transfer次数
     """
+    # 处理每个交易
+    block_counts = Counter()
+    for tx_hash in block['transactions']:
+        try:
+            process_transaction(tx_hash, block_counts)
+        except Exception as e:
+            print(f"处理交易 {tx_hash.hex()} 失败: {str(e)}")
+            continue
+
+    pending_block_counts.append((block['number'], dict(block_counts)))
+    return dict(block_counts)
+
+def apply_block_counts(block_number: int, block_counts: Dict[str, int]):
+    """把工作进程返回的区块计数增量合并到代币统计中（只在主进程中调用）"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # 本区块的新代币一次批量验证
+    new_addresses = [address for address in block_counts
+                     if address not in discovered_tokens and address not in KNOWN_TOKENS
+                     and not is_skipped_token(address)]
+    token_infos = get_token_infos(new_addresses) if new_addresses else {}
+    for token_address, count in block_counts.items():
+        if token_address in KNOWN_TOKENS or token_address in rejected_tokens:
+            continue
+        if token_address not in discovered_tokens:
+            token_info = token_infos.get(token_address)
+            if not token_info:
+                continue
+            token_info['count'] = count
+            discovered_tokens[token_address] = token_info
+            new_tokens[token_address] = token_info
+            log_new_token(token_address, token_info)
+        else:
+            discovered_tokens[token_address]['count'] += count
+            discovered_tokens[token_address]['last_seen'] = now
+        pending_counts[token_address] += count
+
+    pending_block_counts.append((block_number, dict(block_counts)))
+
+def process_blocks(cursor: BlockCursor, to_block: int):
+    """逐个处理新区块，父哈希不匹配时回滚上一个区块后重新处理该高度"""
+    while cursor.next_block <= to_block:
+        block = w3.eth.get_block(cursor.next_block)
+        if not cursor.is_child(block):
+            block_number, _, block_counts = cursor.rollback()
+            print(f"检测到链重组，回滚区块 {block_number}")
+            rollback_block(block_number, block_counts)
+            continue
+        cursor.push(block, process_block(block))
+
+def process_blocks_sharded(scanner, cursor: BlockCursor, to_block: int):
+    """由工作进程并行扫描区块，主进程按区块顺序检查重组并合并计数"""
+    for result in scanner.scan(range(cursor.next_block, to_block + 1)):
+        if not cursor.is_child(result):
+            block_number, _, block_counts = cursor.rollback()
+            print(f"检测到链重组，回滚区块 {block_number}")
+            rollback_block(block_number, block_counts)
+            # 剩余结果基于旧链，下一轮从回滚后的高度重新扫描
+            return
+        apply_block_counts(result['number'], result['counts'])
+        cursor.push(result, result['counts'])
+
+def save_checkpoint(cursor: BlockCursor):
+    """保存代币统计、导出已确认区块的计数，并记录监控进度"""
+    save_data_to_file()
+    flush_block_counts(cursor.confirmed_block)
     try:
-        # 获取区块信息
-        block = w3.eth.get_block(block_number)
-        if not block:
-            return []
+        get_state_store().set_checkpoint(CHECKPOINT_NAME, cursor.last_block)
+    except Exception as e:
+        print(f"保存监控进度失败: {str(e)}")
+    cursor.mark_checkpoint()
 
-        # 获取区块中的交易哈希
-        tx_hashes = block['transactions']
+def get_head(stop_block: int = None) -> int:
+    """最新区块号，指定了stop_block时不超过stop_block"""
+    head = w3.eth.block_number
+    return head if stop_block is None else min(head, stop_block)
 
-        # 处理每个交易
-        for tx_hash in tx_hashes:
-            try:
-                process_transaction(tx_hash)
-            except Exception as e:
-                print(f"处理交易 {tx_hash.hex()} 失败: {str(e)}")
-                continue
+def catch_up(scanner, cursor: BlockCursor, batch_size: int = CATCH_UP_BATCH_SIZE,
+             threshold: int = CATCH_UP_THRESHOLD, stop_block: int = None):
+    """分批并行处理积压的区块，直到落后最新区块不超过threshold个
 
-    except Exception as e:
-        print(f"获取区块 {block_number} 失败: {str(e)}")
-        return []
+    每批最多batch_size个区块，同时进行的请求数由scanner的工作数量限制
+    """
+    head = get_head(stop_block)
+    start_block = cursor.last_block
+    started = time.time()
+    print(f"落后最新区块 {head - cursor.last_block} 个，进入追赶模式（并发 {scanner.workers}）")
+
+    while head - cursor.last_block > threshold:
+        process_blocks_sharded(scanner, cursor, min(cursor.last_block + batch_size, head))
+        if cursor.should_checkpoint():
+            save_checkpoint(cursor)
+
+        head = get_head(stop_block)
+        elapsed = time.time() - started
+        speed = (cursor.last_block - start_block) / elapsed if elapsed > 0 else 0.0
+        lag = head - cursor.last_block
+        print(f"追赶进度: 区块 {cursor.last_block}，落后 {lag} 个区块，{speed:.1f} 区块/秒")
+
+    print(f"已追上最新区块，共处理 {cursor.last_block - start_block} 个区块，恢复跟踪最新区块")
+
+def rollback_block(block_number: int, block_counts: Dict[str, int]):
+    """撤销被重组掉的区块计入的出现次数（已保存的部分以负增量写回状态库）"""
+    for token_address, count in block_counts.items():
+        if token_address in discovered_tokens:
+            discovered_tokens[token_address]['count'] -= count
+            pending_counts[token_address] -= count
+
+    for index, (number, _) in enumerate(pending_block_counts):
+        if number == block_number:
+            del pending_block_counts[index]
+            break
 
 def main():
+    parser = argparse.ArgumentParser(description='监控BSC链上的代币交易')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='并行扫描区块的工作进程数，0表示在当前进程中逐笔处理交易')
+    parser.add_argument('--start-block', type=int, help='起始区块，默认从上次保存的进度继续')
+    parser.add_argument('--catch-up-threads', type=int, default=16,
+                        help='未使用工作进程时，追赶模式的并发请求数')
+    parser.add_argument('--max-rps', type=float, default=50, help='并行扫描区块时每秒最多请求数，0表示不限制')
+    parser.add_argument('--max-catch-up', type=int, default=100000,
+                        help='最多追赶的区块数，落后更多时跳过较早的区块')
+    parser.add_argument('--stop-block', type=int, help='处理完该区块后保存并退出')
+    args = parser.parse_args()
+
     print("开始监控BSC链上的代币交易...")
     print("按Ctrl+C停止监控")
     print("-" * 50)
@@ -237,24 +348,50 @@ def main():
         print(f"获取最新区块失败: {str(e)}")
         return
 
+    # 从指定区块或上次保存的进度继续
+    if args.start_block is not None:
+        last_block = args.start_block - 1
+    else:
+        last_block = get_state_store().get_checkpoint(CHECKPOINT_NAME) or latest_block
+    if latest_block - last_block > args.max_catch_up:
+        print(f"落后 {latest_block - last_block} 个区块，超过上限，跳过较早的区块")
+        last_block = latest_block - args.max_catch_up
+    print(f"从区块 {last_block + 1} 开始处理")
+
+    # 每处理20个区块或每60秒保存一次数据
+    cursor = BlockCursor(last_block, checkpoint_blocks=20, checkpoint_seconds=60)
+
+    scanner = None
+    if args.workers > 0:
+        scanner = ShardedScanner(BSC_NODE_URL, args.workers, args.max_rps)
+        print(f"使用 {scanner.workers} 个工作进程扫描区块")
+    catch_up_scanner = None
+
     try:
         while True:
             try:
+                if args.stop_block is not None and cursor.last_block >= args.stop_block:
+                    break
+
                 # 获取最新区块
-                current_block = w3.eth.block_number
+                current_block = get_head(args.stop_block)
 
-                if current_block > latest_block:
-                    print(f"\n处理区块 {latest_block + 1} 到 {current_block}")
+                if current_block - cursor.last_block > CATCH_UP_THRESHOLD:
+                    if scanner is None and catch_up_scanner is None:
+                        catch_up_scanner = ThreadedScanner(BSC_NODE_URL, args.catch_up_threads, args.max_rps)
+                    catch_up(scanner or catch_up_scanner, cursor, stop_block=args.stop_block)
+                    continue
 
-                    # 处理每个新区块
-                    for block_number in range(latest_block + 1, current_block + 1):
-                        get_block_transactions(block_number)
+                if current_block >= cursor.next_block:
+                    print(f"\n处理区块 {cursor.next_block} 到 {current_block}")
 
-                    latest_block = current_block
+                    if scanner is not None:
+                        process_blocks_sharded(scanner, cursor, current_block)
+                    else:
+                        process_blocks(cursor, current_block)
 
-                    # 每处理10个区块保存一次数据
-                    if (current_block - latest_block) % 10 == 0:
-                        save_data_to_file()
+                if cursor.should_checkpoint():
+                    save_checkpoint(cursor)
 
                 # 等待新区块
                 time.sleep(1)
@@ -265,9 +402,24 @@ def main():
                 continue
 
     except KeyboardInterrupt:
-        print("\n停止监控")
-        print(f"总共发现 {len(discovered_tokens)} 个代币")
-        save_data_to_file()
+        pass
+
+    print("\n停止监控")
+    for active_scanner in (scanner, catch_up_scanner):
+        if active_scanner is not None:
+            active_scanner.close()
+    print(f"总共发现 {len(discovered_tokens)} 个代币")
+    get_rpc_metrics().print_summary()
+    save_data_to_file()
+    flush_block_counts()
+    try:
+        get_state_store().set_checkpoint(CHECKPOINT_NAME, cursor.last_block)
+    except Exception as e:
+        print(f"保存监控进度失败: {str(e)}")
+    try:
+        export_tokens(discovered_tokens)
+    except Exception as e:
+        print(f"导出代币统计失败: {str(e)}")
 
 if __name__ == "__main__":
     main()
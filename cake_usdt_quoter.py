@@ -1,10 +1,13 @@
 from web3 import Web3
 from eth_typing import Address
-from typing import Tuple
+from typing import Optional, Tuple
 import json
+from bsc_provider import get_web3
+from multicall import Multicall
+from token_graph import TokenGraph, route_path
 
 # 连接到BSC网络
-w3 = Web3(Web3.HTTPProvider('https://bsc-dataseed4.binance.org/'))
+w3 = get_web3('https://bsc-dataseed4.binance.org/')
 
 # MixedRouteQuoterV1合约地址 (V3版本)
 QUOTER_ADDRESS = '0x678Aa4bF4E210cf2166753e054d5b7c31cc7fa86'
@@ -25,7 +28,8 @@ def get_quote_v3(
     token_out: str,
     amount_in: int,
     fee: int = 2500,  # 默认0.3%费率
-    sqrt_price_limit_x96: int = 0  # 0表示不限制价格
+    sqrt_price_limit_x96: int = 0,  # 0表示不限制价格
+    block_identifier="latest"  # 指定历史区块时需要归档节点
 ) -> Tuple[int, int, int, int]:
     """
     获取V3单一路径的报价
@@ -36,6 +40,7 @@ def get_quote_v3(
         amount_in: 输入代币数量（以最小单位计）
         fee: 交易费率（例如：3000表示0.3%）
         sqrt_price_limit_x96: 价格限制
+        block_identifier: 报价所在的区块
 
     返回:
         amount_out: 输出代币数量
@@ -54,7 +59,7 @@ def get_quote_v3(
     try:
         print(f"正在查询报价...")
         print(f"参数: {params}")
-        result = quoter_contract.functions.quoteExactInputSingleV3(params).call()
+        result = quoter_contract.functions.quoteExactInputSingleV3(params).call(block_identifier=block_identifier)
         return result
     except Exception as e:
         print(f"获取报价失败: {str(e)}")
@@ -64,6 +69,36 @@ def get_quote_v3(
         print(f"3. 交易对是否存在且具有足够的流动性")
         return None
 
+def get_quote_route(route: dict, amount_in: int, block_identifier="latest") -> Optional[int]:
+    """
+    获取多跳路径的报价
+
+    参数:
+        route: TokenGraph.find_routes 返回的路径
+        amount_in: 输入代币数量（以最小单位计）
+        block_identifier: 报价所在的区块
+
+    返回:
+        amount_out: 输出代币数量，失败时为None
+    """
+    path, flag = route_path(route)
+    try:
+        return quoter_contract.functions.quoteExactInput(path, flag, amount_in).call(block_identifier=block_identifier)[0]
+    except Exception as e:
+        print(f"获取路径报价失败: {str(e)}")
+        return None
+
+def find_best_route(token_in: str, token_out: str, amount_in: int, max_hops: int = 3, k: int = 3):
+    """在已知池子中搜索最多max_hops跳的路径，逐条链上报价，返回 (路径, 输出数量) 列表，按报价降序"""
+    graph = TokenGraph.from_state_store()
+    block_number = graph.refresh_state(Multicall(w3))
+    quotes = []
+    for route in graph.find_routes(token_in, token_out, amount_in, max_hops=max_hops, k=k):
+        amount_out = get_quote_route(route, amount_in, block_identifier=block_number)
+        if amount_out is not None:
+            quotes.append((graph.format_route(route), amount_out))
+    return sorted(quotes, key=lambda item: item[1], reverse=True)
+
 def main():
     # CAKE地址
     CAKE = "0x0E09FaBB73Bd3Ade0a17ECC321fD13a19e81cE82"
@@ -112,5 +147,10 @@ def main():
         print(f"跨越的tick数量: {ticks_crossed}")
         print(f"预估gas费用: {gas_estimate}")
 
+    # 多跳路径报价 (CAKE -> USDT)，直接池子之外还会经过WBNB等中间代币
+    print("\n搜索 CAKE -> USDT 多跳路径...")
+    for route, amount_out in find_best_route(CAKE, USDT, amount_in):
+        print(f"{route}: {amount_out / 10**18} USDT")
+
 if __name__ == "__main__":
     main()
@@ -1,5 +1,6 @@
 import math
 from decimal import Decimal, getcontext
+import numpy as np
 
 # 设置Decimal精度
 getcontext().prec = 28
@@ -75,6 +76,69 @@ def calculate_mint_amounts(
     
     return float(amount0), float(amount1)
 
+def calculate_mint_amounts_batch(
+    amount0_desired,
+    amount1_desired,
+    current_price,
+    price_lower,
+    price_upper,
+    fee=0.003
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    calculate_mint_amounts的向量化版本，一次计算整个参数网格
+
+    所有参数可以是标量或数组，按NumPy广播规则对齐；计算逻辑与标量版本一致，
+    使用float64代替Decimal，结果与标量版本的差异在浮点误差范围内
+
+    参数:
+    amount0_desired: 期望提供的token0数量数组
+    amount1_desired: 期望提供的token1数量数组
+    current_price: 当前价格数组 (token1/token0)
+    price_lower: 价格区间下限数组
+    price_upper: 价格区间上限数组
+    fee: 手续费比例 (默认0.3%)
+
+    返回:
+    (amount0, amount1): 实际需要提供的token0和token1数量数组
+    """
+    amount0_desired, amount1_desired, current_price, price_lower, price_upper, fee = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in
+          (amount0_desired, amount1_desired, current_price, price_lower, price_upper, fee))
+    )
+
+    below = current_price <= price_lower
+    above = current_price >= price_upper
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 当前价格在区间内：使用价格区间的几何平均数作为最优比例
+        optimal_ratio = np.sqrt(price_lower * price_upper)
+        amount0 = amount0_desired.copy()
+        amount1 = amount0 * optimal_ratio
+
+        # 如果计算出的amount1超过期望值，则使用amount1_desired计算
+        use_amount1 = amount1 > amount1_desired
+        amount1 = np.where(use_amount1, amount1_desired, amount1)
+        amount0 = np.where(use_amount1, amount1 / optimal_ratio, amount0)
+
+        # 验证计算出的数量是否在价格区间内，不在则调整到区间边界
+        actual_price = amount1 / amount0
+        too_low = actual_price < price_lower
+        too_high = actual_price > price_upper
+        amount0 = np.where(too_low, amount0_desired, amount0)
+        amount1 = np.where(too_low, amount0_desired * price_lower, amount1)
+        amount0 = np.where(too_high, amount1_desired / price_upper, amount0)
+        amount1 = np.where(too_high, amount1_desired, amount1)
+
+    # 当前价格低于区间只需要token0，高于区间只需要token1
+    amount0 = np.where(below, amount0_desired, np.where(above, 0.0, amount0))
+    amount1 = np.where(below, 0.0, np.where(above, amount1_desired, amount1))
+
+    # 考虑手续费
+    amount0 = amount0 * (1.0 - fee)
+    amount1 = amount1 * (1.0 - fee)
+
+    return amount0, amount1
+
 def get_valid_float_input(prompt: str) -> float:
     """
     获取有效的浮点数输入
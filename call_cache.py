@@ -0,0 +1,238 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+from eth_utils import function_signature_to_4byte_selector
+
+# 内存中最多保留的结果数量
+DEFAULT_MAX_ENTRIES = 100000
+
+# 磁盘层最多保留的结果数量，超出后按最近使用时间淘汰
+DEFAULT_MAX_DISK_ENTRIES = 1000000
+
+# 每写入多少条结果检查一次磁盘层大小
+DISK_PRUNE_INTERVAL = 1000
+
+# 最新区块号的缓存时间（秒），BSC出块间隔已低于1秒
+DEFAULT_HEAD_TTL = 0.5
+
+def selectors(signatures: Iterable[str]) -> Set[str]:
+    return {"0x" + function_signature_to_4byte_selector(s).hex() for s in signatures}
+
+# 对任意合约结果都不会随区块变化的函数（代币精度、工厂中已创建池子的地址）
+IMMUTABLE_SELECTORS = selectors([
+    "decimals()",
+    "getPool(address,address,uint24)",
+])
+
+# 只有V3池子上结果不变的函数，其他合约（例如转账收费代币的fee()）可能随时变化
+POOL_IMMUTABLE_SELECTORS = selectors([
+    "token0()",
+    "token1()",
+    "fee()",
+    "tickSpacing()",
+    "factory()",
+])
+
+# 零地址返回值（getPool在池子创建前返回零地址，不能永久缓存）
+ZERO_ADDRESS_RESULT = "0x" + "00" * 32
+
+# 这些区块标识的结果无法按区块号缓存
+UNPINNED_BLOCKS = {"pending", "safe", "finalized", "earliest"}
+
+class CallCache:
+    """eth_call结果缓存，按 (链ID, 目标合约, calldata, 区块) 的哈希寻址
+
+    - 固定在具体区块的调用永久缓存
+    - latest时的IMMUTABLE_SELECTORS调用、已知V3池子上的POOL_IMMUTABLE_SELECTORS调用忽略区块永久缓存；
+      固定在历史区块的同类调用仍按区块缓存（池子创建前getPool返回零地址）
+    - latest调用改写为当前最新区块号再发出，按该区块缓存
+    内存层按LRU淘汰；可选的SQLite磁盘层在多次运行之间复用，超过max_disk_entries时淘汰最久未使用的结果
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, disk_path: Optional[str] = None,
+                 max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES, head_ttl: float = DEFAULT_HEAD_TTL,
+                 pool_loader: Callable[[], Iterable[str]] = None):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.head_ttl = head_ttl
+        self.pool_loader = pool_loader
+        self.pool_addresses: Optional[Set[str]] = None
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.head_block: Optional[int] = None
+        self.head_checked_at = 0.0
+        self.disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.disk = None
+        if disk_path:
+            self.disk = sqlite3.connect(disk_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.disk.execute("PRAGMA journal_mode=WAL")
+            self.disk.execute("PRAGMA synchronous=NORMAL")
+            self.disk.execute(
+                "CREATE TABLE IF NOT EXISTS call_results (key TEXT PRIMARY KEY, result TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+            self.disk.execute("CREATE INDEX IF NOT EXISTS call_results_used_at ON call_results (used_at)")
+
+    @staticmethod
+    def make_key(chain_id: str, tx: Dict, block: Any) -> str:
+        """调用参数的内容哈希"""
+        payload = json.dumps([chain_id, {k: str(v).lower() for k, v in tx.items()}, block], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str, persistent: bool) -> Optional[str]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+            if persistent and self.disk is not None:
+                row = self.disk.execute("SELECT result FROM call_results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk.execute("UPDATE call_results SET used_at = ? WHERE key = ?", (time.time(), key))
+                    self.store(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: str, persistent: bool):
+        with self.lock:
+            self.store(key, result)
+            if persistent and self.disk is not None:
+                self.disk.execute("INSERT OR REPLACE INTO call_results (key, result, used_at) VALUES (?, ?, ?)",
+                                  (key, result, time.time()))
+                self.disk_writes += 1
+                if self.disk_writes % DISK_PRUNE_INTERVAL == 0:
+                    self.prune_disk()
+
+    def store(self, key: str, result: str):
+        """写入内存层并淘汰最久未使用的结果（调用方持有锁）"""
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def prune_disk(self):
+        """磁盘层超过上限时删除最久未使用的结果（调用方持有锁）"""
+        count = self.disk.execute("SELECT COUNT(*) FROM call_results").fetchone()[0]
+        if count > self.max_disk_entries:
+            self.disk.execute(
+                "DELETE FROM call_results WHERE key IN (SELECT key FROM call_results ORDER BY used_at LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+
+    def is_pool(self, address: str) -> bool:
+        """地址是否为已知的V3池子，首次调用时通过pool_loader加载"""
+        if self.pool_addresses is None:
+            self.pool_addresses = {a.lower() for a in self.pool_loader()} if self.pool_loader else set()
+        return address.lower() in self.pool_addresses
+
+    def current_head(self, make_request) -> Optional[int]:
+        """返回最新区块号，每head_ttl秒最多查询一次"""
+        now = time.time()
+        if self.head_block is None or now - self.head_checked_at >= self.head_ttl:
+            response = make_request("eth_blockNumber", [])
+            if "result" not in response:
+                return None
+            self.head_block = int(response["result"], 16)
+            self.head_checked_at = now
+        return self.head_block
+
+    def resolve(self, params, make_request, chain_id: str) -> Tuple[Optional[str], bool, Any]:
+        """计算eth_call的缓存键
+
+        Returns:
+            (key, 是否写入磁盘, 实际发出请求的params)，不可缓存时key为None；
+            latest调用的params会改写为固定在缓存键对应的区块
+        """
+        tx = params[0]
+        block = params[1] if len(params) > 1 else "latest"
+        if len(params) > 2 or not isinstance(tx, dict):
+            # 带state override的调用不缓存
+            return None, False, params
+
+        if block == "latest" and self.is_immutable(tx):
+            return self.make_key(chain_id, tx, "immutable"), True, params
+        if isinstance(block, dict) or (isinstance(block, str) and block.startswith("0x")):
+            return self.make_key(chain_id, tx, block), True, params
+        if isinstance(block, int):
+            return self.make_key(chain_id, tx, hex(block)), True, params
+        if block in UNPINNED_BLOCKS:
+            return None, False, params
+
+        head = self.current_head(make_request)
+        if head is None:
+            return None, False, params
+        return self.make_key(chain_id, tx, hex(head)), False, [tx, hex(head)]
+
+    def is_immutable(self, tx: Dict) -> bool:
+        """调用结果在合约创建后是否不再变化"""
+        data = str(tx.get("data") or tx.get("input") or "")[:10].lower()
+        return data in IMMUTABLE_SELECTORS or (data in POOL_IMMUTABLE_SELECTORS and self.is_pool(str(tx.get("to") or "")))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+def construct_call_cache_middleware(cache: CallCache, on_hit: Callable[[str], None] = None):
+    """创建eth_call缓存中间件，只缓存成功的调用结果，命中缓存时以方法名调用on_hit"""
+
+    def call_cache_middleware(make_request, w3):
+        # 链ID不会变化，每个连接只查询一次（web3每次合约调用前都会请求eth_chainId），同时作为缓存键的一部分
+        chain_id_response = None
+
+        def get_chain_id() -> Optional[Dict]:
+            nonlocal chain_id_response
+            if chain_id_response is None:
+                response = make_request("eth_chainId", [])
+                if "error" in response:
+                    return response
+                chain_id_response = response
+            return chain_id_response
+
+        def middleware(method, params):
+            if method == "eth_chainId":
+                cached = chain_id_response is not None
+                response = get_chain_id()
+                if cached and on_hit:
+                    on_hit(method)
+                return response
+            if method != "eth_call":
+                return make_request(method, params)
+
+            chain_id = get_chain_id().get("result")
+            if chain_id is None:
+                return make_request(method, params)
+            key, persistent, request_params = cache.resolve(params, make_request, str(chain_id))
+            if key is None:
+                return make_request(method, params)
+
+            result = cache.get(key, persistent)
+            if result is not None:
+                if on_hit:
+                    on_hit(method)
+                return {"jsonrpc": "2.0", "id": 0, "result": result}
+
+            response = make_request(method, request_params)
+            if "error" in response and request_params is not params:
+                # 负载均衡后的节点可能还没有该区块，退回原始的latest调用且不缓存
+                return make_request(method, params)
+            result = response.get("result")
+            if "error" not in response and isinstance(result, str):
+                # 池子尚未创建时getPool返回零地址、合约不存在时返回空结果，不能忽略区块永久缓存
+                immutable = persistent and (len(params) < 2 or params[1] == "latest")
+                if not (immutable and result in (ZERO_ADDRESS_RESULT, "0x")):
+                    cache.put(key, result, persistent)
+            return response
+
+        return middleware
+
+    return call_cache_middleware
@@ -0,0 +1,214 @@
+import argparse
+import json
+import math
+import time
+from typing import Dict, List, Tuple
+from web3 import Web3
+from multicall import Multicall, bind_call
+from tick_data import TickDataCache, tick_to_word
+from state_store import get_state_store, write_json_atomic
+from bsc_provider import get_web3
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# 默认计算的价格变动幅度
+DEFAULT_LEVELS = [0.005, 0.01, 0.02, 0.05, 0.1]
+
+# sqrtPriceX96的定点数基数
+Q96 = 2 ** 96
+
+# 每个tick对应的价格倍数的对数
+LOG_TICK_BASE = math.log(1.0001)
+
+def tick_sqrt_price(tick: int) -> float:
+    """tick对应的sqrt价格（未按精度换算）"""
+    return 1.0001 ** (tick / 2)
+
+def level_tick_range(current_tick: int, max_level: float) -> Tuple[int, int]:
+    """价格变动±max_level对应的tick范围"""
+    lower = current_tick + math.floor(math.log(1 - max_level) / LOG_TICK_BASE)
+    upper = current_tick + math.ceil(math.log(1 + max_level) / LOG_TICK_BASE)
+    return lower, upper
+
+def walk_liquidity(sqrt_price: float, liquidity: float, crossings: List[Tuple[float, int]],
+                   targets: List[float], upward: bool) -> List[Tuple[float, float]]:
+    """从当前价格沿一个方向推进到各目标价格，累计可成交的代币数量
+
+    Args:
+        crossings: 按推进方向排序的 (tick的sqrt价格, 穿过时的流动性变化)
+        targets: 按推进方向排序的目标sqrt价格
+        upward: 价格上涨时消耗token0，下跌时消耗token1
+
+    Returns:
+        [(累计代币数量, 到达目标时的活跃流动性), ...]，与targets一一对应
+    """
+    def segment(a: float, b: float) -> float:
+        return liquidity * (1 / a - 1 / b) if upward else liquidity * (a - b)
+
+    results = []
+    amount = 0.0
+    index = 0
+    for target in targets:
+        while index < len(crossings) and (crossings[index][0] <= target if upward else crossings[index][0] >= target):
+            boundary, delta = crossings[index]
+            amount += segment(sqrt_price, boundary)
+            sqrt_price = boundary
+            liquidity = max(liquidity + delta, 0.0)
+            index += 1
+        amount += segment(sqrt_price, target)
+        sqrt_price = target
+        results.append((amount, liquidity))
+    return results
+
+def compute_depth(ticks: List[Tuple[int, int, int]], current_tick: int, sqrt_price_x96: int,
+                  liquidity: int, levels: List[float]) -> List[Dict]:
+    """根据已初始化tick计算价格变动±x%时池子可提供的代币数量（最小单位）
+
+    amount0为价格上涨x%过程中可买出的token0，amount1为价格下跌x%过程中可买出的token1
+    """
+    levels = sorted(levels)
+    sqrt_price = sqrt_price_x96 / Q96
+    up_crossings = [(tick_sqrt_price(tick), net) for tick, net, _ in ticks if tick > current_tick]
+    # 向下穿过tick时流动性减去liquidityNet
+    down_crossings = [(tick_sqrt_price(tick), -net) for tick, net, _ in reversed(ticks) if tick <= current_tick]
+
+    up = walk_liquidity(sqrt_price, float(liquidity), up_crossings,
+                        [sqrt_price * math.sqrt(1 + level) for level in levels], upward=True)
+    down = walk_liquidity(sqrt_price, float(liquidity), down_crossings,
+                          [sqrt_price * math.sqrt(1 - level) for level in levels], upward=False)
+    return [
+        {
+            "move": level,
+            "amount0": int(amount0),
+            "amount1": int(amount1),
+            "liquidity_up": int(liquidity_up),
+            "liquidity_down": int(liquidity_down),
+        }
+        for level, (amount0, liquidity_up), (amount1, liquidity_down) in zip(levels, up, down)
+    ]
+
+class DepthProfiler:
+    """批量计算池子在±x%价格变动内的深度
+
+    一次multicall读取所有池子的slot0和liquidity，再把所有池子需要的tick位图word合并为一批
+    TickLens.getPopulatedTicksInWord调用（按gas上限拆分批次，固定在同一区块），word按池子缓存在TickDataCache中。
+    有word获取失败的池子不计算深度，记录在incomplete中
+    """
+
+    def __init__(self, w3: Web3, multicall: Multicall = None, tick_cache: TickDataCache = None,
+                 levels: List[float] = None):
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3)
+        self.tick_cache = tick_cache or TickDataCache(w3)
+        self.incomplete: List[str] = []
+        self.levels = sorted(levels or DEFAULT_LEVELS)
+        if not 0 < self.levels[-1] < 1:
+            raise ValueError("价格变动幅度必须在0到1之间")
+
+    def fetch_states(self, pools: List[Dict], block_identifier="latest") -> Tuple[int, Dict[str, Dict]]:
+        """批量读取池子的slot0和liquidity，返回 (区块号, {池子地址: 状态})"""
+        contract = self.w3.eth.contract(abi=POOL_ABI)
+        calls = []
+        for pool in pools:
+            calls.extend([bind_call(contract.functions.slot0(), pool["pool"]),
+                          bind_call(contract.functions.liquidity(), pool["pool"])])
+        block_number, results = self.multicall.aggregate(calls, block_identifier=block_identifier)
+
+        states = {}
+        for index, pool in enumerate(pools):
+            slot0, liquidity = results[2 * index], results[2 * index + 1]
+            if slot0 is None or not slot0[0]:
+                continue
+            states[Web3.to_checksum_address(pool["pool"])] = {
+                "sqrt_price_x96": slot0[0],
+                "tick": slot0[1],
+                "liquidity": liquidity or 0,
+                "tick_spacing": pool["tickSpacing"],
+            }
+        return block_number, states
+
+    def profile_pools(self, pools: List[Dict], block_identifier="latest") -> Dict[str, Dict]:
+        """计算多个池子（known_pools.json格式）的深度
+
+        Returns:
+            {池子地址: {"block", "tick", "sqrt_price_x96", "liquidity", "levels": compute_depth(...)}}
+        """
+        block_number, states = self.fetch_states(pools, block_identifier)
+
+        # 所有池子需要的word合并为一批
+        ranges = {}
+        requests = []
+        for address, state in states.items():
+            tick_lower, tick_upper = level_tick_range(state["tick"], self.levels[-1])
+            ranges[address] = (tick_lower, tick_upper)
+            spacing = state["tick_spacing"]
+            requests.extend((address, word) for word in range(tick_to_word(tick_lower, spacing),
+                                                                tick_to_word(tick_upper, spacing) + 1))
+        failed = {pool for pool, _ in self.tick_cache.fetch_words(requests, block_identifier=block_number)}
+        self.incomplete = sorted(failed)
+
+        profiles = {}
+        for address, state in states.items():
+            if address in failed:
+                continue
+            ticks = self.tick_cache.get_ticks(address, state["tick_spacing"], *ranges[address],
+                                              block_identifier=block_number)
+            profiles[address] = {
+                "block": block_number,
+                "tick": state["tick"],
+                "sqrt_price_x96": state["sqrt_price_x96"],
+                "liquidity": state["liquidity"],
+                "levels": compute_depth(ticks, state["tick"], state["sqrt_price_x96"], state["liquidity"], self.levels),
+            }
+        return profiles
+
+def main():
+    parser = argparse.ArgumentParser(description='计算池子在不同价格变动幅度内的流动性深度')
+    parser.add_argument('pools', nargs='*', help='池子地址，默认计算全部已知池子')
+    parser.add_argument('--levels', default='0.5,1,2,5,10', help='逗号分隔的价格变动幅度（百分比）')
+    parser.add_argument('--output', default='depth_profile.json', help='结果文件')
+    args = parser.parse_args()
+
+    store = get_state_store()
+    tokens = store.load_tokens()
+    pools = store.load_pools(known_only=not args.pools)
+    if args.pools:
+        wanted = {address.lower() for address in args.pools}
+        pools = [pool for pool in pools if pool["pool"].lower() in wanted]
+    if not pools:
+        print("没有找到池子")
+        return
+
+    profiler = DepthProfiler(get_web3(), levels=[float(level) / 100 for level in args.levels.split(',')])
+    started = time.perf_counter()
+    profiles = profiler.profile_pools(pools)
+    print(f"已计算 {len(profiles)}/{len(pools)} 个池子的深度，耗时 {time.perf_counter() - started:.2f} 秒")
+    if profiler.incomplete:
+        print(f"{len(profiler.incomplete)} 个池子的tick数据获取失败，未计算深度: {', '.join(profiler.incomplete)}")
+
+    output = {}
+    for pool in pools:
+        address = Web3.to_checksum_address(pool["pool"])
+        if address not in profiles:
+            continue
+        profile = profiles[address]
+        decimals0 = tokens.get(pool["token0"], {}).get("decimals") or 18
+        decimals1 = tokens.get(pool["token1"], {}).get("decimals") or 18
+        for level in profile["levels"]:
+            level["amount0_formatted"] = level["amount0"] / 10 ** decimals0
+            level["amount1_formatted"] = level["amount1"] / 10 ** decimals1
+        output[address] = {"pair": f"{pool['token0_symbol']}/{pool['token1_symbol']}", "fee": pool["fee"], **profile}
+
+        if args.pools:
+            print(f"\n{output[address]['pair']} ({pool['fee'] / 10000}%) {address}")
+            print(f"{'价格变动':>10}{pool['token0_symbol'] + ' (上涨)':>24}{pool['token1_symbol'] + ' (下跌)':>24}")
+            for level in profile["levels"]:
+                print(f"{level['move'] * 100:>9g}%{level['amount0_formatted']:>24.4f}{level['amount1_formatted']:>24.4f}")
+
+    write_json_atomic(args.output, output, indent=2)
+    print(f"结果已保存到 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+from web3 import Web3
+
+# 默认的gas安全系数
+DEFAULT_GAS_MARGIN = 1.2
+
+# 安全系数的上下限
+MIN_GAS_MARGIN = 1.05
+MAX_GAS_MARGIN = 2.0
+
+# 每个profile保留的最近样本数量
+MAX_PROFILE_SAMPLES = 20
+
+# 估算失败时使用的gas限制
+FALLBACK_GAS_LIMIT = 5000000
+
+class GasOracle:
+    """缓存gas价格和gas估算结果，并根据实际消耗学习每类交易的安全系数"""
+
+    def __init__(self, w3: Web3, price_ttl: float = 3.0, profile_file: str = "gas_profiles.json"):
+        self.w3 = w3
+        self.price_ttl = price_ttl
+        self.profile_file = profile_file
+        # gas价格缓存: (block_number或("t", 时间片序号), gas_price)
+        self.gas_price_cache: Tuple = (None, None)
+        # gas估算缓存: {cache_key: 原始估算值}
+        self.estimates: Dict[Tuple, int] = {}
+        # 每个profile的 gasUsed/估算值 比例样本
+        self.profiles: Dict[str, List[float]] = self.load_profiles()
+
+    def load_profiles(self) -> Dict[str, List[float]]:
+        """加载已学习的安全系数样本"""
+        if self.profile_file and os.path.exists(self.profile_file):
+            try:
+                with open(self.profile_file, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"加载gas profile失败: {str(e)}")
+        return {}
+
+    def save_profiles(self):
+        """保存已学习的安全系数样本"""
+        if not self.profile_file:
+            return
+        try:
+            with open(self.profile_file, "w") as f:
+                json.dump(self.profiles, f)
+        except Exception as e:
+            print(f"保存gas profile失败: {str(e)}")
+
+    def get_gas_price(self, block_number: int = None) -> int:
+        """获取gas价格
+
+        指定block_number时按区块缓存，同一区块内只请求一次；未指定时是按时间片的缓存，
+        每price_ttl秒最多请求一次（与区块无关，BSC的gas价格很少逐块变化）
+        """
+        key = block_number if block_number is not None else ("t", int(time.time() // self.price_ttl))
+        cached_key, gas_price = self.gas_price_cache
+        if cached_key == key and gas_price is not None:
+            return gas_price
+
+        gas_price = self.w3.eth.gas_price
+        self.gas_price_cache = (key, gas_price)
+        return gas_price
+
+    def get_margin(self, profile: str) -> float:
+        """根据历史样本计算profile的安全系数"""
+        samples = self.profiles.get(profile)
+        if not samples:
+            return DEFAULT_GAS_MARGIN
+        # 取历史最大比例并留出5%余量
+        margin = max(samples) * 1.05
+        return min(max(margin, MIN_GAS_MARGIN), MAX_GAS_MARGIN)
+
+    def estimate_gas(self, transaction: dict, profile: str, cache_key: Tuple = None) -> Tuple[int, int]:
+        """估算交易的gas限制
+
+        Args:
+            transaction: 交易字典（需要包含from、to、data）
+            profile: 交易类别，例如池子地址加上区间是否包含当前价格
+            cache_key: 可选的缓存键，相同键的调用直接复用估算结果
+
+        Returns:
+            tuple: (gas_limit, raw_estimate)
+            - gas_limit: 乘以安全系数后的gas限制
+            - raw_estimate: 节点返回的原始估算值，用于之后record学习
+        """
+        if cache_key is None:
+            cache_key = (transaction.get("from"), transaction.get("to"), transaction.get("data"), transaction.get("value", 0))
+
+        raw_estimate = self.estimates.get(cache_key)
+        if raw_estimate is None:
+            call = {k: v for k, v in transaction.items() if k in ("from", "to", "data", "value")}
+            try:
+                raw_estimate = self.w3.eth.estimate_gas(call)
+            except Exception as e:
+                print(f"估算gas失败，使用默认gas限制: {str(e)}")
+                return FALLBACK_GAS_LIMIT, None
+            self.estimates[cache_key] = raw_estimate
+
+        return int(raw_estimate * self.get_margin(profile)), raw_estimate
+
+    def record(self, profile: str, raw_estimate: int, gas_used: int):
+        """记录交易实际消耗的gas，用于学习安全系数"""
+        if not raw_estimate or not gas_used:
+            return
+        samples = self.profiles.setdefault(profile, [])
+        samples.append(gas_used / raw_estimate)
+        del samples[:-MAX_PROFILE_SAMPLES]
+        self.save_profiles()
+
+# 按节点地址复用的GasOracle实例
+gas_oracles: Dict[str, GasOracle] = {}
+
+def get_gas_oracle(w3: Web3) -> GasOracle:
+    """获取节点对应的GasOracle，同一节点的多次mint共享缓存"""
+    endpoint = getattr(w3.provider, "endpoint_uri", None) or str(id(w3))
+    oracle = gas_oracles.get(endpoint)
+    if oracle is None:
+        oracle = GasOracle(w3)
+        gas_oracles[endpoint] = oracle
+    return oracle
+
+def mint_gas_profile(pool_address: str, tick: int, tick_lower: int, tick_upper: int) -> str:
+    """mint交易的gas profile：池子地址 + 区间是否包含当前价格（决定需要转入一种还是两种代币）"""
+    in_range = "in" if tick_lower <= tick < tick_upper else "out"
+    return f"{pool_address.lower()}:{in_range}"
+
+def mint_cache_key(sender: str, mint_params: dict) -> Tuple:
+    """mint估算的缓存键，忽略每次都会变化的deadline"""
+    return (sender,) + tuple(sorted((k, v) for k, v in mint_params.items() if k != "deadline"))
@@ -2,19 +2,30 @@ from web3 import Web3
 import json
 from typing import List, Dict
 import time
-import os
 import signal
 import sys
 import argparse
+import logging
 from web3.middleware import geth_poa_middleware
 from requests.exceptions import Timeout, ConnectionError
 import random
+from log_decoder import get_default_decoder
+from pool_export import export_pools
+from state_store import get_state_store
+from bsc_provider import rank_node_urls
+from rpc_metrics import get_rpc_metrics, instrument_web3, profile_section, with_size_hook
+from structured_log import get_logger, log_event
+from token_validator import load_rejected_tokens
 
 # 解析命令行参数
 parser = argparse.ArgumentParser(description='获取PancakeSwap V3 LP池信息')
 parser.add_argument('--restart', action='store_true', help='从头开始重新获取数据')
+parser.add_argument('--from-block', type=int, help='起始区块，默认从Factory部署区块或上次的进度开始')
+parser.add_argument('--to-block', type=int, help='结束区块，默认为当前最新区块')
 args = parser.parse_args()
 
+logger = get_logger("pool_scanner")
+
 # 全局变量用于控制程序运行
 running = True
 
@@ -36,19 +47,25 @@ def load_bsc_tokens() -> Dict:
     加载BSC代币信息
     """
     try:
-        with open('bsc_tokens.json', 'r') as f:
-            tokens = json.load(f)
-            # 创建地址到代币信息的映射，确保地址格式一致
-            token_map = {}
-            for address, token_info in tokens.items():
-                try:
-                    # 确保地址是checksum格式
-                    address = Web3.to_checksum_address(address)
-                    token_map[address.lower()] = token_info
-                except Exception as e:
-                    print(f"处理代币地址时出错: {address} - {str(e)}")
-            print(f"成功加载 {len(token_map)} 个代币信息")
-            return token_map
+        # 从共享状态库读取，避免与监控脚本同时读写bsc_tokens.json
+        tokens = get_state_store().load_tokens()
+        # 未通过token_validator验证的代币按未知代币处理，包含它们的池子不会记为已知池子
+        rejected = {address.lower() for address in load_rejected_tokens()}
+        # 创建地址到代币信息的映射，确保地址格式一致
+        token_map = {}
+        skipped = 0
+        for address, token_info in tokens.items():
+            if address.lower() in rejected:
+                skipped += 1
+                continue
+            try:
+                # 确保地址是checksum格式
+                address = Web3.to_checksum_address(address)
+                token_map[address.lower()] = token_info
+            except Exception as e:
+                print(f"处理代币地址时出错: {address} - {str(e)}")
+        print(f"成功加载 {len(token_map)} 个代币信息，跳过 {skipped} 个未通过验证的代币")
+        return token_map
     except Exception as e:
         print(f"加载BSC代币信息失败: {str(e)}")
         return {}
@@ -78,12 +95,15 @@ class Web3Provider:
 
     def initialize_provider(self):
         """初始化Web3提供者"""
-        # 随机打乱RPC节点列表
+        # 随机打乱RPC节点列表，有基准测试结果时按评分排序，切换时优先尝试其他节点
         random.shuffle(RPC_URLS)
+        current_url = self.current_provider.provider.endpoint_uri if self.current_provider else None
+        urls = rank_node_urls(RPC_URLS)
+        urls.sort(key=lambda url: url == current_url)
 
-        for url in RPC_URLS:
+        for url in urls:
             try:
-                w3 = Web3(Web3.HTTPProvider(url, request_kwargs={'timeout': 30}))
+                w3 = instrument_web3(Web3(Web3.HTTPProvider(url, request_kwargs=with_size_hook({'timeout': 30}))), url)
                 if w3.is_connected():
                     print(f"已连接到节点: {url}")
                     w3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -111,17 +131,22 @@ class Web3Provider:
                 return []
 
             try:
-                pool_created_filter = self.contract.events.PoolCreated.create_filter(
-                    fromBlock=from_block,
-                    toBlock=to_block
-                )
-                events = pool_created_filter.get_all_entries()
-                return events
+                # 直接使用eth_getLogs按topic过滤，再用预编译的解码器解码
+                decoder = get_default_decoder()
+                logs = self.current_provider.eth.get_logs({
+                    'address': FACTORY_ADDRESS,
+                    'topics': [POOL_CREATED_TOPIC],
+                    'fromBlock': from_block,
+                    'toBlock': to_block
+                })
+                with profile_section("get_all_pools"):
+                    return decoder.decode_logs(logs, 'PoolCreated')
             except (Timeout, ConnectionError) as e:
                 if not running:
                     return []
 
                 if attempt < max_retries - 1:
+                    get_rpc_metrics().record_retry("eth_getLogs", self.current_provider.provider.endpoint_uri)
                     print(f"获取区块 {from_block} 到 {to_block} 的事件时出错，正在重试 ({attempt + 1}/{max_retries})")
                     if not self.switch_provider():
                         print("无法切换到新的RPC节点，等待后重试...")
@@ -134,6 +159,7 @@ class Web3Provider:
                     return []
 
                 if attempt < max_retries - 1:
+                    get_rpc_metrics().record_retry("eth_getLogs", self.current_provider.provider.endpoint_uri)
                     print(f"获取区块 {from_block} 到 {to_block} 的事件时出错，正在重试 ({attempt + 1}/{max_retries})")
                     time.sleep(2)
                 else:
@@ -147,6 +173,9 @@ FACTORY_ADDRESS = '0x0BFbCF9fa4f9C56B0F40a671Ad40E0805A091865'
 with open('ABI/PancakeV3Factory.json', 'r') as f:
     factory_abi = json.load(f)
 
+# PoolCreated事件的topic0
+POOL_CREATED_TOPIC = Web3.to_hex(Web3.keccak(text='PoolCreated(address,address,uint24,int24,address)'))
+
 # 创建Web3提供者实例
 web3_provider = Web3Provider()
 
@@ -163,31 +192,37 @@ def get_token_info(address: str) -> Dict:
         address_lower = address.lower()
         if address_lower in bsc_tokens:
             return bsc_tokens[address_lower]
-        print(f"未找到代币信息: {address}")
+        log_event(logger, logging.DEBUG, "token_unknown", address=address)
         return {'symbol': 'Unknown', 'name': 'Unknown Token'}
     except Exception as e:
         print(f"处理代币地址时出错: {address} - {str(e)}")
         return {'symbol': 'Unknown', 'name': 'Unknown Token'}
 
+# 本次运行是否有新增的已知池子需要导出到known_pools.json
+known_pools_dirty = False
+
 def save_progress(current_block: int, pools: List[Dict]):
     """
-    保存当前进度
+    保存当前进度（池子在发现时已写入状态库，这里只更新检查点）
     """
-    progress = {
-        'last_block': current_block,
-        'pools': pools
-    }
-    with open('pools_progress.json', 'w') as f:
-        json.dump(progress, f)
+    global known_pools_dirty
+    store = get_state_store()
+    store.set_checkpoint('pool_scan', current_block)
+
+    # 兼容旧格式，导出known_pools.json
+    if known_pools_dirty:
+        store.export_known_pools_json()
+        known_pools_dirty = False
 
 def load_progress() -> tuple:
     """
     加载上次的进度
     """
-    if os.path.exists('pools_progress.json') and not args.restart:
-        with open('pools_progress.json', 'r') as f:
-            progress = json.load(f)
-            return progress['last_block'], progress['pools']
+    if not args.restart:
+        store = get_state_store()
+        last_block = store.get_checkpoint('pool_scan')
+        if last_block is not None:
+            return last_block, store.load_pools()
     return None, []
 
 def get_tick_spacing_value(tick_spacing: int) -> str:
@@ -201,66 +236,41 @@ def get_tick_spacing_value(tick_spacing: int) -> str:
 
 def save_known_pool(pool: Dict):
     """
-    保存已知代币的LP池信息到文件
+    保存已知代币的LP池信息到状态库，known_pools.json在保存进度时统一导出
     """
+    global known_pools_dirty
     try:
-        # 检查文件是否存在
-        if os.path.exists('known_pools.json'):
-            with open('known_pools.json', 'r') as f:
-                known_pools = json.load(f)
-        else:
-            known_pools = []
-
-        # 检查是否已存在相同的池
-        pool_address = pool['pool'].lower()
-        for existing_pool in known_pools:
-            if existing_pool['pool'].lower() == pool_address:
-                return  # 如果已存在，直接返回
-
-        # 添加pair字段
-        pool_with_pair = pool.copy()
-        pool_with_pair['pair'] = f"{pool['token0_symbol']}/{pool['token1_symbol']}"
-
-        # 添加新的池信息
-        known_pools.append(pool_with_pair)
-
-        # 按代币符号排序
-        known_pools.sort(key=lambda x: (x['token0_symbol'], x['token1_symbol']))
-
-        # 保存更新后的信息，使用更易读的格式
-        with open('known_pools.json', 'w', encoding='utf-8') as f:
-            json.dump(known_pools, f, indent=2, ensure_ascii=False, sort_keys=True)
+        get_state_store().upsert_pools([pool], known=True)
+        known_pools_dirty = True
     except Exception as e:
         print(f"保存已知池信息时出错: {str(e)}")
 
 def print_pool_info(pool: Dict, index: int = None):
     """
-    打印LP池信息
+    记录LP池信息（DEBUG级别，回填时默认不输出，设置BSC_LOG_LEVEL=DEBUG查看）
     """
-    if index is not None:
-        print(f"\n池 #{index}")
-    print(f"Token0: {pool['token0']} ({pool['token0_symbol']} - {pool['token0_name']})")
-    print(f"Token1: {pool['token1']} ({pool['token1_symbol']} - {pool['token1_name']})")
-    print(f"手续费率: {pool['fee']/10000}%")
-    tick_spacing_value = get_tick_spacing_value(pool['tickSpacing'])
-    print(f"Tick间距: {pool['tickSpacing']} (价格变化: {tick_spacing_value})")
-    print(f"池地址: {pool['pool']}")
-    print("-" * 80)
+    if logger.isEnabledFor(logging.DEBUG):
+        log_event(logger, logging.DEBUG, "pool_found", index=index,
+                  pool=pool['pool'], fee=pool['fee'], tick_spacing=pool['tickSpacing'],
+                  price_step=get_tick_spacing_value(pool['tickSpacing']),
+                  token0=pool['token0'], token0_symbol=pool['token0_symbol'], token0_name=pool['token0_name'],
+                  token1=pool['token1'], token1_symbol=pool['token1_symbol'], token1_name=pool['token1_name'])
 
     # 只检查代币的symbol是否为Unknown
     if pool['token0_symbol'] != 'Unknown' and pool['token1_symbol'] != 'Unknown':
         save_known_pool(pool)
-        print(f"已保存到 known_pools.json: {pool['token0_symbol']}/{pool['token1_symbol']}")
+        log_event(logger, logging.DEBUG, "known_pool_saved", pool=pool['pool'],
+                  pair=f"{pool['token0_symbol']}/{pool['token1_symbol']}")
 
 def get_all_pools() -> List[Dict]:
     """
     获取所有PancakeSwap V3的LP池信息
     """
     # 获取当前区块高度
-    current_block = web3_provider.current_provider.eth.block_number
+    current_block = args.to_block or web3_provider.current_provider.eth.block_number
 
     # Factory合约部署区块
-    start_block = 26956207  # PancakeSwap V3 Factory部署区块 (2023-04-03)
+    start_block = args.from_block or 26956207  # PancakeSwap V3 Factory部署区块 (2023-04-03)
 
     # 加载上次的进度
     last_block, pools = load_progress()
@@ -306,6 +316,11 @@ def get_all_pools() -> List[Dict]:
                 # 实时打印找到的LP池信息
                 print_pool_info(pool_info, len(pools))
 
+            # 本范围内新发现的池子一次性写入状态库
+            if events:
+                get_state_store().upsert_pools(pools[-len(events):])
+                print(f"找到 {len(events)} 个LP池，累计 {len(pools)} 个")
+
             # 每完成一个范围就保存进度
             save_progress(to_block, pools)
 
@@ -331,12 +346,17 @@ def main():
             return
 
         print(f"\n总共找到 {len(pools)} 个LP池")
+        get_rpc_metrics().print_summary()
 
         # 保存最终结果
         with open('pancakeswap_v3_pools.json', 'w') as f:
             json.dump(pools, f, indent=2)
         print("\n结果已保存到 pancakeswap_v3_pools.json")
 
+        # 导出列式格式供分析任务使用
+        parquet_path, arrow_path = export_pools(pools)
+        print(f"列式结果已保存到 {parquet_path} 和 {arrow_path}")
+
     except KeyboardInterrupt:
         print("\n程序已中断，已保存当前进度")
     except Exception as e:
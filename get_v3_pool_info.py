@@ -9,6 +9,10 @@ import math
 import time
 from datetime import datetime
 import os
+from multicall import Multicall
+from state_store import get_state_store
+from bsc_provider import get_web3, get_best_node_url
+from pool_ranking import get_pool_ranking
 
 # BSC节点URL
 BSC_NODE_URL = "https://bsc-dataseed.binance.org/"
@@ -58,6 +62,45 @@ with open("ABI/PancakeV3Pool.json", "r") as f:
 with open("bsc_tokens.json", "r") as f:
     TOKENS = json.load(f)
 
+# 候选费率：0.01% 加上 0.05%到1%（步长0.05%），仅用于确认工厂实际启用的费率
+CANDIDATE_FEE_TIERS = [100] + [int(fee * 500) for fee in range(1, 21)]
+
+# 池子排名索引超过该时间（秒）未刷新时不再使用，改为重新扫描
+RANKING_MAX_AGE = 3600
+
+# 工厂已启用的费率缓存 {fee: tickSpacing}
+enabled_fee_tiers: Dict[int, int] = {}
+
+# 本地交易对索引缓存 {(token0, token1): {fee: pool_address}}
+pool_index: Dict[Tuple[str, str], Dict[int, str]] = {}
+
+def load_pool_index() -> Dict[Tuple[str, str], Dict[int, str]]:
+    """从状态库（首次使用时由known_pools.json等文件导入）构建交易对到池子地址的索引，地址统一为小写并按字典序排序"""
+    global pool_index
+    if pool_index:
+        return pool_index
+
+    for pool in get_state_store().load_pools():
+        pair_key = tuple(sorted((pool["token0"].lower(), pool["token1"].lower())))
+        pool_index.setdefault(pair_key, {})[pool["fee"]] = pool["pool"]
+
+    return pool_index
+
+def get_enabled_fee_tiers(factory, multicall: Multicall) -> Dict[int, int]:
+    """一次multicall查询工厂已启用的费率及其tickSpacing"""
+    global enabled_fee_tiers
+    if enabled_fee_tiers:
+        return enabled_fee_tiers
+
+    calls = [factory.functions.feeAmountTickSpacing(fee) for fee in CANDIDATE_FEE_TIERS]
+    _, tick_spacings = multicall.aggregate(calls)
+    enabled_fee_tiers = {
+        fee: tick_spacing
+        for fee, tick_spacing in zip(CANDIDATE_FEE_TIERS, tick_spacings)
+        if tick_spacing
+    }
+    return enabled_fee_tiers
+
 def get_token_address(token_identifier: str) -> Optional[str]:
     """根据代币名称或符号获取地址，如果有多个匹配项，返回rank最小的"""
     matching_tokens = []
@@ -127,8 +170,8 @@ def calculate_liquidity_amounts(liquidity: int, sqrt_price_x96: int, tick: int)
 
     return amount0, amount1
 
-def get_pool_details(pool_address: str, w3: Web3) -> Dict:
-    """获取池子的详细信息"""
+def get_pool_details(pool_address: str, w3: Web3, block_identifier="latest") -> Dict:
+    """获取池子的详细信息，block_identifier指定区块时读取该区块的历史状态（需要归档节点）"""
     try:
         # 创建池子合约实例
         pool = w3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=POOL_ABI)
@@ -139,15 +182,15 @@ def get_pool_details(pool_address: str, w3: Web3) -> Dict:
         fee = pool.functions.fee().call()
 
         # 获取当前价格信息
-        slot0 = pool.functions.slot0().call()
+        slot0 = pool.functions.slot0().call(block_identifier=block_identifier)
         sqrt_price_x96 = slot0[0]
         tick = slot0[1]
 
         # 获取流动性信息
-        liquidity = pool.functions.liquidity().call()
+        liquidity = pool.functions.liquidity().call(block_identifier=block_identifier)
 
         # 获取协议费用信息
-        protocol_fees = pool.functions.protocolFees().call()
+        protocol_fees = pool.functions.protocolFees().call(block_identifier=block_identifier)
 
         # 获取代币符号和精度
         token0_symbol = get_token_symbol(token0)
@@ -191,37 +234,49 @@ def get_pool_details(pool_address: str, w3: Web3) -> Dict:
         return None
 
 def get_pool_info(token0_address: str, token1_address: str) -> List[Tuple[str, str, int]]:
-    """获取两个代币之间的V3池子信息"""
-    w3 = Web3(Web3.HTTPProvider(BSC_NODE_URL))
+    """获取两个代币之间的V3池子信息
+
+    先从本地交易对索引中查找已知池子，再用一次multicall检查工厂已启用但索引中缺失的费率
+    """
+    w3 = get_web3(get_best_node_url(BSC_NODE_URL))
+    multicall = Multicall(w3)
 
     # 创建Factory合约实例
     factory = w3.eth.contract(address=Web3.to_checksum_address(PANCAKESWAP_V3_FACTORY), abi=FACTORY_ABI)
 
-    # 生成费率列表：从0.01%到1%，步长0.05%
-    fee_tiers = [100] + [int(fee * 500) for fee in range(1, 21)]  # 1(0.01%) + 5到100(0.05%到1%)
+    # 从本地索引获取已知池子
+    pair_key = tuple(sorted((token0_address.lower(), token1_address.lower())))
+    pool_addresses = dict(load_pool_index().get(pair_key, {}))
+
+    # 只检查已启用且索引中没有的费率
+    try:
+        missing_fees = [fee for fee in get_enabled_fee_tiers(factory, multicall) if fee not in pool_addresses]
+        if missing_fees:
+            calls = [
+                factory.functions.getPool(
+                    Web3.to_checksum_address(token0_address),
+                    Web3.to_checksum_address(token1_address),
+                    fee
+                )
+                for fee in missing_fees
+            ]
+            _, addresses = multicall.aggregate(calls)
+            for fee, pool_address in zip(missing_fees, addresses):
+                if pool_address and pool_address != "0x0000000000000000000000000000000000000000":
+                    pool_addresses[fee] = pool_address
+    except Exception as e:
+        print(f"\n批量查询费率池子时出错: {str(e)}")
 
     pools = []
     # 使用tqdm创建进度条
-    for fee in tqdm(fee_tiers, desc="扫描费率", unit="%", ncols=100):
+    for fee, pool_address in tqdm(sorted(pool_addresses.items()), desc="获取池子详情", unit="池", ncols=100):
         if not running:  # 检查是否需要退出
             break
 
-        try:
-            # 获取池子地址
-            pool_address = factory.functions.getPool(
-                Web3.to_checksum_address(token0_address),
-                Web3.to_checksum_address(token1_address),
-                fee
-            ).call()
-
-            if pool_address != "0x0000000000000000000000000000000000000000":
-                # 获取池子详细信息
-                pool_details = get_pool_details(pool_address, w3)
-                if pool_details:
-                    pools.append(pool_details)
-        except Exception as e:
-            print(f"\n获取费率 {fee/100}% 的池子信息时出错: {str(e)}")
-            continue
+        # 获取池子详细信息
+        pool_details = get_pool_details(pool_address, w3)
+        if pool_details:
+            pools.append(pool_details)
 
     return pools
 
@@ -290,29 +345,43 @@ def main():
                 print(f"未找到名为 {token1_identifier} 的代币")
                 return
 
-        print(f"\n开始扫描V3池子信息...")
-        
-        # 获取池子信息
-        pools = get_pool_info(token0_address, token1_address)
-        
-        if not pools:
-            print("未找到任何池子")
-            return
-            
-        # 找到流动性最大的池子
-        max_liquidity_pool = max(pools, key=lambda x: x['liquidity'])
-        
-        print(f"\n找到流动性最大的池子:")
-        print(f"交易对: {max_liquidity_pool['token0']['symbol']}/{max_liquidity_pool['token1']['symbol']}")
-        print(f"费率: {max_liquidity_pool['fee']}%")
-        print(f"流动性: {max_liquidity_pool['liquidity']}")
-        
+        # 优先从池子排名索引（pool_ranking.py生成）中直接选出TVL最大的池子
+        ranking = get_pool_ranking(max_age=RANKING_MAX_AGE)
+        ranked_pool = ranking.best_pool(token0_address, token1_address) if ranking else None
+        if ranked_pool and ranked_pool.get('token0_symbol') and ranked_pool.get('token1_symbol'):
+            symbol0, symbol1 = ranked_pool['token0_symbol'], ranked_pool['token1_symbol']
+            print(f"\n从池子排名索引中找到TVL最大的池子:")
+            print(f"交易对: {ranked_pool['pair']}")
+            print(f"费率: {ranked_pool['fee'] / 10000}%")
+            print(f"TVL: ${ranked_pool['tvl_usd']:,.2f}")
+            print(f"流动性: {ranked_pool['liquidity']}")
+            pool_address = ranked_pool['pool']
+        else:
+            print(f"\n开始扫描V3池子信息...")
+
+            # 获取池子信息
+            pools = get_pool_info(token0_address, token1_address)
+
+            if not pools:
+                print("未找到任何池子")
+                return
+
+            # 找到流动性最大的池子
+            max_liquidity_pool = max(pools, key=lambda x: x['liquidity'])
+
+            print(f"\n找到流动性最大的池子:")
+            print(f"交易对: {max_liquidity_pool['token0']['symbol']}/{max_liquidity_pool['token1']['symbol']}")
+            print(f"费率: {max_liquidity_pool['fee']}%")
+            print(f"流动性: {max_liquidity_pool['liquidity']}")
+            symbol0, symbol1 = max_liquidity_pool['token0']['symbol'], max_liquidity_pool['token1']['symbol']
+            pool_address = max_liquidity_pool['address']
+
         # 创建输出文件名
-        output_file = f"protocol_fees_{max_liquidity_pool['token0']['symbol']}_{max_liquidity_pool['token1']['symbol']}.txt"
-        
+        output_file = f"protocol_fees_{symbol0}_{symbol1}.txt"
+
         # 开始监控选中的池子
-        w3 = Web3(Web3.HTTPProvider(BSC_NODE_URL))
-        monitor_pool_protocol_fees(max_liquidity_pool['address'], w3, output_file)
+        w3 = get_web3(get_best_node_url(BSC_NODE_URL))
+        monitor_pool_protocol_fees(pool_address, w3, output_file)
         
     except KeyboardInterrupt:
         print("\n程序已停止")
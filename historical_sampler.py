@@ -0,0 +1,137 @@
+import argparse
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Any
+from web3 import Web3
+from multicall import Multicall
+from rpc_metrics import get_rpc_metrics
+from pool_recorder import PoolRecorder, TIMESERIES_DIR
+
+# 结果缓存最多保留的调用数量
+DEFAULT_MAX_CACHE_ENTRIES = 200000
+
+class HistoricalSampler:
+    """在一段区块范围内并发执行固定在各区块的multicall
+
+    结果按 (区块号, 目标合约, calldata) 缓存（LRU，最多max_cache_entries个），重复采样同一区块的
+    相同调用不会再次请求节点；max_cache_entries为0时不缓存。
+    历史区块的状态需要归档节点，且区块不能早于Multicall合约的部署区块
+    """
+
+    def __init__(self, w3: Web3, max_workers: int = 8, multicall: Multicall = None,
+                 max_cache_entries: int = DEFAULT_MAX_CACHE_ENTRIES):
+        self.w3 = w3
+        self.max_workers = max_workers
+        self.multicall = multicall or Multicall(w3)
+        self.max_cache_entries = max_cache_entries
+        self.cache: "OrderedDict[Tuple[int, str, str], Any]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def call_key(self, block_number: int, fn) -> Tuple[int, str, str]:
+        return (block_number, fn.address, fn._encode_transaction_data())
+
+    def sample_block(self, calls: list, block_number: int) -> List[Any]:
+        """执行固定在指定区块的调用，只请求缓存中没有的部分"""
+        if not self.max_cache_entries:
+            _, results = self.multicall.aggregate(calls, block_identifier=block_number)
+            with self.lock:
+                self.request_count += 1
+            return results
+
+        keys = [self.call_key(block_number, fn) for fn in calls]
+        with self.lock:
+            missing = [(i, fn) for i, (key, fn) in enumerate(zip(keys, calls)) if key not in self.cache]
+
+        if missing:
+            _, results = self.multicall.aggregate([fn for _, fn in missing], block_identifier=block_number)
+            with self.lock:
+                self.request_count += 1
+                for (i, _), result in zip(missing, results):
+                    self.cache[keys[i]] = result
+
+        with self.lock:
+            found = [self.cache.get(key) for key in keys]
+            for key in keys:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+            while len(self.cache) > self.max_cache_entries:
+                self.cache.popitem(last=False)
+            return found
+
+    def sample_range(self, calls: list, from_block: int, to_block: int, step: int = 1,
+                     progress: bool = True) -> Dict[int, List[Any]]:
+        """在 [from_block, to_block] 内每隔step个区块采样一次，最多max_workers个请求同时进行
+
+        Returns:
+            dict: {block_number: 与calls一一对应的结果}
+        """
+        blocks = list(range(from_block, to_block + 1, step))
+        results: Dict[int, List[Any]] = {}
+        started = time.time()
+
+        def worker(block_number: int):
+            for attempt in range(3):
+                try:
+                    return block_number, self.sample_block(calls, block_number)
+                except Exception as e:
+                    if attempt == 2:
+                        print(f"采样区块 {block_number} 失败: {str(e)}")
+                        return block_number, None
+                    get_rpc_metrics().record_retry("eth_call", getattr(self.w3.provider, "endpoint_uri", ""))
+                    time.sleep(1 + attempt)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for done, (block_number, block_results) in enumerate(executor.map(worker, blocks), 1):
+                if block_results is not None:
+                    results[block_number] = block_results
+                if progress and (done % 100 == 0 or done == len(blocks)):
+                    elapsed = time.time() - started
+                    print(f"\r已采样 {done}/{len(blocks)} 个区块 ({done / max(elapsed, 1e-9):.1f} 区块/秒)", end="")
+        if progress:
+            print()
+
+        return results
+
+def backfill_pool_history(w3: Web3, pool_addresses: List[str], from_block: int, to_block: int,
+                          step: int = 1, max_workers: int = 8, directory: str = TIMESERIES_DIR) -> int:
+    """回填池子的历史状态到pool_recorder的时间序列文件，返回写入的区块数
+
+    时间序列文件只能按区块号递增追加，早于文件中最后区块的采样会被忽略
+    """
+    recorder = PoolRecorder(w3, pool_addresses, directory)
+    # 回填时每个区块只采样一次，结果缓存不会命中，直接关闭
+    sampler = HistoricalSampler(w3, max_workers=max_workers, multicall=recorder.multicall, max_cache_entries=0)
+    calls = recorder.build_calls()
+
+    # 分段采样，避免一次性把整个范围的结果留在内存中
+    written = 0
+    chunk = max(step, 1000 * step)
+    for chunk_start in range(from_block, to_block + 1, chunk):
+        chunk_end = min(chunk_start + chunk - 1, to_block)
+        results = sampler.sample_range(calls, chunk_start, chunk_end, step)
+        for block_number in sorted(results):
+            recorder.record_results(block_number, results[block_number])
+            written += 1
+
+    print(f"回填完成: {written} 个区块, {sampler.request_count} 次请求")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='回填PancakeSwap V3池子的历史状态（需要归档节点）')
+    parser.add_argument('pools', nargs='+', help='池子地址')
+    parser.add_argument('--rpc', required=True, help='归档节点URL')
+    parser.add_argument('--from-block', type=int, required=True, help='起始区块')
+    parser.add_argument('--to-block', type=int, required=True, help='结束区块')
+    parser.add_argument('--step', type=int, default=1, help='采样间隔区块数')
+    parser.add_argument('--workers', type=int, default=8, help='最大并发请求数')
+    parser.add_argument('--dir', default=TIMESERIES_DIR, help='时间序列文件目录')
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(args.rpc, request_kwargs={'timeout': 60}))
+    backfill_pool_history(w3, args.pools, args.from_block, args.to_block, args.step, args.workers, args.dir)
+
+if __name__ == "__main__":
+    main()
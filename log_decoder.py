@@ -0,0 +1,155 @@
+import json
+from typing import Dict, List, Optional, Tuple
+from eth_abi import decode
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from web3 import Web3
+
+# NonfungiblePositionManager合约地址
+POSITION_MANAGER = "0x46A15B0b27311cedF172AB29E4f4766fbE7F4364"
+
+# PancakeSwap V3 Factory合约地址
+PANCAKESWAP_V3_FACTORY = "0x0BFbCF9fa4f9C56B0F40a671Ad40E0805A091865"
+
+# ERC20事件ABI
+ERC20_EVENTS_ABI = [
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": False, "name": "value", "type": "uint256"}
+        ],
+        "name": "Transfer",
+        "type": "event"
+    },
+    {
+        "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "owner", "type": "address"},
+            {"indexed": True, "name": "spender", "type": "address"},
+            {"indexed": False, "name": "value", "type": "uint256"}
+        ],
+        "name": "Approval",
+        "type": "event"
+    }
+]
+
+# ERC20 Transfer事件的topic0
+TRANSFER_TOPIC = HexBytes("0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef")
+
+class EventDecoder:
+    """预编译的单个事件解码器"""
+
+    def __init__(self, event_abi: dict):
+        self.name = event_abi["name"]
+        self.topic0 = HexBytes(event_abi_to_log_topic(event_abi))
+        inputs = event_abi["inputs"]
+        self.indexed = [(i["name"], i["type"]) for i in inputs if i.get("indexed")]
+        self.data_names = [i["name"] for i in inputs if not i.get("indexed")]
+        self.data_types = [i["type"] for i in inputs if not i.get("indexed")]
+        self.topic_count = len(self.indexed) + 1
+        # 保持ABI中参数的原始顺序
+        self.order = [i["name"] for i in inputs]
+
+    def decode(self, topics: List[HexBytes], data: bytes) -> Dict:
+        """解码事件参数"""
+        args = {}
+        for (name, abi_type), topic in zip(self.indexed, topics[1:]):
+            if abi_type == "address":
+                args[name] = Web3.to_checksum_address(topic[-20:])
+            else:
+                args[name] = decode([abi_type], topic)[0]
+
+        if self.data_types:
+            values = decode(self.data_types, data)
+            for name, abi_type, value in zip(self.data_names, self.data_types, values):
+                args[name] = Web3.to_checksum_address(value) if abi_type == "address" else value
+
+        return {name: args[name] for name in self.order}
+
+class LogDecoder:
+    """按 (合约地址, topic0) 分发的日志解码器，地址为None表示匹配任意合约"""
+
+    def __init__(self):
+        self.decoders: Dict[Tuple[Optional[str], bytes], List[EventDecoder]] = {}
+
+    def register_event(self, event_abi: dict, address: str = None):
+        """注册单个事件"""
+        decoder = EventDecoder(event_abi)
+        key = (address.lower() if address else None, bytes(decoder.topic0))
+        self.decoders.setdefault(key, []).append(decoder)
+
+    def register_abi(self, abi: list, address: str = None, events: List[str] = None):
+        """注册ABI中的全部（或指定的）事件"""
+        for item in abi:
+            if item.get("type") != "event" or item.get("anonymous"):
+                continue
+            if events is not None and item["name"] not in events:
+                continue
+            self.register_event(item, address)
+
+    def find_decoder(self, address: str, topics: List[HexBytes]) -> Optional[EventDecoder]:
+        """查找匹配的解码器，优先使用指定合约地址注册的解码器"""
+        if not topics:
+            return None
+        topic0 = bytes(topics[0])
+        for key in ((address.lower(), topic0), (None, topic0)):
+            for decoder in self.decoders.get(key, ()):
+                # 同名事件可能索引参数数量不同（例如ERC20与ERC721的Transfer）
+                if decoder.topic_count == len(topics):
+                    return decoder
+        return None
+
+    def decode_log(self, log) -> Optional[Dict]:
+        """解码单条日志，无法识别时返回None"""
+        topics = [HexBytes(t) for t in log["topics"]]
+        decoder = self.find_decoder(log["address"], topics)
+        if decoder is None:
+            return None
+        try:
+            args = decoder.decode(topics, HexBytes(log["data"]))
+        except Exception:
+            return None
+        return {
+            "event": decoder.name,
+            "address": Web3.to_checksum_address(log["address"]),
+            "args": args,
+            "logIndex": log.get("logIndex"),
+            "transactionHash": log.get("transactionHash"),
+            "blockNumber": log.get("blockNumber"),
+        }
+
+    def decode_logs(self, logs: list, event: str = None) -> List[Dict]:
+        """一次遍历解码多条日志，可按事件名过滤"""
+        decoded = []
+        for log in logs:
+            result = self.decode_log(log)
+            if result is not None and (event is None or result["event"] == event):
+                decoded.append(result)
+        return decoded
+
+    def decode_receipt(self, receipt, event: str = None) -> List[Dict]:
+        """解码交易收据中的全部日志"""
+        return self.decode_logs(receipt["logs"], event)
+
+# 默认解码器实例
+default_decoder: LogDecoder = None
+
+def get_default_decoder() -> LogDecoder:
+    """返回注册了PositionManager、Factory、V3池子和ERC20事件的解码器"""
+    global default_decoder
+    if default_decoder is not None:
+        return default_decoder
+
+    decoder = LogDecoder()
+    with open("ABI/NonfungiblePositionManager.json", "r") as f:
+        decoder.register_abi(json.load(f), POSITION_MANAGER)
+    with open("ABI/PancakeV3Factory.json", "r") as f:
+        decoder.register_abi(json.load(f), PANCAKESWAP_V3_FACTORY)
+    with open("ABI/PancakeV3Pool.json", "r") as f:
+        decoder.register_abi(json.load(f))
+    decoder.register_abi(ERC20_EVENTS_ABI)
+
+    default_decoder = decoder
+    return default_decoder
@@ -5,6 +5,11 @@ import math
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gas_oracle import get_gas_oracle, mint_gas_profile, mint_cache_key
+from wallet_snapshot import get_portfolio_snapshot
+from log_decoder import get_default_decoder
+from bsc_provider import get_web3, get_best_node_url
 
 # 加载.env文件
 load_dotenv()
@@ -86,13 +91,15 @@ def calculate_price(sqrt_price_x96, token0_decimals, token1_decimals):
 
     return price_adjusted  # 返回Decimal，不转换为float
 
-def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float):
+def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float, w3: Web3 = None, block_identifier="latest"):
     """获取V3池子的当前价格和地址
 
     Args:
         token0_name: 第一个代币的名称或符号
         token1_name: 第二个代币的名称或符号
         fee_percent: 费率百分比（例如：0.05表示0.05%）
+        w3: 可选的Web3实例，默认连接BSC_NODE_URL
+        block_identifier: 查询的区块，指定历史区块时需要归档节点
 
     Returns:
         tuple: (pool_address, price, is_initialized, token0_name, token1_name, sqrt_price_x96, tick) 如果找到池子，否则返回 (None, None, False, None, None, None, None)
@@ -106,7 +113,7 @@ def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float):
     """
     try:
         # 初始化Web3
-        w3 = Web3(Web3.HTTPProvider(BSC_NODE_URL))
+        w3 = w3 or get_web3(get_best_node_url(BSC_NODE_URL))
 
         # 获取代币地址
         token0_address = get_token_address(token0_name)
@@ -136,7 +143,7 @@ def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float):
             Web3.to_checksum_address(token0_address),
             Web3.to_checksum_address(token1_address),
             fee
-        ).call()
+        ).call(block_identifier=block_identifier)
 
         if pool_address == "0x0000000000000000000000000000000000000000":
             print(f"未找到{token0_name}/{token1_name} V3池子 (费率: {fee_percent}%)")
@@ -147,7 +154,7 @@ def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float):
 
         try:
             # 获取当前价格信息
-            slot0 = pool.functions.slot0().call()
+            slot0 = pool.functions.slot0().call(block_identifier=block_identifier)
             sqrt_price_x96 = slot0[0]
             tick = slot0[1]  # 获取当前tick
 
@@ -173,12 +180,13 @@ def get_v3_pool_price(token0_name: str, token1_name: str, fee_percent: float):
         print(f"获取价格时出错: {str(e)}")
         return None, None, False, None, None, None, None
 
-def get_token_balances(address: str, token_names: list) -> dict:
+def get_token_balances(address: str, token_names: list, w3: Web3 = None) -> dict:
     """获取指定地址上多个代币的余额
 
     Args:
         address: 要查询的钱包地址
         token_names: 代币名称或符号列表
+        w3: 可选的Web3实例，默认连接BSC_NODE_URL
 
     Returns:
         dict: {
@@ -192,45 +200,37 @@ def get_token_balances(address: str, token_names: list) -> dict:
     """
     try:
         # 初始化Web3
-        w3 = Web3(Web3.HTTPProvider(BSC_NODE_URL))
+        w3 = w3 or get_web3(get_best_node_url(BSC_NODE_URL))
 
         # 检查地址格式
         if not w3.is_address(address):
             raise ValueError(f"无效的地址格式: {address}")
 
-        result = {}
+        # 获取代币地址
+        token_addresses = {}
         for token_name in token_names:
             try:
-                # 获取代币地址
-                token_address = get_token_address(token_name)
-
-                # 创建代币合约实例
-                token_contract = w3.eth.contract(
-                    address=Web3.to_checksum_address(token_address),
-                    abi=ERC20_ABI
-                )
-
-                # 获取代币精度
-                decimals = token_contract.functions.decimals().call()
-
-                # 获取代币余额
-                balance = token_contract.functions.balanceOf(
-                    Web3.to_checksum_address(address)
-                ).call()
-
-                # 格式化余额
-                formatted_balance = float(balance) / (10 ** decimals)
-
-                result[token_name] = {
-                    'address': token_address,
-                    'balance': formatted_balance,
-                    'decimals': decimals
-                }
-
+                token_addresses[token_name] = Web3.to_checksum_address(get_token_address(token_name))
             except Exception as e:
                 print(f"获取{token_name}余额时出错: {str(e)}")
+
+        # 一次multicall查询所有代币的余额和精度
+        snapshot = get_portfolio_snapshot(w3, [address], list(token_addresses.values()))
+        balances = snapshot['balances'][Web3.to_checksum_address(address)]
+
+        result = {}
+        for token_name, token_address in token_addresses.items():
+            balance = balances.get(token_address)
+            if balance is None:
+                print(f"获取{token_name}余额时出错: 查询失败")
                 continue
 
+            result[token_name] = {
+                'address': token_address,
+                'balance': float(balance),
+                'decimals': snapshot['decimals'][token_address]
+            }
+
         return result
 
     except Exception as e:
@@ -276,187 +276,309 @@ def tick_to_price(tick: int, token0_decimals: int, token1_decimals: int) -> floa
     adjusted_price = price / (10 ** (token0_decimals - token1_decimals))
     return adjusted_price
 
-def mint_v3_position(
+def prepare_mint(
+    w3: Web3,
     token0_name: str,
     token1_name: str,
     fee_percent: float,
     amount0_desired: float,
     amount1_desired: float,
     recipient: str,
-    private_key: str = None,
     price_range_percent: float = 0.5,
     slippage_percent: float = 5.0,
     deadline_minutes: int = 20,
-    send_transaction: bool = False
+    tick_range: tuple = None
 ) -> dict:
-    try:
-        # 初始化Web3
-        w3 = Web3(Web3.HTTPProvider(BSC_NODE_URL))
-
-        # 导入Decimal
-        from decimal import Decimal, ROUND_DOWN
-
-        # 获取代币地址和精度
-        token0_address = get_token_address(token0_name)
-        token1_address = get_token_address(token1_name)
+    """读取链上数据并准备mint参数（不发送交易）
 
-        # 确保代币地址按字典序排序
-        if int(token0_address, 16) > int(token1_address, 16):
-            token0_address, token1_address = token1_address, token0_address
-            token0_name, token1_name = token1_name, token0_name
-            amount0_desired, amount1_desired = amount1_desired, amount0_desired
-
-        print(f"\n代币信息:")
-        print(f"Token0 ({token0_name}): {token0_address}")
-        print(f"Token1 ({token1_name}): {token1_address}")
+    tick_range为 (tickLower, tickUpper) 时直接使用该区间（例如range_optimizer.choose_mint_ticks的结果），
+    否则按price_range_percent围绕当前tick计算区间
 
-        # 创建代币合约实例
-        token0_contract = w3.eth.contract(
-            address=Web3.to_checksum_address(token0_address),
-            abi=ERC20_ABI
-        )
-        token1_contract = w3.eth.contract(
-            address=Web3.to_checksum_address(token1_address),
-            abi=ERC20_ABI
-        )
+    Returns:
+        dict: 包含mint_params、position_manager以及价格、精度、数量等信息
+    """
+    # 获取代币地址和精度
+    token0_address = get_token_address(token0_name)
+    token1_address = get_token_address(token1_name)
+
+    # 确保代币地址按字典序排序
+    if int(token0_address, 16) > int(token1_address, 16):
+        token0_address, token1_address = token1_address, token0_address
+        token0_name, token1_name = token1_name, token0_name
+        amount0_desired, amount1_desired = amount1_desired, amount0_desired
+
+    print(f"\n代币信息:")
+    print(f"Token0 ({token0_name}): {token0_address}")
+    print(f"Token1 ({token1_name}): {token1_address}")
+
+    # 创建代币合约实例
+    token0_contract = w3.eth.contract(
+        address=Web3.to_checksum_address(token0_address),
+        abi=ERC20_ABI
+    )
+    token1_contract = w3.eth.contract(
+        address=Web3.to_checksum_address(token1_address),
+        abi=ERC20_ABI
+    )
 
-        # 获取代币精度
-        token0_decimals = token0_contract.functions.decimals().call()
-        token1_decimals = token1_contract.functions.decimals().call()
+    # 获取代币精度
+    token0_decimals = token0_contract.functions.decimals().call()
+    token1_decimals = token1_contract.functions.decimals().call()
 
-        print(f"\n代币精度:")
-        print(f"Token0 ({token0_name}): {token0_decimals}")
-        print(f"Token1 ({token1_name}): {token1_decimals}")
+    print(f"\n代币精度:")
+    print(f"Token0 ({token0_name}): {token0_decimals}")
+    print(f"Token1 ({token1_name}): {token1_decimals}")
 
-        # 获取当前价格
-        pool_address, current_price, is_initialized, sorted_token0_name, sorted_token1_name, sqrt_price_x96, tick = get_v3_pool_price(token0_name, token1_name, fee_percent)
-        if not pool_address:
-            raise ValueError(f"无法获取{token0_name}/{token1_name}池子")
+    # 获取当前价格
+    pool_address, current_price, is_initialized, sorted_token0_name, sorted_token1_name, sqrt_price_x96, tick = get_v3_pool_price(token0_name, token1_name, fee_percent, w3=w3)
+    if not pool_address:
+        raise ValueError(f"无法获取{token0_name}/{token1_name}池子")
 
-        if not is_initialized:
-            raise ValueError(f"池子尚未初始化，需要先初始化池子")
+    if not is_initialized:
+        raise ValueError(f"池子尚未初始化，需要先初始化池子")
 
-        print(f"\n池子已经初始化，池子信息:")
-        print(f"池子地址: {pool_address}")
-        print(f"当前价格: {current_price:.8f} {sorted_token1_name}")
+    print(f"\n池子已经初始化，池子信息:")
+    print(f"池子地址: {pool_address}")
+    print(f"当前价格: {current_price:.8f} {sorted_token1_name}")
 
+    if tick_range:
+        # 使用调用方指定的tick区间，必须对齐池子的tickSpacing，否则mint会失败
+        tick_lower, tick_upper = tick_range
+        with open("ABI/PancakeV3Pool.json", "r") as f:
+            POOL_ABI = json.load(f)
+        pool = w3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=POOL_ABI)
+        tick_spacing = pool.functions.tickSpacing().call()
+        if tick_lower % tick_spacing or tick_upper % tick_spacing:
+            raise ValueError(f"tick区间 ({tick_lower}, {tick_upper}) 不是池子tickSpacing {tick_spacing} 的倍数")
+    else:
         # 直接使用返回的tick计算tick范围
-        tick_range = int(abs(tick) * price_range_percent / 100)  # 计算tick范围
+        tick_width = int(abs(tick) * price_range_percent / 100)  # 计算tick范围
         # 对于负tick，我们需要调整计算方式
         if tick < 0:
-            tick_lower = tick - tick_range  # 更小的tick值对应更高的价格
-            tick_upper = tick + tick_range  # 更大的tick值对应更低的价格
+            tick_lower = tick - tick_width  # 更小的tick值对应更高的价格
+            tick_upper = tick + tick_width  # 更大的tick值对应更低的价格
         else:
-            tick_lower = tick - tick_range  # 更小的tick值对应更低的价格
-            tick_upper = tick + tick_range  # 更大的tick值对应更高的价格
+            tick_lower = tick - tick_width  # 更小的tick值对应更低的价格
+            tick_upper = tick + tick_width  # 更大的tick值对应更高的价格
 
         # 确保tick范围是60的倍数（PancakeSwap V3的要求）
         tick_lower = (tick_lower // 60) * 60
         tick_upper = (tick_upper // 60) * 60
 
-        print(f"\nTick范围:")
-        print(f"当前Tick: {tick}")
-        print(f"Tick下限: {tick_lower}")
-        print(f"Tick上限: {tick_upper}")
-
-        # 确保tick范围有效
-        if tick_lower >= tick_upper:
-            raise ValueError(f"无效的tick范围: {tick_lower} >= {tick_upper}")
-
-        # 确保tick范围在合约允许的范围内
-        MIN_TICK = -887272
-        MAX_TICK = 887272
-        if tick_lower < MIN_TICK or tick_upper > MAX_TICK:
-            raise ValueError(f"tick范围超出限制: {MIN_TICK} <= tick <= {MAX_TICK}")
-
-        # 转换期望数量为wei（使用Decimal确保精度）
-        amount0_desired_wei = int(Decimal(str(amount0_desired)) * Decimal(10 ** token0_decimals))
-        amount1_desired_wei = int(Decimal(str(amount1_desired)) * Decimal(10 ** token1_decimals))
-
-        # 计算最小数量（考虑滑点，使用Decimal确保精度）
-        amount0_min = int(Decimal(str(amount0_desired)) * (Decimal('1') - 10 * Decimal(str(slippage_percent)) / Decimal('100')) * Decimal(10 ** token0_decimals))
-        amount1_min = int(Decimal(str(amount1_desired)) * (Decimal('1') - 10 * Decimal(str(slippage_percent)) / Decimal('100')) * Decimal(10 ** token1_decimals))
-
-        print(f"\n数量信息:")
-        print(f"Token0 ({token0_name}):")
-        print(f"  期望数量: {amount0_desired_wei} (wei)")
-        print(f"  最小数量: {amount0_min} (wei)")
-        print(f"Token1 ({token1_name}):")
-        print(f"  期望数量: {amount1_desired_wei} (wei)")
-        print(f"  最小数量: {amount1_min} (wei)")
-
-        # 计算deadline
-        deadline = int((datetime.now() + timedelta(minutes=deadline_minutes)).timestamp())
-
-        # 加载PositionManager ABI
-        with open("ABI/NonfungiblePositionManager.json", "r") as f:
-            POSITION_MANAGER_ABI = json.load(f)
-
-        # 创建PositionManager合约实例
-        position_manager = w3.eth.contract(
-            address=Web3.to_checksum_address(POSITION_MANAGER),
-            abi=POSITION_MANAGER_ABI
-        )
+    print(f"\nTick范围:")
+    print(f"当前Tick: {tick}")
+    print(f"Tick下限: {tick_lower}")
+    print(f"Tick上限: {tick_upper}")
+
+    # 确保tick范围有效
+    if tick_lower >= tick_upper:
+        raise ValueError(f"无效的tick范围: {tick_lower} >= {tick_upper}")
+
+    # 确保tick范围在合约允许的范围内
+    MIN_TICK = -887272
+    MAX_TICK = 887272
+    if tick_lower < MIN_TICK or tick_upper > MAX_TICK:
+        raise ValueError(f"tick范围超出限制: {MIN_TICK} <= tick <= {MAX_TICK}")
+
+    # 转换期望数量为wei（使用Decimal确保精度）
+    amount0_desired_wei = int(Decimal(str(amount0_desired)) * Decimal(10 ** token0_decimals))
+    amount1_desired_wei = int(Decimal(str(amount1_desired)) * Decimal(10 ** token1_decimals))
+
+    # 计算最小数量（考虑滑点，使用Decimal确保精度）
+    amount0_min = int(Decimal(str(amount0_desired)) * (Decimal('1') - 10 * Decimal(str(slippage_percent)) / Decimal('100')) * Decimal(10 ** token0_decimals))
+    amount1_min = int(Decimal(str(amount1_desired)) * (Decimal('1') - 10 * Decimal(str(slippage_percent)) / Decimal('100')) * Decimal(10 ** token1_decimals))
+
+    print(f"\n数量信息:")
+    print(f"Token0 ({token0_name}):")
+    print(f"  期望数量: {amount0_desired_wei} (wei)")
+    print(f"  最小数量: {amount0_min} (wei)")
+    print(f"Token1 ({token1_name}):")
+    print(f"  期望数量: {amount1_desired_wei} (wei)")
+    print(f"  最小数量: {amount1_min} (wei)")
+
+    # 计算deadline
+    deadline = int((datetime.now() + timedelta(minutes=deadline_minutes)).timestamp())
+
+    # 加载PositionManager ABI
+    with open("ABI/NonfungiblePositionManager.json", "r") as f:
+        POSITION_MANAGER_ABI = json.load(f)
+
+    # 创建PositionManager合约实例
+    position_manager = w3.eth.contract(
+        address=Web3.to_checksum_address(POSITION_MANAGER),
+        abi=POSITION_MANAGER_ABI
+    )
+
+    # 准备mint参数
+    fee = int(Decimal(str(fee_percent)) * Decimal('10000'))  # 转换为合约使用的格式
+
+    mint_params = {
+        'token0': Web3.to_checksum_address(token0_address),
+        'token1': Web3.to_checksum_address(token1_address),
+        'fee': fee,
+        'tickLower': tick_lower,
+        'tickUpper': tick_upper,
+        'amount0Desired': amount0_desired_wei,
+        'amount1Desired': amount1_desired_wei,
+        'amount0Min': amount0_min,
+        'amount1Min': amount1_min,
+        'recipient': Web3.to_checksum_address(recipient),
+        'deadline': deadline
+    }
+
+    # mint_params = {
+    #     'token0': "0x55ad16Bd573B3365f43A9dAeB0Cc66A73821b4a5",
+    #     'token1': "0x55d398326f99059fF775485246999027B3197955",
+    #     'fee': 500,
+    #     'tickLower': -11930,
+    #     'tickUpper': -9840,
+    #     'amount0Desired': 70039168353970460471,
+    #     'amount1Desired': 24182265566658884179,
+    #     'amount0Min': 66571207111840214314,
+    #     'amount1Min': 23007124485730832111,
+    #     'recipient': "0x33723ef67C37F76B990b583812891c93C2Dbe87C",
+    #     'deadline': deadline
+    # }
+
+    print("\n=== Mint参数详情 ===")
+    print(f"Token0: {mint_params['token0']}")
+    print(f"Token1: {mint_params['token1']}")
+    print(f"Fee: {mint_params['fee']}")
+    print(f"Tick范围: {mint_params['tickLower']} - {mint_params['tickUpper']}")
+    print(f"Token0期望数量: {mint_params['amount0Desired']} (wei)")
+    print(f"Token1期望数量: {mint_params['amount1Desired']} (wei)")
+    print(f"Token0最小数量: {mint_params['amount0Min']} (wei)")
+    print(f"Token1最小数量: {mint_params['amount1Min']} (wei)")
+    print(f"接收地址: {mint_params['recipient']}")
+    print(f"截止时间: {datetime.fromtimestamp(mint_params['deadline'])}")
+
+    print("\n=== 价格范围信息 ===")
+    print(f"当前价格: {current_price:.8f} {sorted_token1_name}")
+    print(f"价格下限: {tick_lower}")
+    print(f"价格上限: {tick_upper}")
+    print(f"价格范围百分比: {price_range_percent}%")
+    print(f"滑点百分比: {slippage_percent}%")
+
+    print("\n=== 代币数量信息 ===")
+    print(f"Token0 ({token0_name}):")
+    print(f"  原始数量: {amount0_desired}")
+    print(f"  转换为wei: {amount0_desired_wei}")
+    print(f"  最小数量(wei): {amount0_min}")
+    print(f"Token1 ({token1_name}):")
+    print(f"  原始数量: {amount1_desired}")
+    print(f"  转换为wei: {amount1_desired_wei}")
+    print(f"  最小数量(wei): {amount1_min}")
+
+    return {
+        'mint_params': mint_params,
+        'position_manager': position_manager,
+        'pool_address': pool_address,
+        'current_price': current_price,
+        'tick': tick,
+        'token0_decimals': token0_decimals,
+        'token1_decimals': token1_decimals,
+        'tick_lower': tick_lower,
+        'tick_upper': tick_upper,
+        'amount0_desired': amount0_desired,
+        'amount1_desired': amount1_desired,
+        'amount0_min': amount0_min,
+        'amount1_min': amount1_min
+    }
+
+def parse_increase_liquidity(position_manager, tx_receipt) -> list:
+    """从交易收据中解析PositionManager的IncreaseLiquidity事件"""
+    return [
+        log for log in get_default_decoder().decode_receipt(tx_receipt, 'IncreaseLiquidity')
+        if log['address'] == position_manager.address
+    ]
 
-        # 准备mint参数
-        fee = int(Decimal(str(fee_percent)) * Decimal('10000'))  # 转换为合约使用的格式
-
-        mint_params = {
-            'token0': Web3.to_checksum_address(token0_address),
-            'token1': Web3.to_checksum_address(token1_address),
-            'fee': fee,
-            'tickLower': tick_lower,
-            'tickUpper': tick_upper,
-            'amount0Desired': amount0_desired_wei,
-            'amount1Desired': amount1_desired_wei,
-            'amount0Min': amount0_min,
-            'amount1Min': amount1_min,
-            'recipient': Web3.to_checksum_address(recipient),
-            'deadline': deadline
+def build_mint_transaction(w3: Web3, prepared: dict, sender: str, nonce: int, gas_price: int, chain_id: int = 56) -> tuple:
+    """构建mint交易，gas限制由GasOracle估算
+
+    Returns:
+        tuple: (transaction, gas_profile, raw_estimate)
+    """
+    gas_oracle = get_gas_oracle(w3)
+    transaction = prepared['position_manager'].functions.mint(prepared['mint_params']).build_transaction({
+        'from': sender,
+        'nonce': nonce,
+        'gas': 0,  # 由GasOracle估算后填入
+        'gasPrice': gas_price,
+        'chainId': chain_id
+    })
+    gas_profile = mint_gas_profile(prepared['pool_address'], prepared['tick'], prepared['tick_lower'], prepared['tick_upper'])
+    transaction['gas'], raw_estimate = gas_oracle.estimate_gas(
+        transaction, gas_profile, cache_key=mint_cache_key(sender, prepared['mint_params'])
+    )
+    return transaction, gas_profile, raw_estimate
+
+def build_position_result(prepared: dict, tokenId: int, liquidity: int, amount0: int, amount1: int) -> dict:
+    """根据准备好的mint信息和实际mint结果构建返回值"""
+    token0_decimals = prepared['token0_decimals']
+    token1_decimals = prepared['token1_decimals']
+    return {
+        'tokenId': tokenId,
+        'liquidity': liquidity,
+        'amount0': amount0,
+        'amount1': amount1,
+        'pool_address': prepared['pool_address'],
+        'current_price': prepared['current_price'],
+        'price_range': {
+            'lower': prepared['tick_lower'],
+            'upper': prepared['tick_upper']
+        },
+        'tick_range': {
+            'lower': prepared['tick_lower'],
+            'upper': prepared['tick_upper']
+        },
+        'amounts': {
+            'token0': {
+                'desired': prepared['amount0_desired'],
+                'min': prepared['amount0_min'] / (10 ** token0_decimals),
+                'actual': amount0 / (10 ** token0_decimals)
+            },
+            'token1': {
+                'desired': prepared['amount1_desired'],
+                'min': prepared['amount1_min'] / (10 ** token1_decimals),
+                'actual': amount1 / (10 ** token1_decimals)
+            }
         }
+    }
 
-        # mint_params = {
-        #     'token0': "0x55ad16Bd573B3365f43A9dAeB0Cc66A73821b4a5",
-        #     'token1': "0x55d398326f99059fF775485246999027B3197955",
-        #     'fee': 500,
-        #     'tickLower': -11930,
-        #     'tickUpper': -9840,
-        #     'amount0Desired': 70039168353970460471,
-        #     'amount1Desired': 24182265566658884179,
-        #     'amount0Min': 66571207111840214314,
-        #     'amount1Min': 23007124485730832111,
-        #     'recipient': "0x33723ef67C37F76B990b583812891c93C2Dbe87C",
-        #     'deadline': deadline
-        # }
-
-        print("\n=== Mint参数详情 ===")
-        print(f"Token0: {mint_params['token0']}")
-        print(f"Token1: {mint_params['token1']}")
-        print(f"Fee: {mint_params['fee']}")
-        print(f"Tick范围: {mint_params['tickLower']} - {mint_params['tickUpper']}")
-        print(f"Token0期望数量: {mint_params['amount0Desired']} (wei)")
-        print(f"Token1期望数量: {mint_params['amount1Desired']} (wei)")
-        print(f"Token0最小数量: {mint_params['amount0Min']} (wei)")
-        print(f"Token1最小数量: {mint_params['amount1Min']} (wei)")
-        print(f"接收地址: {mint_params['recipient']}")
-        print(f"截止时间: {datetime.fromtimestamp(mint_params['deadline'])}")
-
-        print("\n=== 价格范围信息 ===")
-        print(f"当前价格: {current_price:.8f} {sorted_token1_name}")
-        print(f"价格下限: {tick_lower}")
-        print(f"价格上限: {tick_upper}")
-        print(f"价格范围百分比: {price_range_percent}%")
-        print(f"滑点百分比: {slippage_percent}%")
-
-        print("\n=== 代币数量信息 ===")
-        print(f"Token0 ({token0_name}):")
-        print(f"  原始数量: {amount0_desired}")
-        print(f"  转换为wei: {amount0_desired_wei}")
-        print(f"  最小数量(wei): {amount0_min}")
-        print(f"Token1 ({token1_name}):")
-        print(f"  原始数量: {amount1_desired}")
-        print(f"  转换为wei: {amount1_desired_wei}")
-        print(f"  最小数量(wei): {amount1_min}")
+def mint_v3_position(
+    token0_name: str,
+    token1_name: str,
+    fee_percent: float,
+    amount0_desired: float,
+    amount1_desired: float,
+    recipient: str,
+    private_key: str = None,
+    price_range_percent: float = 0.5,
+    slippage_percent: float = 5.0,
+    deadline_minutes: int = 20,
+    send_transaction: bool = False,
+    tick_range: tuple = None
+) -> dict:
+    """创建V3流动性头寸
+
+    tick_range为 (tickLower, tickUpper) 时直接使用该区间（例如range_optimizer.choose_mint_ticks的结果），
+    否则按price_range_percent围绕当前tick计算区间
+    """
+    try:
+        # 初始化Web3
+        w3 = get_web3(get_best_node_url(BSC_NODE_URL))
+
+        prepared = prepare_mint(
+            w3, token0_name, token1_name, fee_percent, amount0_desired, amount1_desired, recipient,
+            price_range_percent=price_range_percent,
+            slippage_percent=slippage_percent,
+            deadline_minutes=deadline_minutes,
+            tick_range=tick_range
+        )
+        mint_params = prepared['mint_params']
+        position_manager = prepared['position_manager']
+        token0_decimals = prepared['token0_decimals']
+        token1_decimals = prepared['token1_decimals']
 
         if send_transaction and private_key:
             # 获取账户地址
@@ -466,17 +588,14 @@ def mint_v3_position(
             # 获取nonce
             nonce = w3.eth.get_transaction_count(address)
 
-            # 获取gas价格
-            gas_price = w3.eth.gas_price
+            # 获取gas价格（同一区块内复用缓存）
+            gas_oracle = get_gas_oracle(w3)
+            gas_price = gas_oracle.get_gas_price()
 
-            # 构建交易
-            transaction = position_manager.functions.mint(mint_params).build_transaction({
-                'from': address,
-                'nonce': nonce,
-                'gas': 5000000,  # 设置一个足够大的gas限制
-                'gasPrice': gas_price,
-                'chainId': 56  # BSC主网chainId
-            })
+            # 构建交易，gas限制按估算值加学习到的安全系数
+            transaction, gas_profile, raw_estimate = build_mint_transaction(
+                w3, prepared, address, nonce, gas_price, chain_id=56  # BSC主网chainId
+            )
 
             # 签名交易
             signed_txn = w3.eth.account.sign_transaction(transaction, private_key)
@@ -490,6 +609,9 @@ def mint_v3_position(
                 print("等待交易确认...")
                 tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
 
+                # 记录实际消耗的gas用于学习安全系数
+                gas_oracle.record(gas_profile, raw_estimate, tx_receipt['gasUsed'])
+
                 # 检查交易状态
                 if tx_receipt.status == 0:
                     print("\n交易失败!")
@@ -499,18 +621,7 @@ def mint_v3_position(
 
                 # 解析交易日志获取返回值
                 # 只处理 IncreaseLiquidity 事件
-                increase_liquidity_event = position_manager.events.IncreaseLiquidity()
-                logs = []
-                for log in tx_receipt['logs']:
-                    try:
-                        # 检查日志是否来自 PositionManager 合约
-                        if log['address'].lower() == POSITION_MANAGER.lower():
-                            # 尝试解析事件
-                            parsed_log = increase_liquidity_event.process_log(log)
-                            if parsed_log:
-                                logs.append(parsed_log)
-                    except Exception:
-                        continue
+                logs = parse_increase_liquidity(position_manager, tx_receipt)
 
                 if not logs:
                     print("\n警告: 未找到 IncreaseLiquidity 事件")
@@ -541,32 +652,7 @@ def mint_v3_position(
             return {
                 'transaction_hash': tx_hash.hex(),
                 'status': tx_receipt.status,
-                'tokenId': tokenId if logs else None,
-                'liquidity': liquidity if logs else None,
-                'amount0': amount0 if logs else None,
-                'amount1': amount1 if logs else None,
-                'pool_address': pool_address,
-                'current_price': current_price,
-                'price_range': {
-                    'lower': tick_lower,
-                    'upper': tick_upper
-                },
-                'tick_range': {
-                    'lower': tick_lower,
-                    'upper': tick_upper
-                },
-                'amounts': {
-                    'token0': {
-                        'desired': amount0_desired,
-                        'min': amount0_min / (10 ** token0_decimals),
-                        'actual': amount0 / (10 ** token0_decimals) if logs else None
-                    },
-                    'token1': {
-                        'desired': amount1_desired,
-                        'min': amount1_min / (10 ** token1_decimals),
-                        'actual': amount1 / (10 ** token1_decimals) if logs else None
-                    }
-                }
+                **build_position_result(prepared, tokenId, liquidity, amount0, amount1)
             }
         else:
             # 模拟调用
@@ -580,34 +666,7 @@ def mint_v3_position(
                 print(f"Token0 实际使用数量: {amount0 / (10 ** token0_decimals):.8f}")
                 print(f"Token1 实际使用数量: {amount1 / (10 ** token1_decimals):.8f}")
 
-                return {
-                    'tokenId': tokenId,
-                    'liquidity': liquidity,
-                    'amount0': amount0,
-                    'amount1': amount1,
-                    'pool_address': pool_address,
-                    'current_price': current_price,
-                    'price_range': {
-                        'lower': tick_lower,
-                        'upper': tick_upper
-                    },
-                    'tick_range': {
-                        'lower': tick_lower,
-                        'upper': tick_upper
-                    },
-                    'amounts': {
-                        'token0': {
-                            'desired': amount0_desired,
-                            'min': amount0_min / (10 ** token0_decimals),
-                            'actual': amount0 / (10 ** token0_decimals)
-                        },
-                        'token1': {
-                            'desired': amount1_desired,
-                            'min': amount1_min / (10 ** token1_decimals),
-                            'actual': amount1 / (10 ** token1_decimals)
-                        }
-                    }
-                }
+                return build_position_result(prepared, tokenId, liquidity, amount0, amount1)
             except Exception as e:
                 error_msg = str(e)
                 print(f"\n模拟调用失败，详细错误信息:")
@@ -626,6 +685,99 @@ def mint_v3_position(
         print(f"\n创建流动性池子时出错: {str(e)}")
         return None
 
+def mint_v3_positions_batch(
+    mint_specs: list,
+    private_key: str,
+    w3: Web3 = None,
+    chain_id: int = 56,
+    max_workers: int = 8,
+    receipt_timeout: int = 120
+) -> list:
+    """批量创建多个V3流动性头寸
+
+    先为所有头寸准备参数，在本地分配连续的nonce并全部签名，然后并行广播交易、并行等待收据。
+    传入指向本地节点（例如anvil/hardhat的BSC分叉）的w3和对应chain_id即可在本地测试
+
+    Args:
+        mint_specs: mint参数列表，每项为dict，键与mint_v3_position的参数相同
+            (token0_name, token1_name, fee_percent, amount0_desired, amount1_desired, recipient,
+             price_range_percent, slippage_percent, deadline_minutes, tick_range)
+        private_key: 签名使用的私钥
+        w3: Web3实例，默认连接BSC_NODE_URL
+        chain_id: 链ID
+        max_workers: 并行广播和等待收据的线程数
+        receipt_timeout: 等待单个收据的超时时间（秒）
+
+    Returns:
+        list: 与mint_specs一一对应的结果，失败的项包含error字段
+    """
+    w3 = w3 or get_web3(get_best_node_url(BSC_NODE_URL))
+    account = w3.eth.account.from_key(private_key)
+    address = account.address
+
+    # 准备所有头寸的mint参数
+    results = [None] * len(mint_specs)
+    prepared_list = []
+    for index, spec in enumerate(mint_specs):
+        try:
+            prepared_list.append((index, prepare_mint(w3, **spec)))
+        except Exception as e:
+            print(f"\n准备第{index + 1}个头寸时出错: {str(e)}")
+            results[index] = {'error': str(e)}
+
+    if not prepared_list:
+        return results
+
+    # 在本地分配连续的nonce并签名所有交易
+    # 整个批次只获取一次gas价格，相同参数的gas估算会被复用
+    gas_oracle = get_gas_oracle(w3)
+    nonce = w3.eth.get_transaction_count(address, 'pending')
+    gas_price = gas_oracle.get_gas_price()
+    signed_list = []
+    gas_records = {}
+    for offset, (index, prepared) in enumerate(prepared_list):
+        transaction, gas_profile, raw_estimate = build_mint_transaction(
+            w3, prepared, address, nonce + offset, gas_price, chain_id=chain_id
+        )
+        gas_records[index] = (gas_profile, raw_estimate)
+        signed_list.append((index, prepared, w3.eth.account.sign_transaction(transaction, private_key)))
+
+    print(f"\n已签名 {len(signed_list)} 笔交易 (nonce {nonce} - {nonce + len(signed_list) - 1})，开始并行广播...")
+
+    def send_and_wait(item):
+        index, prepared, signed_txn = item
+        tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=receipt_timeout)
+        return index, prepared, tx_hash, tx_receipt
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(send_and_wait, item): item for item in signed_list}
+        for future in as_completed(futures):
+            index, prepared, signed_txn = futures[future]
+            try:
+                index, prepared, tx_hash, tx_receipt = future.result()
+            except Exception as e:
+                # 广播失败会导致后续nonce的交易无法打包，需要人工处理
+                print(f"\n第{index + 1}个头寸的交易失败: {str(e)}")
+                results[index] = {'error': str(e), 'transaction_hash': signed_txn.hash.hex()}
+                continue
+
+            gas_oracle.record(*gas_records[index], tx_receipt['gasUsed'])
+            result = {'transaction_hash': tx_hash.hex(), 'status': tx_receipt.status}
+            logs = parse_increase_liquidity(prepared['position_manager'], tx_receipt) if tx_receipt.status == 1 else []
+            if logs:
+                args = logs[0]['args']
+                result.update(build_position_result(
+                    prepared, args['tokenId'], args['liquidity'], args['amount0'], args['amount1']
+                ))
+            else:
+                result['error'] = "交易失败" if tx_receipt.status == 0 else "未找到 IncreaseLiquidity 事件"
+            results[index] = result
+
+    success_count = sum(1 for r in results if r and 'error' not in r)
+    print(f"\n批量mint完成: 成功 {success_count}/{len(mint_specs)}")
+    return results
+
 if __name__ == "__main__":
     # 从.env文件获取私钥
     private_key = os.getenv('PRIVATE_KEY')
@@ -0,0 +1,94 @@
+import json
+from typing import List, Optional, Tuple, Any
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+
+# PancakeInterfaceMulticall合约地址 (BSC主网)
+MULTICALL_ADDRESS = "0xac1cE734566f390A94b00eb9bf561c2625BF44ea"
+
+# 加载Multicall ABI
+with open("ABI/PancakeInterfaceMulticall.json", "r") as f:
+    MULTICALL_ABI = json.load(f)
+
+# 每个子调用的gas上限
+DEFAULT_CALL_GAS_LIMIT = 1000000
+
+# 每次multicall打包的子调用数量
+DEFAULT_BATCH_SIZE = 500
+
+# 单次eth_call可用的gas（节点的RPC gas上限通常为50M，留出multicall自身的开销）
+RPC_CALL_GAS_CAP = 45000000
+
+def gas_capped_batch_size(call_gas_limit: int, gas_cap: int = RPC_CALL_GAS_CAP) -> int:
+    """子调用gas上限较高（报价、模拟swap）时，保证一批的gas总和不超过节点上限的批次大小"""
+    return max(gas_cap // call_gas_limit, 1)
+
+def bind_call(fn, address: str):
+    """把合约函数调用绑定到另一个地址（ABI相同）
+
+    为每个池子或代币创建合约实例需要数毫秒，批量读取数千个地址时用同一个合约的函数调用绑定地址
+    """
+    fn.address = Web3.to_checksum_address(address)
+    return fn
+
+class Multicall:
+    """将多个合约只读调用打包为一次eth_call"""
+
+    def __init__(self, w3: Web3, address: str = MULTICALL_ADDRESS,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 call_gas_limit: int = DEFAULT_CALL_GAS_LIMIT):
+        self.w3 = w3
+        self.batch_size = batch_size
+        self.call_gas_limit = call_gas_limit
+        self.contract = w3.eth.contract(address=Web3.to_checksum_address(address), abi=MULTICALL_ABI)
+
+    def get_eth_balance(self, address: str):
+        """返回查询BNB余额的子调用，可与其他调用一起打包"""
+        return self.contract.functions.getEthBalance(Web3.to_checksum_address(address))
+
+    def aggregate(self, calls: List[Any], block_identifier="latest") -> Tuple[int, List[Optional[Any]]]:
+        """批量执行合约调用
+
+        Args:
+            calls: ContractFunction列表，例如 factory.functions.getPool(a, b, fee)
+            block_identifier: 查询的区块，多批次调用时会固定在同一个区块
+
+        Returns:
+            tuple: (block_number, results)
+            - block_number: 实际执行调用的区块号
+            - results: 与calls一一对应的解码结果，单一返回值会被展开，调用失败时为None
+        """
+        if not calls:
+            return None, []
+
+        results = []
+        block_number = None
+        for start in range(0, len(calls), self.batch_size):
+            batch = calls[start:start + self.batch_size]
+            encoded = [
+                (fn.address, self.call_gas_limit, fn._encode_transaction_data())
+                for fn in batch
+            ]
+            block_number, return_data = self.contract.functions.multicall(encoded).call(
+                block_identifier=block_identifier
+            )
+            # 后续批次固定在第一批返回的区块，保证结果一致
+            block_identifier = block_number
+
+            for fn, (success, _gas_used, data) in zip(batch, return_data):
+                results.append(self.decode_result(fn, success, data))
+
+        return block_number, results
+
+    def decode_result(self, fn, success: bool, data: bytes) -> Optional[Any]:
+        """解码单个子调用的返回值"""
+        if not success or not data:
+            return None
+        try:
+            output_types = get_abi_output_types(fn.abi)
+            decoded = self.w3.codec.decode(output_types, data)
+        except Exception:
+            return None
+        if len(decoded) == 1:
+            return decoded[0]
+        return decoded
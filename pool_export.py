@@ -0,0 +1,165 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 导出目录
+EXPORT_DIR = "exports"
+
+# 地址以20字节定长二进制存储
+ADDRESS_TYPE = pa.binary(20)
+
+POOL_SCHEMA = pa.schema([
+    ("pool", ADDRESS_TYPE),
+    ("token0", ADDRESS_TYPE),
+    ("token1", ADDRESS_TYPE),
+    ("token0_symbol", pa.string()),
+    ("token1_symbol", pa.string()),
+    ("token0_name", pa.string()),
+    ("token1_name", pa.string()),
+    ("fee", pa.uint32()),
+    ("tick_spacing", pa.int32()),
+])
+
+TOKEN_SCHEMA = pa.schema([
+    ("address", ADDRESS_TYPE),
+    ("name", pa.string()),
+    ("symbol", pa.string()),
+    ("decimals", pa.uint8()),
+    ("total_supply", pa.string()),  # uint256超出定长整数范围，以十进制字符串保存
+    ("count", pa.uint64()),
+    ("rank", pa.uint32()),
+    ("first_seen", pa.timestamp("s")),
+    ("last_seen", pa.timestamp("s")),
+])
+
+BLOCK_COUNT_SCHEMA = pa.schema([
+    ("block_number", pa.uint64()),
+    ("token", ADDRESS_TYPE),
+    ("count", pa.uint32()),
+])
+
+def address_to_bytes(address: str) -> bytes:
+    """十六进制地址转换为20字节"""
+    return bytes.fromhex(address[2:] if address.startswith("0x") else address)
+
+def bytes_to_address(value: bytes) -> str:
+    """20字节转换回十六进制地址（小写）"""
+    return "0x" + value.hex()
+
+def parse_time(value: str):
+    """解析监控脚本写入的时间字符串"""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+
+def write_table(table: pa.Table, name: str, export_dir: str = EXPORT_DIR) -> Tuple[str, str]:
+    """同时写出Parquet文件（供分析任务使用）和Arrow IPC文件（供内存映射读取）"""
+    os.makedirs(export_dir, exist_ok=True)
+    parquet_path = os.path.join(export_dir, f"{name}.parquet")
+    arrow_path = os.path.join(export_dir, f"{name}.arrow")
+
+    pq.write_table(table, parquet_path, compression="zstd")
+    with pa.OSFile(arrow_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    return parquet_path, arrow_path
+
+def pools_to_table(pools: List[Dict]) -> pa.Table:
+    """把池子信息列表转换为Arrow表"""
+    return pa.Table.from_pydict({
+        "pool": [address_to_bytes(p["pool"]) for p in pools],
+        "token0": [address_to_bytes(p["token0"]) for p in pools],
+        "token1": [address_to_bytes(p["token1"]) for p in pools],
+        "token0_symbol": [p.get("token0_symbol") for p in pools],
+        "token1_symbol": [p.get("token1_symbol") for p in pools],
+        "token0_name": [p.get("token0_name") for p in pools],
+        "token1_name": [p.get("token1_name") for p in pools],
+        "fee": [p["fee"] for p in pools],
+        "tick_spacing": [p["tickSpacing"] for p in pools],
+    }, schema=POOL_SCHEMA)
+
+def tokens_to_table(tokens: Dict[str, Dict]) -> pa.Table:
+    """把bsc_tokens.json格式的代币信息转换为Arrow表"""
+    infos = list(tokens.values())
+    return pa.Table.from_pydict({
+        "address": [address_to_bytes(address) for address in tokens],
+        "name": [t.get("name") for t in infos],
+        "symbol": [t.get("symbol") for t in infos],
+        "decimals": [t.get("decimals") for t in infos],
+        "total_supply": [str(t.get("total_supply", "0")) for t in infos],
+        "count": [t.get("count", 0) for t in infos],
+        "rank": [t.get("rank", 0) for t in infos],
+        "first_seen": [parse_time(t.get("first_seen")) for t in infos],
+        "last_seen": [parse_time(t.get("last_seen")) for t in infos],
+    }, schema=TOKEN_SCHEMA)
+
+def export_pools(pools: List[Dict], name: str = "pools", export_dir: str = EXPORT_DIR) -> Tuple[str, str]:
+    """导出池子信息"""
+    return write_table(pools_to_table(pools), name, export_dir)
+
+def export_tokens(tokens: Dict[str, Dict], name: str = "tokens", export_dir: str = EXPORT_DIR) -> Tuple[str, str]:
+    """导出代币统计"""
+    return write_table(tokens_to_table(tokens), name, export_dir)
+
+def export_block_counts(block_counts: List[Tuple[int, Dict[str, int]]], export_dir: str = EXPORT_DIR) -> str:
+    """把每个区块的代币Transfer计数追加为一个新的Parquet分片
+
+    Args:
+        block_counts: [(block_number, {token_address: count}), ...]
+
+    Returns:
+        str: 写出的分片路径，没有数据时返回None
+    """
+    rows = [(block, token, count) for block, counts in block_counts for token, count in counts.items()]
+    if not rows:
+        return None
+
+    table = pa.Table.from_pydict({
+        "block_number": [r[0] for r in rows],
+        "token": [address_to_bytes(r[1]) for r in rows],
+        "count": [r[2] for r in rows],
+    }, schema=BLOCK_COUNT_SCHEMA)
+
+    counts_dir = os.path.join(export_dir, "block_counts")
+    os.makedirs(counts_dir, exist_ok=True)
+    first_block = block_counts[0][0]
+    last_block = block_counts[-1][0]
+    path = os.path.join(counts_dir, f"blocks-{first_block:012d}-{last_block:012d}.parquet")
+    pq.write_table(table, path, compression="zstd")
+    return path
+
+def open_table(name: str, export_dir: str = EXPORT_DIR) -> pa.Table:
+    """以内存映射方式打开Arrow IPC文件，不复制数据也不解析JSON"""
+    source = pa.memory_map(os.path.join(export_dir, f"{name}.arrow"), "r")
+    return pa.ipc.open_file(source).read_all()
+
+def read_pools(export_dir: str = EXPORT_DIR) -> pa.Table:
+    """读取池子表"""
+    return open_table("pools", export_dir)
+
+def read_tokens(export_dir: str = EXPORT_DIR) -> pa.Table:
+    """读取代币表"""
+    return open_table("tokens", export_dir)
+
+def read_block_counts(export_dir: str = EXPORT_DIR, columns: List[str] = None, filters=None) -> pa.Table:
+    """读取全部区块计数分片，可指定列和过滤条件，例如 [("block_number", ">=", 40000000)]"""
+    return pq.read_table(os.path.join(export_dir, "block_counts"), columns=columns, filters=filters, memory_map=True)
+
+def main():
+    """把现有的JSON文件转换为列式格式"""
+    if os.path.exists("pancakeswap_v3_pools.json"):
+        with open("pancakeswap_v3_pools.json", "r") as f:
+            print(f"已导出池子信息: {export_pools(json.load(f))}")
+    if os.path.exists("known_pools.json"):
+        with open("known_pools.json", "r", encoding="utf-8") as f:
+            print(f"已导出已知池子信息: {export_pools(json.load(f), name='known_pools')}")
+    if os.path.exists("bsc_tokens.json"):
+        with open("bsc_tokens.json", "r", encoding="utf-8") as f:
+            print(f"已导出代币信息: {export_tokens(json.load(f))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from web3 import Web3
+from multicall import Multicall, bind_call
+from state_store import get_state_store, write_json_atomic
+from bsc_provider import get_web3
+from token_graph import resolve_token
+from price_table import PriceTable
+
+# 排名索引文件，其他脚本直接读取即可查询
+POOL_INDEX_FILE = "pool_index.json"
+
+# sqrtPriceX96的定点数基数
+Q96 = 2 ** 96
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# ERC20 ABI
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    }
+]
+
+def pool_price(sqrt_price_x96: int, decimals0: int, decimals1: int) -> float:
+    """池子当前价格：1个token0可兑换的token1数量（已按精度换算）"""
+    return (sqrt_price_x96 / Q96) ** 2 * 10 ** (decimals0 - decimals1)
+
+class PoolIndex:
+    """全部已知池子的流动性、代币余额和美元TVL索引，支持按交易对、代币或费率查询前N名
+
+    refresh 用multicall批量读取所有池子的slot0、liquidity和两种代币的余额，
+    读到的池子状态同时用于更新价格表，再按价格表计算美元TVL
+    """
+
+    def __init__(self, w3: Web3 = None, multicall: Multicall = None, pools: List[Dict] = None,
+                 price_table: PriceTable = None):
+        self.w3 = w3
+        self.multicall = multicall or (Multicall(w3) if w3 else None)
+        self.pools = pools
+        self.price_table = price_table
+        self.entries: Dict[str, Dict] = {}
+        self.token_prices: Dict[str, float] = {}
+        self.block_number = None
+        self.updated_at = 0.0
+        self.by_pair: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        self.by_token: Dict[str, List[str]] = defaultdict(list)
+        self.by_fee: Dict[int, List[str]] = defaultdict(list)
+
+    def refresh(self, block_identifier="latest") -> int:
+        """重新读取所有池子的链上状态并重建索引，返回区块号"""
+        store = get_state_store()
+        pools = self.pools if self.pools is not None else store.load_pools(known_only=True)
+        tokens = store.load_tokens()
+
+        pool_contract = self.w3.eth.contract(abi=POOL_ABI)
+        erc20 = self.w3.eth.contract(abi=ERC20_ABI)
+        calls = []
+        for pool in pools:
+            address = Web3.to_checksum_address(pool["pool"])
+            calls.extend([
+                bind_call(pool_contract.functions.slot0(), address),
+                bind_call(pool_contract.functions.liquidity(), address),
+                bind_call(erc20.functions.balanceOf(address), pool["token0"]),
+                bind_call(erc20.functions.balanceOf(address), pool["token1"]),
+            ])
+        # 状态库中没有精度的代币一起查询
+        missing_decimals = sorted({
+            Web3.to_checksum_address(pool[key]) for pool in pools for key in ("token0", "token1")
+            if tokens.get(Web3.to_checksum_address(pool[key]), {}).get("decimals") is None
+        })
+        calls.extend(bind_call(erc20.functions.decimals(), token) for token in missing_decimals)
+
+        block_number, results = self.multicall.aggregate(calls, block_identifier=block_identifier)
+        decimals = {address: info["decimals"] for address, info in tokens.items() if info.get("decimals") is not None}
+        for token, value in zip(missing_decimals, results[4 * len(pools):]):
+            decimals[token] = value if value is not None else 18
+
+        entries = []
+        for index, pool in enumerate(pools):
+            slot0, liquidity, balance0, balance1 = results[4 * index:4 * index + 4]
+            if slot0 is None:
+                continue
+            token0 = Web3.to_checksum_address(pool["token0"])
+            token1 = Web3.to_checksum_address(pool["token1"])
+            decimals0, decimals1 = decimals.get(token0, 18), decimals.get(token1, 18)
+            entries.append({
+                "pool": Web3.to_checksum_address(pool["pool"]),
+                "pair": f"{pool.get('token0_symbol')}/{pool.get('token1_symbol')}",
+                "token0_symbol": pool.get("token0_symbol"),
+                "token1_symbol": pool.get("token1_symbol"),
+                "token0": token0,
+                "token1": token1,
+                "fee": pool["fee"],
+                "tickSpacing": pool.get("tickSpacing"),
+                "tick": slot0[1],
+                "sqrt_price_x96": slot0[0],
+                "price": pool_price(slot0[0], decimals0, decimals1) if slot0[0] else 0.0,
+                "liquidity": liquidity or 0,
+                "amount0": (balance0 or 0) / 10 ** decimals0,
+                "amount1": (balance1 or 0) / 10 ** decimals1,
+            })
+
+        if self.price_table is None:
+            self.price_table = PriceTable(self.w3, self.multicall, pools)
+        for entry in entries:
+            self.price_table.set_pool_state(entry["pool"], entry["sqrt_price_x96"], entry["liquidity"], entry["tick"])
+        self.price_table.block_number = block_number
+        self.price_table.rebuild()
+        prices = self.price_table.usd_prices()
+        for entry in entries:
+            entry["tvl_usd"] = (entry["amount0"] * prices.get(entry["token0"], 0.0)
+                                + entry["amount1"] * prices.get(entry["token1"], 0.0))
+
+        self.load_entries(entries, prices, block_number)
+        return block_number
+
+    def load_entries(self, entries: List[Dict], prices: Dict[str, float], block_number: int, updated_at: float = None):
+        """用池子记录重建索引，每个索引内按TVL降序排列"""
+        entries = sorted(entries, key=lambda entry: entry["tvl_usd"], reverse=True)
+        self.entries = {entry["pool"]: entry for entry in entries}
+        self.token_prices = prices
+        self.block_number = block_number
+        self.updated_at = updated_at or time.time()
+        self.by_pair.clear()
+        self.by_token.clear()
+        self.by_fee.clear()
+        for entry in entries:
+            self.by_pair[pair_key(entry["token0"], entry["token1"])].append(entry["pool"])
+            self.by_token[entry["token0"]].append(entry["pool"])
+            self.by_token[entry["token1"]].append(entry["pool"])
+            self.by_fee[entry["fee"]].append(entry["pool"])
+
+    def top(self, n: int = 10, pair: Tuple[str, str] = None, token: str = None, fee: int = None,
+            by: str = "tvl_usd") -> List[Dict]:
+        """查询前N个池子，可按交易对、代币和费率过滤，by为排序字段（tvl_usd或liquidity）"""
+        if pair:
+            candidates = self.by_pair.get(pair_key(*pair), [])
+        elif token:
+            candidates = self.by_token.get(Web3.to_checksum_address(token), [])
+        elif fee is not None:
+            candidates = self.by_fee.get(fee, [])
+        else:
+            candidates = list(self.entries)
+
+        entries = [self.entries[address] for address in candidates]
+        if token and pair:
+            entries = [e for e in entries if Web3.to_checksum_address(token) in (e["token0"], e["token1"])]
+        if fee is not None and (pair or token):
+            entries = [e for e in entries if e["fee"] == fee]
+        if by != "tvl_usd":
+            entries = sorted(entries, key=lambda entry: entry[by], reverse=True)
+        return entries[:n]
+
+    def best_pool(self, token0: str, token1: str, by: str = "tvl_usd") -> Optional[Dict]:
+        """交易对中TVL（或流动性）最大的池子"""
+        top = self.top(1, pair=(token0, token1), by=by)
+        return top[0] if top else None
+
+    def save(self, path: str = POOL_INDEX_FILE):
+        write_json_atomic(path, {
+            "block": self.block_number,
+            "updated_at": self.updated_at,
+            "prices": self.token_prices,
+            "pools": list(self.entries.values()),
+        }, indent=2)
+
+    @classmethod
+    def load(cls, path: str = POOL_INDEX_FILE) -> Optional["PoolIndex"]:
+        """读取保存的索引，文件不存在时返回None"""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.load_entries(data["pools"], data["prices"], data["block"], data["updated_at"])
+        return index
+
+def pair_key(token0: str, token1: str) -> Tuple[str, str]:
+    """交易对索引键，与代币顺序无关"""
+    return tuple(sorted((Web3.to_checksum_address(token0), Web3.to_checksum_address(token1)), key=str.lower))
+
+def get_pool_ranking(max_age: float = None, path: str = POOL_INDEX_FILE) -> Optional[PoolIndex]:
+    """读取保存的池子排名索引，不存在或超过max_age秒时返回None"""
+    index = PoolIndex.load(path)
+    if index is None or (max_age is not None and time.time() - index.updated_at > max_age):
+        return None
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description='按TVL或流动性查询已知池子排名')
+    parser.add_argument('--refresh', action='store_true', help='重新读取链上状态并保存索引')
+    parser.add_argument('--watch', type=float, help='每隔N秒刷新一次索引')
+    parser.add_argument('--top', type=int, default=20, help='显示的池子数量')
+    parser.add_argument('--pair', help='按交易对过滤，例如 CAKE/USDT')
+    parser.add_argument('--token', help='按代币过滤')
+    parser.add_argument('--fee', type=int, help='按费率过滤，例如 500')
+    parser.add_argument('--by', choices=['tvl_usd', 'liquidity'], default='tvl_usd', help='排序字段')
+    args = parser.parse_args()
+
+    index = None if args.refresh or args.watch else PoolIndex.load()
+    if index is None:
+        index = PoolIndex(get_web3())
+        started = time.perf_counter()
+        block_number = index.refresh()
+        index.save()
+        print(f"已刷新 {len(index.entries)} 个池子（区块 {block_number}），耗时 {time.perf_counter() - started:.2f} 秒")
+
+    while args.watch:
+        time.sleep(args.watch)
+        try:
+            block_number = index.refresh()
+            index.save()
+            print(f"[{time.strftime('%H:%M:%S')}] 已刷新 {len(index.entries)} 个池子（区块 {block_number}）")
+        except Exception as e:
+            print(f"刷新池子索引失败: {str(e)}")
+
+    tokens = get_state_store().load_tokens()
+    pair = None
+    if args.pair:
+        symbols = args.pair.split('/')
+        pair = tuple(resolve_token(symbol, tokens) for symbol in symbols)
+        if len(pair) != 2 or not all(pair):
+            print(f"未找到交易对: {args.pair}")
+            return
+    token = resolve_token(args.token, tokens) if args.token else None
+    if args.token and not token:
+        print(f"未找到代币: {args.token}")
+        return
+
+    print(f"\n区块 {index.block_number} 的池子排名:")
+    print(f"{'交易对':<24}{'费率':>8}{'TVL(USD)':>18}{'流动性':>30}  池子地址")
+    for entry in index.top(args.top, pair=pair, token=token, fee=args.fee, by=args.by):
+        print(f"{entry['pair']:<24}{entry['fee'] / 10000:>7}%{entry['tvl_usd']:>18,.2f}{entry['liquidity']:>30}  {entry['pool']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import time
+import argparse
+from typing import Dict, List
+import numpy as np
+from web3 import Web3
+from multicall import Multicall
+
+# 时间序列文件目录
+TIMESERIES_DIR = "timeseries"
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# 每条记录的定长二进制格式（小端），大整数以原始字节保存，同时保留float64便于直接分析
+RECORD_DTYPE = np.dtype([
+    ("block", "<u8"),
+    ("timestamp", "<u8"),
+    ("tick", "<i4"),
+    ("price", "<f8"),            # 未调整精度的价格 token1/token0
+    ("liquidity_f", "<f8"),
+    ("sqrt_price_x96", "u1", (20,)),
+    ("liquidity", "u1", (16,)),
+    ("protocol_fee0", "u1", (16,)),
+    ("protocol_fee1", "u1", (16,)),
+])
+
+def int_to_bytes(value: int, length: int) -> np.ndarray:
+    """整数转换为定长小端字节"""
+    return np.frombuffer(int(value).to_bytes(length, "little"), dtype=np.uint8)
+
+def bytes_to_int(value: np.ndarray) -> int:
+    """定长小端字节转换回整数"""
+    return int.from_bytes(bytes(value), "little")
+
+def pool_file(pool_address: str, directory: str = TIMESERIES_DIR) -> str:
+    return os.path.join(directory, f"{pool_address.lower()}.bin")
+
+class PoolSeries:
+    """单个池子的时间序列文件，记录按区块号递增追加，区块号列即索引"""
+
+    def __init__(self, pool_address: str, directory: str = TIMESERIES_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = pool_file(pool_address, directory)
+        self.repair()
+        self.last_block = self.read_last_block()
+
+    def repair(self):
+        """截掉异常退出时写了一半的记录"""
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size % RECORD_DTYPE.itemsize:
+            with open(self.path, "r+b") as f:
+                f.truncate(size - size % RECORD_DTYPE.itemsize)
+
+    def read_last_block(self) -> int:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return -1
+        with open(self.path, "rb") as f:
+            f.seek(-RECORD_DTYPE.itemsize, os.SEEK_END)
+            return int(np.frombuffer(f.read(RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE)["block"][0])
+
+    def append(self, records: np.ndarray):
+        """追加记录，早于已有最后区块的记录会被忽略"""
+        records = records[records["block"] > self.last_block]
+        if len(records) == 0:
+            return
+        with open(self.path, "ab") as f:
+            records.tofile(f)
+        self.last_block = int(records["block"][-1])
+
+def read_range(pool_address: str, from_block: int = None, to_block: int = None,
+               directory: str = TIMESERIES_DIR) -> np.ndarray:
+    """以内存映射方式读取 [from_block, to_block] 范围内的记录
+
+    通过对区块号列二分查找定位范围，只会读取需要的页面
+    """
+    path = pool_file(pool_address, directory)
+    if not os.path.exists(path) or os.path.getsize(path) < RECORD_DTYPE.itemsize:
+        return np.empty(0, dtype=RECORD_DTYPE)
+
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(count,))
+    blocks = records["block"]
+    start = 0 if from_block is None else int(np.searchsorted(blocks, from_block, side="left"))
+    end = count if to_block is None else int(np.searchsorted(blocks, to_block, side="right"))
+    return records[start:end]
+
+class PoolRecorder:
+    """每个区块用一次multicall采样一组池子的slot0、liquidity和protocolFees"""
+
+    def __init__(self, w3: Web3, pool_addresses: List[str], directory: str = TIMESERIES_DIR,
+                 multicall: Multicall = None):
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3)
+        self.pools = [w3.eth.contract(address=Web3.to_checksum_address(p), abi=POOL_ABI) for p in pool_addresses]
+        self.series: Dict[str, PoolSeries] = {p.address: PoolSeries(p.address, directory) for p in self.pools}
+
+    def build_calls(self) -> list:
+        calls = [self.multicall.contract.functions.getCurrentBlockTimestamp()]
+        for pool in self.pools:
+            calls.extend([
+                pool.functions.slot0(),
+                pool.functions.liquidity(),
+                pool.functions.protocolFees(),
+            ])
+        return calls
+
+    def sample(self, block_identifier="latest") -> int:
+        """采样指定区块的池子状态并追加到各池子的时间序列文件，返回采样的区块号"""
+        block_number, results = self.multicall.aggregate(self.build_calls(), block_identifier=block_identifier)
+        self.record_results(block_number, results)
+        return block_number
+
+    def record_results(self, block_number: int, results: list):
+        """把build_calls对应的multicall结果写入各池子的时间序列文件"""
+        timestamp = results[0] or 0
+
+        for index, pool in enumerate(self.pools):
+            slot0, liquidity, protocol_fees = results[1 + index * 3: 4 + index * 3]
+            if slot0 is None or liquidity is None:
+                continue
+            protocol_fees = protocol_fees or (0, 0)
+
+            record = np.zeros(1, dtype=RECORD_DTYPE)
+            record["block"] = block_number
+            record["timestamp"] = timestamp
+            record["tick"] = slot0[1]
+            record["price"] = (slot0[0] / 2 ** 96) ** 2
+            record["liquidity_f"] = float(liquidity)
+            record["sqrt_price_x96"] = int_to_bytes(slot0[0], 20)
+            record["liquidity"] = int_to_bytes(liquidity, 16)
+            record["protocol_fee0"] = int_to_bytes(protocol_fees[0], 16)
+            record["protocol_fee1"] = int_to_bytes(protocol_fees[1], 16)
+            self.series[pool.address].append(record)
+
+    def run(self, poll_interval: float = 1.0, max_catchup_blocks: int = 100):
+        """跟随最新区块持续采样，错过的区块会逐个补采（最多max_catchup_blocks个）"""
+        last_block = max((s.last_block for s in self.series.values()), default=-1)
+        print(f"开始记录 {len(self.pools)} 个池子的状态，按 Ctrl+C 停止")
+        try:
+            while True:
+                try:
+                    head = self.w3.eth.block_number
+                    if last_block < 0:
+                        last_block = head - 1
+                    start = max(last_block + 1, head - max_catchup_blocks + 1)
+                    for block_number in range(start, head + 1):
+                        last_block = self.sample(block_number)
+                    time.sleep(poll_interval)
+                except Exception as e:
+                    print(f"采样池子状态时出错: {str(e)}")
+                    time.sleep(5)
+        except KeyboardInterrupt:
+            print(f"\n停止记录，最后区块: {last_block}")
+
+def main():
+    parser = argparse.ArgumentParser(description='记录PancakeSwap V3池子状态时间序列')
+    parser.add_argument('pools', nargs='+', help='池子地址')
+    parser.add_argument('--rpc', default='https://bsc-dataseed.binance.org/', help='BSC节点URL')
+    parser.add_argument('--dir', default=TIMESERIES_DIR, help='时间序列文件目录')
+    args = parser.parse_args()
+
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    PoolRecorder(w3, args.pools, args.dir).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import argparse
+import heapq
+import json
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from web3 import Web3
+from multicall import Multicall, bind_call
+from log_decoder import EventDecoder, get_default_decoder
+from state_store import get_state_store
+from bsc_provider import get_web3
+from token_graph import resolve_token
+
+# 价格的根节点：USDT按1美元计，其余代币（包括WBNB）沿最深的池子推算
+USDT = "0x55d398326f99059fF775485246999027B3197955"
+WBNB = "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c"
+
+# 原生BNB使用的占位地址（与wallet_snapshot一致），按WBNB计价
+NATIVE_TOKEN = "0x0000000000000000000000000000000000000000"
+
+# 当前tick内锚定侧虚拟储备低于该美元价值的池子不用于定价
+DEFAULT_MIN_DEPTH_USD = 100.0
+
+# 增量更新时单次eth_getLogs的最大区块数，落后更多时直接全量刷新
+MAX_INCREMENTAL_BLOCKS = 200
+
+# 单次eth_getLogs的address过滤列表最多包含的池子数量
+LOGS_ADDRESS_CHUNK = 500
+
+# sqrtPriceX96的定点数基数
+Q96 = 2 ** 96
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# 会改变池子价格或活跃流动性的事件：Swap、Mint、Burn
+POOL_EVENT_TOPICS = [
+    "0x" + bytes(EventDecoder(item).topic0).hex()
+    for item in POOL_ABI
+    if item.get("type") == "event" and item["name"] in ("Swap", "Mint", "Burn")
+]
+
+class PriceTable:
+    """全部已知代币的美元/BNB现货价格表
+
+    以USDT为根，在代币图上按“最宽路径”遍历：每个代币的价格取自连接已定价代币、且路径上
+    最浅一跳的美元深度最大的池子。池子深度为当前tick内已定价一侧的虚拟储备价值。
+    refresh 用一次multicall读取全部池子的slot0和liquidity；update 只读取新区块的
+    Swap/Mint/Burn日志增量更新池子状态，查询全部在内存中完成
+    """
+
+    def __init__(self, w3: Web3 = None, multicall: Multicall = None, pools: List[Dict] = None,
+                 min_depth_usd: float = DEFAULT_MIN_DEPTH_USD):
+        self.w3 = w3
+        self.multicall = multicall or (Multicall(w3) if w3 else None)
+        self.min_depth_usd = min_depth_usd
+        store = get_state_store()
+        pools = pools if pools is not None else store.load_pools(known_only=True)
+        self.decimals = {address: info["decimals"] for address, info in store.load_tokens().items()
+                         if info.get("decimals") is not None}
+
+        # {pool: (token0, token1)}
+        self.pools: Dict[str, Tuple[str, str]] = {}
+        # {token: [(other, pool, is_token0), ...]}
+        self.edges: Dict[str, List[Tuple[str, str, bool]]] = defaultdict(list)
+        for pool in pools:
+            address = Web3.to_checksum_address(pool["pool"])
+            token0 = Web3.to_checksum_address(pool["token0"])
+            token1 = Web3.to_checksum_address(pool["token1"])
+            if token0 not in self.decimals or token1 not in self.decimals:
+                continue
+            self.pools[address] = (token0, token1)
+            self.edges[token0].append((token1, address, True))
+            self.edges[token1].append((token0, address, False))
+
+        # {pool: [sqrt_price_x96, liquidity, tick]}
+        self.states: Dict[str, List[int]] = {}
+        # {token: {"usd", "pool", "via", "depth_usd", "hops"}}
+        self.prices: Dict[str, Dict] = {}
+        self.block_number = None
+
+    # ---------- 池子状态 ----------
+
+    def set_pool_state(self, pool: str, sqrt_price_x96: int, liquidity: int, tick: int):
+        if pool in self.pools:
+            self.states[pool] = [sqrt_price_x96, liquidity, tick]
+
+    def refresh(self, block_identifier="latest") -> int:
+        """全量读取所有池子的slot0和liquidity并重建价格表，返回区块号"""
+        contract = self.w3.eth.contract(abi=POOL_ABI)
+        pools = list(self.pools)
+        calls = []
+        for address in pools:
+            calls.extend([bind_call(contract.functions.slot0(), address),
+                          bind_call(contract.functions.liquidity(), address)])
+        block_number, results = self.multicall.aggregate(calls, block_identifier=block_identifier)
+
+        self.states.clear()
+        for index, address in enumerate(pools):
+            slot0, liquidity = results[2 * index], results[2 * index + 1]
+            if slot0 is not None and slot0[0]:
+                self.set_pool_state(address, slot0[0], liquidity or 0, slot0[1])
+        self.block_number = block_number
+        self.rebuild()
+        return block_number
+
+    def update(self, to_block: int = None) -> int:
+        """增量更新到to_block（默认最新区块），返回状态变化的池子数量
+
+        Swap事件直接给出交易后的价格、活跃流动性和tick；Mint/Burn的区间包含当前tick时增减活跃流动性
+        """
+        to_block = to_block if to_block is not None else self.w3.eth.block_number
+        if self.block_number is None or to_block - self.block_number > MAX_INCREMENTAL_BLOCKS:
+            self.refresh(to_block)
+            return len(self.states)
+        if to_block <= self.block_number:
+            return 0
+
+        # 按池子地址过滤，只取回价格表中池子的日志
+        pools = list(self.pools)
+        logs = []
+        for start in range(0, len(pools), LOGS_ADDRESS_CHUNK):
+            logs.extend(self.w3.eth.get_logs({
+                "fromBlock": self.block_number + 1,
+                "toBlock": to_block,
+                "address": pools[start:start + LOGS_ADDRESS_CHUNK],
+                "topics": [POOL_EVENT_TOPICS],
+            }))
+        logs.sort(key=lambda log: (log["blockNumber"], log["logIndex"]))
+
+        changed = set()
+        for event in get_default_decoder().decode_logs(logs):
+            pool, args = event["address"], event["args"]
+            if event["event"] == "Swap":
+                self.set_pool_state(pool, args["sqrtPriceX96"], args["liquidity"], args["tick"])
+            elif event["event"] in ("Mint", "Burn") and pool in self.states:
+                state = self.states[pool]
+                if args["tickLower"] <= state[2] < args["tickUpper"]:
+                    delta = args["amount"] if event["event"] == "Mint" else -args["amount"]
+                    state[1] = max(state[1] + delta, 0)
+                else:
+                    continue
+            else:
+                continue
+            changed.add(pool)
+
+        self.block_number = to_block
+        if changed:
+            self.rebuild()
+        return len(changed)
+
+    # ---------- 价格 ----------
+
+    def rebuild(self):
+        """从USDT出发按最宽路径遍历代币图，重新计算所有代币的价格"""
+        prices = {}
+        if USDT not in self.decimals:
+            # 状态库中还没有USDT的精度（例如空状态库），无法定价
+            self.prices = prices
+            return
+        # (-路径深度, 代币, 美元价格, 池子, 上一跳代币, 跳数)
+        heap = [(-math.inf, USDT, 1.0, None, None, 0)]
+        while heap:
+            negative_depth, token, usd, pool, via, hops = heapq.heappop(heap)
+            if token in prices:
+                continue
+            prices[token] = {"usd": usd, "pool": pool, "via": via, "depth_usd": -negative_depth, "hops": hops}
+            decimals = self.decimals[token]
+            for other, edge_pool, is_token0 in self.edges.get(token, ()):
+                if other in prices:
+                    continue
+                state = self.states.get(edge_pool)
+                if state is None or not state[0] or not state[1]:
+                    continue
+                sqrt_price = state[0] / Q96
+                # 当前tick内已定价一侧的虚拟储备
+                reserve = state[1] / sqrt_price if is_token0 else state[1] * sqrt_price
+                depth = min(-negative_depth, reserve / 10 ** decimals * usd)
+                if depth < self.min_depth_usd:
+                    continue
+                token0, token1 = self.pools[edge_pool]
+                # 1个token0可兑换的token1数量（已按精度换算）
+                price = sqrt_price ** 2 * 10 ** (self.decimals[token0] - self.decimals[token1])
+                other_usd = usd / price if is_token0 else usd * price
+                heapq.heappush(heap, (-depth, other, other_usd, edge_pool, token, hops + 1))
+        self.prices = prices
+
+    def usd(self, token: str) -> Optional[float]:
+        """代币的美元价格，没有足够深的池子时返回None"""
+        token = WBNB if token == NATIVE_TOKEN else Web3.to_checksum_address(token)
+        entry = self.prices.get(token)
+        return entry["usd"] if entry else None
+
+    def bnb(self, token: str) -> Optional[float]:
+        """以BNB计的价格"""
+        usd, bnb_usd = self.usd(token), self.usd(WBNB)
+        return usd / bnb_usd if usd is not None and bnb_usd else None
+
+    def value_usd(self, token: str, amount: float) -> Optional[float]:
+        """按精度换算后的代币数量的美元价值"""
+        usd = self.usd(token)
+        return float(amount) * usd if usd is not None else None
+
+    def usd_prices(self) -> Dict[str, float]:
+        return {token: entry["usd"] for token, entry in self.prices.items()}
+
+# 进程内共享的价格表
+price_table: PriceTable = None
+
+def get_price_table(w3: Web3 = None, max_age_blocks: int = 0) -> PriceTable:
+    """获取共享的价格表，首次调用时全量刷新，之后按需增量更新到最新区块
+
+    max_age_blocks: 价格表落后最新区块不超过该数量时不更新
+    """
+    global price_table
+    if price_table is None:
+        price_table = PriceTable(w3 or get_web3())
+        price_table.refresh()
+        return price_table
+    head = price_table.w3.eth.block_number
+    if head - price_table.block_number > max_age_blocks:
+        price_table.update(head)
+    return price_table
+
+def main():
+    parser = argparse.ArgumentParser(description='已知代币的美元/BNB价格表')
+    parser.add_argument('tokens', nargs='*', help='要显示的代币符号或地址，默认显示前20个')
+    parser.add_argument('--watch', action='store_true', help='每个区块增量更新并显示价格')
+    parser.add_argument('--interval', type=float, default=3.0, help='监视模式的轮询间隔（秒）')
+    args = parser.parse_args()
+
+    tokens = get_state_store().load_tokens()
+    selected = [resolve_token(token, tokens) for token in args.tokens] or list(tokens)[:20]
+
+    table = PriceTable(get_web3())
+    started = time.perf_counter()
+    table.refresh()
+    print(f"区块 {table.block_number}: {len(table.prices)}/{len(tokens)} 个代币已定价，"
+          f"耗时 {time.perf_counter() - started:.2f} 秒")
+
+    while True:
+        print(f"\n{'代币':<12}{'美元价格':>20}{'BNB价格':>20}{'跳数':>6}{'路径深度(USD)':>18}")
+        for token in selected:
+            entry = table.prices.get(token)
+            symbol = tokens.get(token, {}).get("symbol", token)
+            if entry is None:
+                print(f"{symbol:<12}{'无报价':>20}")
+                continue
+            print(f"{symbol:<12}{entry['usd']:>20.8g}{table.bnb(token):>20.8g}{entry['hops']:>6}"
+                  f"{entry['depth_usd']:>18,.0f}")
+        if not args.watch:
+            break
+        time.sleep(args.interval)
+        started = time.perf_counter()
+        try:
+            changed = table.update()
+        except Exception as e:
+            print(f"更新价格表失败: {str(e)}")
+            continue
+        print(f"\n区块 {table.block_number}: {changed} 个池子有变化，耗时 {(time.perf_counter() - started) * 1000:.0f} 毫秒")
+
+if __name__ == "__main__":
+    main()
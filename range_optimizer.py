@@ -0,0 +1,204 @@
+import json
+import math
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from web3 import Web3
+from multicall import Multicall
+from tick_data import TickDataCache
+from mint_v3_pool import price_to_tick, tick_to_price
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# 合约允许的tick范围
+MIN_TICK = -887272
+MAX_TICK = 887272
+
+def get_pool_state(pool_address: str, w3: Web3, multicall: Multicall) -> Dict:
+    """一次multicall获取池子当前价格、tick、活跃流动性、tickSpacing和费率"""
+    pool = w3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=POOL_ABI)
+    block_number, (slot0, liquidity, tick_spacing, fee) = multicall.aggregate([
+        pool.functions.slot0(),
+        pool.functions.liquidity(),
+        pool.functions.tickSpacing(),
+        pool.functions.fee(),
+    ])
+    if slot0 is None or tick_spacing is None:
+        raise ValueError(f"无法获取池子状态: {pool_address}")
+
+    return {
+        "address": pool.address,
+        "block_number": block_number,
+        "sqrt_price_x96": slot0[0],
+        "tick": slot0[1],
+        "liquidity": liquidity or 0,
+        "tick_spacing": tick_spacing,
+        "fee": fee,
+    }
+
+def estimate_tick_volatility(pool_address: str, w3: Web3, interval_seconds: int = 300, samples: int = 12) -> Optional[float]:
+    """根据池子预言机的tick累计值估算每个时间间隔内tick的波动（标准差）
+
+    返回None表示预言机观测数据不足
+    """
+    pool = w3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=POOL_ABI)
+    seconds_agos = [i * interval_seconds for i in range(samples + 1)]
+    try:
+        tick_cumulatives, _ = pool.functions.observe(seconds_agos).call()
+    except Exception:
+        return None
+
+    # 每个时间间隔内的平均tick（从旧到新）
+    cumulatives = np.array(tick_cumulatives[::-1], dtype=np.float64)
+    average_ticks = np.diff(cumulatives) / interval_seconds
+    if len(average_ticks) < 2:
+        return None
+    return float(np.std(np.diff(average_ticks)))
+
+def build_liquidity_grid(ticks: List[Tuple[int, int, int]], current_tick: int, active_liquidity: int,
+                         tick_spacing: int, grid_lower: int, grid_upper: int) -> Tuple[np.ndarray, np.ndarray]:
+    """把已初始化tick展开为按tickSpacing划分的区间网格，返回 (区间起始tick, 区间内活跃流动性)"""
+    bucket_ticks = np.arange(grid_lower, grid_upper, tick_spacing, dtype=np.int64)
+    liquidity_net = np.zeros(len(bucket_ticks), dtype=np.float64)
+    for tick, net, _gross in ticks:
+        index = (tick - grid_lower) // tick_spacing
+        if 0 <= index < len(bucket_ticks):
+            liquidity_net[index] += net
+
+    # 以当前区间的活跃流动性为基准，向上累加、向下回退liquidityNet
+    cumulative = np.cumsum(liquidity_net)
+    current_index = (current_tick // tick_spacing * tick_spacing - grid_lower) // tick_spacing
+    liquidity = active_liquidity + cumulative - cumulative[current_index]
+    return bucket_ticks, np.maximum(liquidity, 0.0)
+
+def erf(x: np.ndarray) -> np.ndarray:
+    """向量化的误差函数（Abramowitz-Stegun 7.1.26近似，最大误差1.5e-7）"""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+def tick_probabilities(bucket_ticks: np.ndarray, tick_spacing: int, current_tick: float, sigma_ticks: float) -> np.ndarray:
+    """假设价格（以tick计）在时间窗口内服从正态分布，计算价格落在每个区间的概率"""
+    edges = np.append(bucket_ticks, bucket_ticks[-1] + tick_spacing).astype(np.float64)
+    z = (edges - current_tick) / (sigma_ticks * math.sqrt(2))
+    cdf = 0.5 * (1 + erf(z))
+    return np.diff(cdf)
+
+def rank_tick_ranges(
+    pool_address: str,
+    w3: Web3,
+    capital: float,
+    token0_decimals: int = 18,
+    token1_decimals: int = 18,
+    horizon_seconds: int = 86400,
+    interval_seconds: int = 300,
+    max_width_sigmas: float = 4.0,
+    max_steps_per_side: int = 100,
+    price_lower: Decimal = None,
+    price_upper: Decimal = None,
+    fallback_tick_volatility: float = None,
+    tick_cache: TickDataCache = None,
+    top_n: int = 10
+) -> List[Dict]:
+    """评估候选 (tickLower, tickUpper) 区间，按单位资金的预期手续费份额排序
+
+    Args:
+        pool_address: 池子地址
+        w3: Web3实例
+        capital: 投入资金（以token1计）
+        token0_decimals: 代币0的精度
+        token1_decimals: 代币1的精度
+        horizon_seconds: 持仓时间窗口（秒）
+        interval_seconds: 估算波动率时的采样间隔（秒）
+        max_width_sigmas: 候选区间单侧最大宽度（以时间窗口内的标准差计）
+        max_steps_per_side: 单侧最多枚举的tickSpacing步数
+        price_lower: 可选的价格下限约束（代币1/代币0）
+        price_upper: 可选的价格上限约束（代币1/代币0）
+        fallback_tick_volatility: 预言机数据不足时使用的每个采样间隔tick波动，默认取tickSpacing
+        tick_cache: 可复用的tick数据缓存
+        top_n: 返回的候选数量
+
+    Returns:
+        list: 按fee_share_per_capital降序排列的候选区间
+    """
+    multicall = Multicall(w3)
+    tick_cache = tick_cache or TickDataCache(w3)
+
+    state = get_pool_state(pool_address, w3, multicall)
+    spacing = state["tick_spacing"]
+    current_tick = state["tick"]
+    sqrt_price = state["sqrt_price_x96"] / 2 ** 96
+
+    # 时间窗口内的tick波动
+    tick_volatility = estimate_tick_volatility(pool_address, w3, interval_seconds)
+    if not tick_volatility:
+        tick_volatility = fallback_tick_volatility or spacing
+    sigma_ticks = max(tick_volatility * math.sqrt(horizon_seconds / interval_seconds), spacing)
+
+    # 候选区间的边界网格
+    current_bucket = current_tick // spacing * spacing
+    steps = min(max_steps_per_side, max(1, math.ceil(max_width_sigmas * sigma_ticks / spacing)))
+    grid_lower = max(current_bucket - steps * spacing, (MIN_TICK // spacing + 1) * spacing)
+    grid_upper = min(current_bucket + (steps + 1) * spacing, MAX_TICK // spacing * spacing)
+
+    # 价格约束转换为tick约束
+    if price_lower is not None:
+        grid_lower = max(grid_lower, price_to_tick(Decimal(price_lower), token0_decimals, token1_decimals) // spacing * spacing)
+    if price_upper is not None:
+        grid_upper = min(grid_upper, -(-price_to_tick(Decimal(price_upper), token0_decimals, token1_decimals) // spacing) * spacing)
+    if not grid_lower <= current_bucket < grid_upper:
+        raise ValueError(f"当前tick {current_tick} 不在价格约束范围内")
+
+    ticks = tick_cache.get_ticks(pool_address, spacing, grid_lower, grid_upper, block_identifier=state["block_number"])
+    bucket_ticks, liquidity = build_liquidity_grid(ticks, current_tick, state["liquidity"], spacing, grid_lower, grid_upper)
+    probabilities = tick_probabilities(bucket_ticks, spacing, current_tick, sigma_ticks)
+
+    # 枚举包含当前价格的所有候选区间
+    current_index = (current_bucket - grid_lower) // spacing
+    lower_indexes = np.arange(0, current_index + 1)
+    upper_indexes = np.arange(current_index + 1, len(bucket_ticks) + 1)
+    lower_grid, upper_grid = np.meshgrid(lower_indexes, upper_indexes, indexing="ij")
+    lower_grid = lower_grid.ravel()
+    upper_grid = upper_grid.ravel()
+
+    tick_lowers = grid_lower + lower_grid * spacing
+    tick_uppers = grid_lower + upper_grid * spacing
+
+    # 单位流动性所需资金（以token1最小单位计）
+    sqrt_lower = np.power(1.0001, tick_lowers / 2)
+    sqrt_upper = np.power(1.0001, tick_uppers / 2)
+    value_per_liquidity = (sqrt_price - sqrt_lower) + (1 / sqrt_price - 1 / sqrt_upper) * sqrt_price ** 2
+    position_liquidity = capital * 10 ** token1_decimals / value_per_liquidity
+
+    # 每个区间的手续费份额 = 落在区间的概率 × 头寸流动性 / (池子流动性 + 头寸流动性)
+    indexes = np.arange(len(bucket_ticks))
+    in_range = (indexes[None, :] >= lower_grid[:, None]) & (indexes[None, :] < upper_grid[:, None])
+    share = position_liquidity[:, None] / (liquidity[None, :] + position_liquidity[:, None])
+    expected_fee_share = (in_range * probabilities[None, :] * share).sum(axis=1)
+    fee_share_per_capital = expected_fee_share / capital
+    in_range_probability = (in_range * probabilities[None, :]).sum(axis=1)
+
+    order = np.argsort(-fee_share_per_capital)[:top_n]
+    return [
+        {
+            "tick_lower": int(tick_lowers[i]),
+            "tick_upper": int(tick_uppers[i]),
+            "price_lower": tick_to_price(int(tick_lowers[i]), token0_decimals, token1_decimals),
+            "price_upper": tick_to_price(int(tick_uppers[i]), token0_decimals, token1_decimals),
+            "in_range_probability": float(in_range_probability[i]),
+            "expected_fee_share": float(expected_fee_share[i]),
+            "fee_share_per_capital": float(fee_share_per_capital[i]),
+        }
+        for i in order
+    ]
+
+def choose_mint_ticks(pool_address: str, w3: Web3, capital: float, **kwargs) -> Tuple[int, int]:
+    """返回排名第一的 (tickLower, tickUpper)，可直接传给mint_v3_position的tick_range参数"""
+    ranked = rank_tick_ranges(pool_address, w3, capital, top_n=1, **kwargs)
+    if not ranked:
+        raise ValueError(f"没有可用的候选区间: {pool_address}")
+    return ranked[0]["tick_lower"], ranked[0]["tick_upper"]
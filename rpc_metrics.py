@@ -0,0 +1,301 @@
+import atexit
+import cProfile
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# 通过环境变量开启的功能
+METRICS_PORT_ENV = "BSC_METRICS_PORT"        # Prometheus文本格式的 /metrics 端口
+METRICS_DUMP_ENV = "BSC_METRICS_DUMP"        # 定期写出JSON快照的文件
+PROFILE_DIR_ENV = "BSC_PROFILE_DIR"          # cProfile结果目录
+
+class CallStats:
+    """单个 (方法, 节点) 的累计统计"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, latency: float):
+        self.latency_sum += latency
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "latency_sum": round(self.latency_sum, 6),
+            "latency_buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+class RpcMetrics:
+    """进程内的RPC调用统计：每次请求的方法、节点、请求/响应大小、延迟、错误、重试和缓存命中"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats: Dict[Tuple[str, str], CallStats] = defaultdict(CallStats)
+        self.started_at = time.time()
+
+    def record(self, method: str, endpoint: str, latency: float, request_bytes: int = 0,
+               response_bytes: int = 0, error: bool = False):
+        """记录一次实际发往节点的请求"""
+        with self.lock:
+            stats = self.stats[(method, endpoint)]
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.observe(latency)
+
+    def record_cache_hit(self, method: str, endpoint: str):
+        """记录一次由缓存返回、没有发往节点的请求"""
+        with self.lock:
+            self.stats[(method, endpoint)].cache_hits += 1
+
+    def record_retry(self, method: str, endpoint: str):
+        """记录一次应用层重试"""
+        with self.lock:
+            self.stats[(method, endpoint)].retries += 1
+
+    def take(self) -> Dict[Tuple[str, str], CallStats]:
+        """取出并清空当前统计，用于把工作进程的统计交给主进程"""
+        with self.lock:
+            stats, self.stats = self.stats, defaultdict(CallStats)
+        return dict(stats)
+
+    def merge(self, stats: Dict[Tuple[str, str], CallStats]):
+        """累加其他进程take()取出的统计"""
+        with self.lock:
+            for key, other in stats.items():
+                current = self.stats[key]
+                current.calls += other.calls
+                current.errors += other.errors
+                current.retries += other.retries
+                current.cache_hits += other.cache_hits
+                current.request_bytes += other.request_bytes
+                current.response_bytes += other.response_bytes
+                current.latency_sum += other.latency_sum
+                current.buckets = [a + b for a, b in zip(current.buckets, other.buckets)]
+
+    def snapshot(self) -> Dict:
+        """返回当前统计的副本 {"uptime": 秒, "calls": [{method, endpoint, ...}]}"""
+        with self.lock:
+            calls = [{"method": method, "endpoint": endpoint, **stats.to_dict()}
+                     for (method, endpoint), stats in sorted(self.stats.items())]
+        return {"uptime": round(time.time() - self.started_at, 3), "calls": calls}
+
+    def prometheus_text(self) -> str:
+        """Prometheus文本格式的指标"""
+        lines = [
+            "# TYPE bsc_rpc_calls_total counter",
+            "# TYPE bsc_rpc_errors_total counter",
+            "# TYPE bsc_rpc_retries_total counter",
+            "# TYPE bsc_rpc_cache_hits_total counter",
+            "# TYPE bsc_rpc_request_bytes_total counter",
+            "# TYPE bsc_rpc_response_bytes_total counter",
+            "# TYPE bsc_rpc_latency_seconds histogram",
+        ]
+        for call in self.snapshot()["calls"]:
+            labels = f'method="{call["method"]}",endpoint="{call["endpoint"]}"'
+            lines.append(f"bsc_rpc_calls_total{{{labels}}} {call['calls']}")
+            lines.append(f"bsc_rpc_errors_total{{{labels}}} {call['errors']}")
+            lines.append(f"bsc_rpc_retries_total{{{labels}}} {call['retries']}")
+            lines.append(f"bsc_rpc_cache_hits_total{{{labels}}} {call['cache_hits']}")
+            lines.append(f"bsc_rpc_request_bytes_total{{{labels}}} {call['request_bytes']}")
+            lines.append(f"bsc_rpc_response_bytes_total{{{labels}}} {call['response_bytes']}")
+            cumulative = 0
+            for bound, count in call["latency_buckets"].items():
+                cumulative += count
+                lines.append(f'bsc_rpc_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"bsc_rpc_latency_seconds_sum{{{labels}}} {call['latency_sum']}")
+            lines.append(f"bsc_rpc_latency_seconds_count{{{labels}}} {call['calls']}")
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        """按总耗时打印各方法的调用统计"""
+        calls = sorted(self.snapshot()["calls"], key=lambda c: c["latency_sum"], reverse=True)
+        print(f"{'方法':<28}{'调用':>8}{'缓存命中':>10}{'错误':>6}{'重试':>6}{'总耗时(秒)':>12}{'平均(毫秒)':>12}")
+        for call in calls:
+            average = call["latency_sum"] / call["calls"] * 1000 if call["calls"] else 0
+            print(f"{call['method']:<28}{call['calls']:>8}{call['cache_hits']:>10}{call['errors']:>6}"
+                  f"{call['retries']:>6}{call['latency_sum']:>12.3f}{average:>12.1f}")
+
+# 进程内共享的统计实例
+rpc_metrics = RpcMetrics()
+
+def get_rpc_metrics() -> RpcMetrics:
+    return rpc_metrics
+
+# 当前线程最近一次HTTP请求的 (请求字节数, 响应字节数)，由requests的response钩子写入
+http_sizes = threading.local()
+
+def record_http_size(response, *args, **kwargs):
+    """requests的response钩子：记录HTTP层的请求和响应大小，不重新序列化JSON"""
+    content_length = response.headers.get("Content-Length")
+    http_sizes.value = (len(response.request.body or b""),
+                        int(content_length) if content_length else len(response.content))
+
+def with_size_hook(request_kwargs: Dict = None) -> Dict:
+    """为HTTPProvider的request_kwargs添加记录请求大小的钩子（钩子随每次请求传入，对所有线程的会话生效）"""
+    return {**(request_kwargs or {}), "hooks": {"response": [record_http_size]}}
+
+def construct_metrics_middleware(endpoint: str, metrics: RpcMetrics = None):
+    """创建记录每次请求的web3中间件，应放在最内层以测量实际的网络请求
+
+    请求/响应字节数来自with_size_hook注册的HTTP钩子，没有注册时记为0
+    """
+    metrics = metrics or rpc_metrics
+
+    def metrics_middleware(make_request, w3):
+        def middleware(method, params):
+            http_sizes.value = None
+            started = time.perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception:
+                request_bytes, _ = http_sizes.value or (0, 0)
+                metrics.record(method, endpoint, time.perf_counter() - started, request_bytes, error=True)
+                raise
+            latency = time.perf_counter() - started
+            request_bytes, response_bytes = http_sizes.value or (0, 0)
+            metrics.record(method, endpoint, latency, request_bytes, response_bytes, error="error" in response)
+            return response
+
+        return middleware
+
+    return metrics_middleware
+
+def instrument_web3(w3, endpoint: str, metrics: RpcMetrics = None):
+    """为Web3实例添加请求统计中间件（最内层）"""
+    w3.middleware_onion.inject(construct_metrics_middleware(endpoint, metrics), name="rpc_metrics", layer=0)
+    start_exporters_from_env()
+    return w3
+
+# ---------- 导出 ----------
+
+exporters_started = False
+
+def start_metrics_server(port: int, metrics: RpcMetrics = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """在后台线程中提供 /metrics（Prometheus文本格式）和 /metrics.json"""
+    metrics = metrics or rpc_metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def start_periodic_dump(path: str, interval: float = 60.0, metrics: RpcMetrics = None) -> threading.Thread:
+    """每隔interval秒把统计快照写入JSON文件，进程退出时再写一次"""
+    metrics = metrics or rpc_metrics
+
+    def dump():
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump()
+            except Exception as e:
+                print(f"写出RPC统计失败: {str(e)}")
+
+    atexit.register(dump)
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+def start_exporters_from_env():
+    """根据环境变量启动 /metrics 服务和定期快照，每个进程只启动一次"""
+    global exporters_started
+    if exporters_started:
+        return
+    exporters_started = True
+    if os.environ.get(METRICS_PORT_ENV):
+        port = int(os.environ[METRICS_PORT_ENV])
+        start_metrics_server(port)
+        print(f"RPC统计: http://127.0.0.1:{port}/metrics")
+    if os.environ.get(METRICS_DUMP_ENV):
+        start_periodic_dump(os.environ[METRICS_DUMP_ENV])
+
+# ---------- cProfile ----------
+
+profilers: Dict[str, cProfile.Profile] = {}
+profile_lock = threading.Lock()
+profile_dir = os.environ.get(PROFILE_DIR_ENV)
+
+def enable_profiling(directory: str):
+    """开启profile_section的cProfile采集，结果在进程退出时写到directory/<name>.prof"""
+    global profile_dir
+    profile_dir = directory
+
+def dump_profiles():
+    if not profile_dir or not profilers:
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    for name, profiler in profilers.items():
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+
+atexit.register(dump_profiles)
+
+@contextmanager
+def profile_section(name: str):
+    """用cProfile采集代码段，同名代码段的多次执行累计到一起
+
+    未开启时几乎没有开销；同一时刻只采集一个代码段，其他线程或嵌套的代码段直接执行
+    """
+    if not profile_dir or not profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        profiler = profilers.setdefault(name, cProfile.Profile())
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+    finally:
+        profile_lock.release()
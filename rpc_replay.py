@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+import requests
+
+# 回放时请求未录制返回的错误码
+NOT_RECORDED_CODE = -32099
+
+def request_key(method: str, params) -> str:
+    """请求的内容哈希，参数中的地址和十六进制统一为小写"""
+    payload = json.dumps([method, params], sort_keys=True, default=str).lower()
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class RpcRecording:
+    """录制的JSON-RPC响应
+
+    同一个请求可以录制多次（例如随时间变化的eth_blockNumber），回放时按录制顺序依次返回，用完后重复最后一个
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self.cursors: Counter = Counter()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.entries = json.load(f)
+
+    def add(self, method: str, params, response: Dict):
+        key = request_key(method, params)
+        with self.lock:
+            entry = self.entries.setdefault(key, {"method": method, "params": params, "responses": []})
+            entry["responses"].append({k: response[k] for k in ("result", "error") if k in response})
+
+    def next_response(self, method: str, params) -> Optional[Dict]:
+        key = request_key(method, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            responses = entry["responses"]
+            index = min(self.cursors[key], len(responses) - 1)
+            self.cursors[key] += 1
+            return responses[index]
+
+    def save(self, path: str = None):
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with self.lock, open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, path)
+
+class ReplayServer:
+    """本地JSON-RPC替身服务器
+
+    录制模式把请求转发到upstream并保存响应；回放模式只返回录制的响应，不需要网络。
+    可以注入固定延迟、随机抖动和错误（HTTP 429限流或JSON-RPC错误）
+    """
+
+    def __init__(self, recording: RpcRecording, upstream: str = None, host: str = "127.0.0.1", port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 error_kind: str = "http429", seed: int = 0):
+        self.recording = recording
+        self.upstream = upstream
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.session = requests.Session() if upstream else None
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                status, response = server.handle(body)
+                data = json.dumps(response).encode() if response is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {"requests": 0, "by_method": Counter(), "not_recorded": 0, "injected_errors": 0}
+
+    def inject(self) -> Optional[str]:
+        """按配置等待延迟，并决定本次请求是否返回注入的错误"""
+        with self.random_lock:
+            delay = self.latency_ms + (self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return self.error_kind if failed else None
+
+    def handle(self, body):
+        """处理单个或批量请求，返回 (HTTP状态码, 响应)"""
+        injected = self.inject()
+        if injected:
+            with self.stats_lock:
+                self.stats["injected_errors"] += 1
+        if injected == "http429":
+            return 429, None
+
+        if isinstance(body, list):
+            return 200, [self.handle_one(item, injected == "rpc") for item in body]
+        return 200, self.handle_one(body, injected == "rpc")
+
+    def handle_one(self, request: Dict, fail: bool = False) -> Dict:
+        method, params = request["method"], request.get("params", [])
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["by_method"][method] += 1
+
+        reply = {"jsonrpc": "2.0", "id": request.get("id")}
+        if fail:
+            reply["error"] = {"code": -32005, "message": "limit exceeded (injected)"}
+            return reply
+
+        if self.upstream:
+            response = self.session.post(self.upstream, json=request, timeout=60).json()
+            self.recording.add(method, params, response)
+        else:
+            response = self.recording.next_response(method, params)
+            if response is None:
+                with self.stats_lock:
+                    self.stats["not_recorded"] += 1
+                response = {"error": {"code": NOT_RECORDED_CODE, "message": f"请求未录制: {method}"}}
+
+        reply.update({k: response[k] for k in ("result", "error") if k in response})
+        return reply
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.upstream and self.recording.path:
+            self.recording.save()
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON-RPC录制/回放服务器')
+    parser.add_argument('recording', help='录制文件')
+    parser.add_argument('--upstream', help='录制模式：转发到该节点并保存响应；不指定时为回放模式')
+    parser.add_argument('--port', type=int, default=8545, help='监听端口')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个请求的固定延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='额外的随机延迟上限（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='注入错误的概率')
+    parser.add_argument('--error-kind', choices=['http429', 'rpc'], default='http429', help='注入的错误类型')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    args = parser.parse_args()
+
+    server = ReplayServer(RpcRecording(args.recording), args.upstream, port=args.port,
+                          latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                          error_rate=args.error_rate, error_kind=args.error_kind, seed=args.seed)
+    print(f"{'录制' if args.upstream else '回放'}服务器已启动: {server.start()}")
+    print("按 Ctrl+C 停止")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+        print(f"\n共处理 {server.stats['requests']} 个请求，未录制 {server.stats['not_recorded']} 个")
+
+if __name__ == "__main__":
+    main()
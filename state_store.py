@@ -0,0 +1,333 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 数据库文件
+STATE_DB = "bsc_state.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    address TEXT PRIMARY KEY,
+    name TEXT,
+    symbol TEXT,
+    decimals INTEGER,
+    total_supply TEXT,
+    count INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT,
+    last_seen TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tokens_count ON tokens(count DESC);
+CREATE INDEX IF NOT EXISTS idx_tokens_symbol ON tokens(symbol COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS pools (
+    pool TEXT PRIMARY KEY,
+    token0 TEXT NOT NULL,
+    token1 TEXT NOT NULL,
+    token0_symbol TEXT,
+    token1_symbol TEXT,
+    token0_name TEXT,
+    token1_name TEXT,
+    fee INTEGER NOT NULL,
+    tick_spacing INTEGER,
+    known INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_pools_pair ON pools(lower(token0), lower(token1));
+CREATE INDEX IF NOT EXISTS idx_pools_fee ON pools(fee);
+CREATE INDEX IF NOT EXISTS idx_pools_known ON pools(known);
+
+CREATE TABLE IF NOT EXISTS token_verdicts (
+    address TEXT PRIMARY KEY,
+    verdict TEXT NOT NULL,
+    status INTEGER,
+    reason TEXT,
+    checked_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    name TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class StateStore:
+    """基于SQLite(WAL模式)的共享状态存储，监控脚本和扫描脚本可以同时读写
+
+    每个线程使用独立连接，写入都在事务中完成，计数以增量方式累加，避免不同脚本互相覆盖
+    """
+
+    def __init__(self, path: str = STATE_DB):
+        self.path = path
+        self.local = threading.local()
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    def transaction(self):
+        """返回一个写事务上下文，BEGIN IMMEDIATE保证并发写入时不会出现中途失败"""
+        store = self
+
+        class Transaction:
+            def __enter__(self):
+                store.conn.execute("BEGIN IMMEDIATE")
+                return store.conn
+
+            def __exit__(self, exc_type, exc, tb):
+                store.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+                return False
+
+        return Transaction()
+
+    # ---------- 代币 ----------
+
+    def upsert_tokens(self, tokens: Dict[str, Dict]):
+        """插入或更新代币基本信息，不修改已有的出现次数"""
+        rows = [
+            (address, info.get("name"), info.get("symbol"), info.get("decimals"),
+             str(info.get("total_supply", "0")), info.get("count", 0),
+             info.get("first_seen"), info.get("last_seen"))
+            for address, info in tokens.items()
+        ]
+        with self.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO tokens (address, name, symbol, decimals, total_supply, count, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(address) DO UPDATE SET
+                    name = excluded.name,
+                    symbol = excluded.symbol,
+                    decimals = excluded.decimals,
+                    total_supply = excluded.total_supply,
+                    last_seen = MAX(COALESCE(tokens.last_seen, ''), COALESCE(excluded.last_seen, ''))
+            """, rows)
+
+    def increment_token_counts(self, counts: Dict[str, int], seen_at: str = None):
+        """以增量方式累加代币出现次数"""
+        seen_at = seen_at or datetime.now().strftime(TIME_FORMAT)
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE tokens SET count = count + ?, last_seen = ? WHERE address = ?",
+                [(count, seen_at, address) for address, count in counts.items() if count]
+            )
+
+    def load_tokens(self) -> Dict[str, Dict]:
+        """按出现次数降序返回与bsc_tokens.json格式相同的代币字典"""
+        tokens = {}
+        rows = self.conn.execute("SELECT * FROM tokens ORDER BY count DESC, address").fetchall()
+        for rank, row in enumerate(rows, 1):
+            tokens[row["address"]] = {
+                "name": row["name"],
+                "symbol": row["symbol"],
+                "decimals": row["decimals"],
+                "total_supply": row["total_supply"],
+                "address": row["address"],
+                "first_seen": row["first_seen"],
+                "count": row["count"],
+                "last_seen": row["last_seen"],
+                "rank": rank
+            }
+        return tokens
+
+    def count_tokens(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+
+    # ---------- 池子 ----------
+
+    def upsert_pools(self, pools: List[Dict], known: bool = False):
+        """插入或更新池子信息，known为True时标记为已知代币的池子"""
+        with self.transaction() as conn:
+            next_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM pools").fetchone()[0]
+            for offset, pool in enumerate(pools):
+                conn.execute("""
+                    INSERT INTO pools (pool, token0, token1, token0_symbol, token1_symbol,
+                                       token0_name, token1_name, fee, tick_spacing, known, seq)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(pool) DO UPDATE SET
+                        token0_symbol = excluded.token0_symbol,
+                        token1_symbol = excluded.token1_symbol,
+                        token0_name = excluded.token0_name,
+                        token1_name = excluded.token1_name,
+                        known = MAX(pools.known, excluded.known)
+                """, (pool["pool"], pool["token0"], pool["token1"], pool.get("token0_symbol"),
+                      pool.get("token1_symbol"), pool.get("token0_name"), pool.get("token1_name"),
+                      pool["fee"], pool.get("tickSpacing"), int(known), next_seq + offset))
+
+    def row_to_pool(self, row: sqlite3.Row) -> Dict:
+        """数据库行转换为池子字典（与JSON文件格式一致）"""
+        return {
+            "token0": row["token0"],
+            "token0_symbol": row["token0_symbol"],
+            "token0_name": row["token0_name"],
+            "token1": row["token1"],
+            "token1_symbol": row["token1_symbol"],
+            "token1_name": row["token1_name"],
+            "fee": row["fee"],
+            "tickSpacing": row["tick_spacing"],
+            "pool": row["pool"]
+        }
+
+    def load_pools(self, known_only: bool = False) -> List[Dict]:
+        """按发现顺序返回池子列表"""
+        sql = "SELECT * FROM pools" + (" WHERE known = 1" if known_only else "") + " ORDER BY seq"
+        return [self.row_to_pool(row) for row in self.conn.execute(sql)]
+
+    def load_known_pools(self) -> List[Dict]:
+        """返回与known_pools.json格式相同的已知池子列表"""
+        pools = []
+        rows = self.conn.execute(
+            "SELECT * FROM pools WHERE known = 1 ORDER BY token0_symbol, token1_symbol, seq"
+        ).fetchall()
+        for row in rows:
+            pool = self.row_to_pool(row)
+            pool["pair"] = f"{pool['token0_symbol']}/{pool['token1_symbol']}"
+            pools.append(pool)
+        return pools
+
+    def get_pair_pools(self, token0: str, token1: str) -> List[Dict]:
+        """查询两个代币之间的所有池子（不区分顺序和大小写）"""
+        a, b = sorted((token0.lower(), token1.lower()))
+        rows = self.conn.execute(
+            "SELECT * FROM pools WHERE lower(token0) = ? AND lower(token1) = ?", (a, b)
+        ).fetchall()
+        return [self.row_to_pool(row) for row in rows]
+
+    def count_pools(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pools").fetchone()[0]
+
+    def unmark_known_pools(self, tokens: List[str]) -> int:
+        """取消包含指定代币的池子的已知标记，返回受影响的池子数量"""
+        changed = 0
+        with self.transaction() as conn:
+            for token in tokens:
+                token = token.lower()
+                changed += conn.execute(
+                    "UPDATE pools SET known = 0 WHERE known = 1 AND (lower(token0) = ? OR lower(token1) = ?)",
+                    (token, token)
+                ).rowcount
+        return changed
+
+    # ---------- 代币验证结果 ----------
+
+    def upsert_token_verdicts(self, verdicts: Dict[str, Dict]):
+        """保存代币验证结果 {address: {"verdict", "status", "reason", "checked_at"}}"""
+        with self.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO token_verdicts (address, verdict, status, reason, checked_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(address) DO UPDATE SET
+                    verdict = excluded.verdict,
+                    status = excluded.status,
+                    reason = excluded.reason,
+                    checked_at = excluded.checked_at
+            """, [(address, v["verdict"], v.get("status"), v.get("reason"),
+                   v.get("checked_at") or datetime.now().strftime(TIME_FORMAT))
+                  for address, v in verdicts.items()])
+
+    def load_token_verdicts(self, verdict: str = None) -> Dict[str, Dict]:
+        """读取代币验证结果，可按结果过滤"""
+        sql = "SELECT * FROM token_verdicts" + (" WHERE verdict = ?" if verdict else "")
+        rows = self.conn.execute(sql, (verdict,) if verdict else ()).fetchall()
+        return {
+            row["address"]: {"verdict": row["verdict"], "status": row["status"],
+                             "reason": row["reason"], "checked_at": row["checked_at"]}
+            for row in rows
+        }
+
+    # ---------- 检查点 ----------
+
+    def set_checkpoint(self, name: str, block_number: int):
+        """保存进度检查点"""
+        with self.transaction() as conn:
+            conn.execute("""
+                INSERT INTO checkpoints (name, block_number, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET block_number = excluded.block_number, updated_at = excluded.updated_at
+            """, (name, block_number, datetime.now().strftime(TIME_FORMAT)))
+
+    def get_checkpoint(self, name: str) -> Optional[int]:
+        """读取进度检查点，不存在时返回None"""
+        row = self.conn.execute("SELECT block_number FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def delete_checkpoint(self, name: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE name = ?", (name,))
+
+    # ---------- JSON导入导出 ----------
+
+    def import_json(self, tokens_file: str = "bsc_tokens.json", known_pools_file: str = "known_pools.json",
+                    progress_file: str = "pools_progress.json", pools_file: str = "pancakeswap_v3_pools.json"):
+        """从旧的JSON文件导入数据"""
+        if os.path.exists(tokens_file):
+            with open(tokens_file, "r", encoding="utf-8") as f:
+                tokens = json.load(f)
+            self.upsert_tokens(tokens)
+            # 导入时保留原有的出现次数
+            with self.transaction() as conn:
+                conn.executemany("UPDATE tokens SET count = MAX(count, ?) WHERE address = ?",
+                                 [(info.get("count", 0), address) for address, info in tokens.items()])
+
+        if os.path.exists(progress_file):
+            with open(progress_file, "r") as f:
+                progress = json.load(f)
+            self.upsert_pools(progress.get("pools", []))
+            if self.get_checkpoint("pool_scan") is None and progress.get("last_block"):
+                self.set_checkpoint("pool_scan", progress["last_block"])
+        elif os.path.exists(pools_file):
+            with open(pools_file, "r") as f:
+                self.upsert_pools(json.load(f))
+
+        if os.path.exists(known_pools_file):
+            with open(known_pools_file, "r", encoding="utf-8") as f:
+                self.upsert_pools(json.load(f), known=True)
+
+    def export_tokens_json(self, path: str = "bsc_tokens.json"):
+        """导出bsc_tokens.json，先写临时文件再替换，避免读取方看到写了一半的文件"""
+        write_json_atomic(path, self.load_tokens(), indent=2, ensure_ascii=False)
+
+    def export_known_pools_json(self, path: str = "known_pools.json"):
+        """导出known_pools.json"""
+        write_json_atomic(path, self.load_known_pools(), indent=2, ensure_ascii=False, sort_keys=True)
+
+    def export_pools_json(self, path: str = "pancakeswap_v3_pools.json"):
+        """导出pancakeswap_v3_pools.json"""
+        write_json_atomic(path, self.load_pools(), indent=2)
+
+def write_json_atomic(path: str, data, **kwargs):
+    """写入临时文件后原子替换目标文件"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+# 进程内共享的存储实例
+state_store: StateStore = None
+
+def get_state_store(path: str = STATE_DB) -> StateStore:
+    """获取共享的状态存储，首次创建数据库时自动导入现有JSON文件"""
+    global state_store
+    if state_store is None:
+        is_new = not os.path.exists(path)
+        state_store = StateStore(path)
+        if is_new or (state_store.count_tokens() == 0 and state_store.count_pools() == 0):
+            state_store.import_json()
+    return state_store
+
+if __name__ == "__main__":
+    store = get_state_store()
+    print(f"代币数量: {store.count_tokens()}")
+    print(f"池子数量: {store.count_pools()}")
+    print(f"池子扫描进度: {store.get_checkpoint('pool_scan')}")
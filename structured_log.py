@@ -0,0 +1,132 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict
+
+# 通过环境变量配置
+LOG_LEVEL_ENV = "BSC_LOG_LEVEL"      # 日志级别，默认INFO
+LOG_FILE_ENV = "BSC_LOG_FILE"        # JSON lines输出文件，默认写到stderr
+LOG_SAMPLE_ENV = "BSC_LOG_SAMPLE"    # 采样配置，例如 "pool_found:100,new_token:10" 表示每100条保留1条
+
+# 所有脚本日志的根logger
+ROOT_LOGGER = "bsc"
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，事件字段展开到顶层"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+        }
+        message = record.getMessage()
+        if message:
+            data["msg"] = message
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """入队前只合并消息参数，异常栈保存在exc_text中交给JsonFormatter输出为exc字段
+
+    标准QueueHandler.prepare会用格式化后的整段文本（包括异常栈）替换msg并清除exc_info
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+class SamplingFilter(logging.Filter):
+    """按事件名采样，每every条只保留第一条；WARNING及以上级别不采样"""
+
+    def __init__(self, every: Dict[str, int]):
+        super().__init__()
+        self.every = every
+        self.seen = Counter()
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        n = self.every.get(event, 1)
+        if n <= 1 or record.levelno >= logging.WARNING:
+            return True
+        with self.lock:
+            self.seen[event] += 1
+            return self.seen[event] % n == 1
+
+def parse_sample_config(value: str) -> Dict[str, int]:
+    """解析 "事件:N,事件:N" 格式的采样配置"""
+    every = {}
+    for item in filter(None, (part.strip() for part in (value or "").split(","))):
+        event, _, n = item.partition(":")
+        every[event] = max(int(n or 1), 1)
+    return every
+
+listener: logging.handlers.QueueListener = None
+
+def configure_logging(level: str = None, path: str = None, sample: Dict[str, int] = None):
+    """配置根logger：日志先进入内存队列，由后台线程格式化并写出，调用方不会阻塞在终端或磁盘I/O上
+
+    参数为None时使用环境变量，重复调用会替换之前的配置
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+
+    level = level or os.environ.get(LOG_LEVEL_ENV, "INFO")
+    path = path or os.environ.get(LOG_FILE_ENV)
+    sample = sample if sample is not None else parse_sample_config(os.environ.get(LOG_SAMPLE_ENV))
+
+    target = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    if sample:
+        queue_handler.addFilter(SamplingFilter(sample))
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers = [queue_handler]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, target)
+    listener.start()
+
+def shutdown_logging():
+    """写出队列中剩余的日志"""
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+
+atexit.register(shutdown_logging)
+
+def get_logger(name: str) -> logging.Logger:
+    """获取脚本的logger，首次调用时按环境变量完成配置"""
+    if listener is None:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+def log_event(logger: logging.Logger, level: int, event: str, message: str = "", **fields):
+    """记录一条结构化事件，级别未开启时直接返回，不会进入队列"""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, "fields": fields})
@@ -1,7 +1,31 @@
 import requests
 import time
+import threading
+import argparse
+from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 import json
+import numpy as np
+from web3 import Web3
+from multicall import Multicall
+from log_decoder import PANCAKESWAP_V3_FACTORY
+
+# 基准测试结果文件，bsc_provider按其中的评分选择节点
+BENCHMARK_FILE = "node_benchmark.json"
+
+# PoolCreated事件topic，用于eth_getLogs测试
+POOL_CREATED_TOPIC = Web3.to_hex(Web3.keccak(text='PoolCreated(address,address,uint24,int24,address)'))
+
+# eth_getLogs测试的区块范围
+GET_LOGS_RANGE = 10000
+
+# 限流测试的并发级别，以及每个级别持续的秒数
+RATE_LIMIT_LEVELS = [1, 2, 4, 8, 16, 32]
+RATE_LIMIT_STEP_SECONDS = 5
+
+# 错误率超过该值视为触发限流
+RATE_LIMIT_ERROR_RATE = 0.05
 
 # BSC节点列表
 NODES = {
@@ -75,7 +99,212 @@ def test_node(node_name, node_url):
             "error": str(e)
         }
 
+def rpc_request(session: requests.Session, node_url: str, method: str, params: list, timeout: float = 30):
+    """发送一次JSON-RPC请求，返回 (耗时毫秒, 结果, 错误信息)"""
+    payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
+    start_time = time.perf_counter()
+    try:
+        response = session.post(node_url, json=payload, timeout=timeout)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        if response.status_code != 200:
+            return elapsed, None, f"HTTP错误: {response.status_code}"
+        data = response.json()
+        if "error" in data:
+            return elapsed, None, str(data["error"].get("message", data["error"]))
+        return elapsed, data.get("result"), None
+    except Exception as e:
+        return (time.perf_counter() - start_time) * 1000, None, str(e)
+
+def build_benchmark_requests(head: int) -> Dict[str, list]:
+    """构造与实际脚本相同类型的请求：multicall、10k区块的getLogs和整块收据"""
+    multicall = Multicall(Web3())
+    timestamp_call = multicall.contract.functions.getCurrentBlockTimestamp()._encode_transaction_data()
+    subcalls = [(multicall.contract.address, 100000, timestamp_call)] * 50
+    multicall_data = multicall.contract.functions.multicall(subcalls)._encode_transaction_data()
+
+    return {
+        "eth_blockNumber": [],
+        "eth_call": [{"to": multicall.contract.address, "data": multicall_data}, "latest"],
+        "eth_getLogs": [{
+            "address": PANCAKESWAP_V3_FACTORY,
+            "topics": [POOL_CREATED_TOPIC],
+            "fromBlock": hex(head - GET_LOGS_RANGE),
+            "toBlock": hex(head)
+        }],
+        "eth_getBlockReceipts": [hex(head - 5)],
+    }
+
+def latency_stats(latencies: List[float], errors: int) -> Dict:
+    """计算延迟分位数（毫秒）"""
+    if not latencies:
+        return {"count": 0, "errors": errors}
+    values = np.array(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+    }
+
+def measure_rate_limit(node_url: str) -> float:
+    """逐步提高并发，返回错误率超过阈值前达到的最高每秒请求数"""
+    best_rps = 0.0
+    for level in RATE_LIMIT_LEVELS:
+        counts = {"ok": 0, "error": 0}
+        lock = threading.Lock()
+        deadline = time.time() + RATE_LIMIT_STEP_SECONDS
+
+        def worker():
+            session = requests.Session()
+            while time.time() < deadline:
+                _, _, error = rpc_request(session, node_url, "eth_blockNumber", [], timeout=10)
+                with lock:
+                    counts["error" if error else "ok"] += 1
+
+        with ThreadPoolExecutor(max_workers=level) as executor:
+            for _ in range(level):
+                executor.submit(worker)
+
+        total = counts["ok"] + counts["error"]
+        if total == 0 or counts["error"] / total > RATE_LIMIT_ERROR_RATE:
+            break
+        best_rps = counts["ok"] / RATE_LIMIT_STEP_SECONDS
+    return round(best_rps, 2)
+
+def benchmark_node(node_name: str, node_url: str, duration: float, concurrency: int) -> Dict:
+    """在持续duration秒的时间窗口内轮流发送各类请求，统计吞吐量和每种方法的延迟"""
+    session = requests.Session()
+    _, head, error = rpc_request(session, node_url, "eth_blockNumber", [], timeout=10)
+    if error:
+        return {"node": node_name, "url": node_url, "status": "失败", "error": error}
+
+    requests_by_method = build_benchmark_requests(int(head, 16))
+    methods = list(requests_by_method)
+    latencies = {method: [] for method in methods}
+    errors = {method: 0 for method in methods}
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def worker(offset: int):
+        worker_session = requests.Session()
+        index = offset
+        while time.time() < deadline:
+            method = methods[index % len(methods)]
+            index += 1
+            elapsed, _, error = rpc_request(worker_session, node_url, method, requests_by_method[method])
+            with lock:
+                if error:
+                    errors[method] += 1
+                else:
+                    latencies[method].append(elapsed)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for offset in range(concurrency):
+            executor.submit(worker, offset)
+    elapsed = time.time() - started
+
+    successes = sum(len(v) for v in latencies.values())
+    failures = sum(errors.values())
+    return {
+        "node": node_name,
+        "url": node_url,
+        "status": "成功",
+        "throughput_rps": round(successes / elapsed, 2),
+        "error_rate": round(failures / max(successes + failures, 1), 4),
+        "methods": {method: latency_stats(latencies[method], errors[method]) for method in methods},
+    }
+
+def sample_head_lag(nodes: Dict[str, str], duration: float, interval: float = 3.0) -> Dict[str, Dict]:
+    """在时间窗口内定期同时查询所有节点的最新区块，计算各节点落后于最高区块的数量"""
+    lags = {url: [] for url in nodes.values()}
+    deadline = time.time() + duration
+    with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        while time.time() < deadline:
+            sample_started = time.time()
+            heads = dict(zip(nodes.values(), executor.map(
+                lambda url: rpc_request(requests.Session(), url, "eth_blockNumber", [], timeout=5)[1],
+                nodes.values()
+            )))
+            valid = {url: int(h, 16) for url, h in heads.items() if h}
+            if valid:
+                top = max(valid.values())
+                for url, h in valid.items():
+                    lags[url].append(top - h)
+            time.sleep(max(0.0, interval - (time.time() - sample_started)))
+    return {
+        url: {"avg": round(float(np.mean(v)), 2), "max": int(max(v))} if v else {"avg": None, "max": None}
+        for url, v in lags.items()
+    }
+
+def node_score(result: Dict) -> float:
+    """路由评分（越小越好）：各方法p95延迟的平均值，按错误率放大，并对落后区块加罚"""
+    p95s = [m["p95"] for m in result["methods"].values() if "p95" in m]
+    if not p95s:
+        return None
+    lag = result.get("head_lag", {}).get("avg") or 0
+    return round(float(np.mean(p95s)) * (1 + 10 * result["error_rate"]) + 3000 * lag, 2)
+
+def run_benchmark(duration: float, concurrency: int, output: str, check_rate_limit: bool):
+    """对所有节点执行持续基准测试并写出结果文件"""
+    # 去掉重复的URL
+    nodes = {}
+    for name, url in NODES.items():
+        if url not in nodes.values():
+            nodes[name] = url
+    print(f"开始基准测试 {len(nodes)} 个节点，时间窗口 {duration} 秒，每个节点并发 {concurrency}\n")
+
+    with ThreadPoolExecutor(max_workers=len(nodes) + 1) as executor:
+        lag_future = executor.submit(sample_head_lag, nodes, duration)
+        futures = [executor.submit(benchmark_node, name, url, duration, concurrency) for name, url in nodes.items()]
+        results = [future.result() for future in futures]
+        head_lags = lag_future.result()
+
+    successful_results = [r for r in results if r["status"] == "成功"]
+    if check_rate_limit:
+        print("测试限流阈值...")
+        with ThreadPoolExecutor(max_workers=len(successful_results) or 1) as executor:
+            limits = list(executor.map(lambda r: measure_rate_limit(r["url"]), successful_results))
+        for result, limit in zip(successful_results, limits):
+            result["rate_limit_rps"] = limit
+
+    for result in successful_results:
+        result["head_lag"] = head_lags.get(result["url"], {})
+        result["score"] = node_score(result)
+
+    ranked = sorted((r for r in successful_results if r["score"] is not None), key=lambda r: r["score"])
+    for index, result in enumerate(ranked, 1):
+        call = result["methods"]["eth_call"]
+        print(f"第{index}名 {result['node']} ({result['url']})")
+        print(f"  评分: {result['score']}  吞吐量: {result['throughput_rps']}/秒  错误率: {result['error_rate']:.2%}")
+        print(f"  eth_call p50/p95/p99: {call.get('p50')}/{call.get('p95')}/{call.get('p99')}ms")
+        print(f"  落后区块 平均/最大: {result['head_lag'].get('avg')}/{result['head_lag'].get('max')}")
+        if "rate_limit_rps" in result:
+            print(f"  限流前最高: {result['rate_limit_rps']}/秒")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "duration": duration,
+            "concurrency": concurrency,
+            "nodes": {r["url"]: r for r in results}
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\n基准测试结果已保存到 {output}")
+
 def main():
+    parser = argparse.ArgumentParser(description='测试BSC节点响应速度')
+    parser.add_argument('--benchmark', action='store_true', help='持续基准测试，并写出供节点路由使用的结果文件')
+    parser.add_argument('--duration', type=float, default=60, help='基准测试时间窗口（秒）')
+    parser.add_argument('--concurrency', type=int, default=4, help='每个节点的并发请求数')
+    parser.add_argument('--rate-limit', action='store_true', help='同时测试限流阈值')
+    parser.add_argument('--output', default=BENCHMARK_FILE, help='结果文件')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.duration, args.concurrency, args.output, args.rate_limit)
+        return
+
     print("开始测试BSC节点响应速度...\n")
     
     # 使用线程池并行测试所有节点
@@ -0,0 +1,115 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from web3 import Web3
+from multicall import Multicall, gas_capped_batch_size
+
+# TickLens合约地址 (BSC主网)
+TICK_LENS_ADDRESS = "0x9a489505a00cE272eAa5e07Dba6491314CaE3796"
+
+# 加载TickLens ABI
+with open("ABI/TickLens.json", "r") as f:
+    TICK_LENS_ABI = json.load(f)
+
+# tick位图每个word包含的tick数量
+TICKS_PER_WORD = 256
+
+# 单个getPopulatedTicksInWord子调用的gas上限（word内256个tick全部初始化时约需2.5M）
+TICK_LENS_CALL_GAS_LIMIT = 3000000
+
+# 池子地址的校验和格式，批量请求中同一个池子的多个word只计算一次
+checksum_address = lru_cache(maxsize=None)(Web3.to_checksum_address)
+
+def tick_to_word(tick: int, tick_spacing: int) -> int:
+    """计算tick所在的位图word索引（与合约一致，向负无穷取整）"""
+    compressed = tick // tick_spacing
+    return compressed >> 8
+
+class TickDataCache:
+    """按 (池子, word) 缓存TickLens返回的已初始化tick，缺失的word用multicall批量获取
+
+    TickLens调用消耗的gas随word内的tick数量增长，默认的multicall按节点的gas上限拆分批次，
+    第一批确定区块号，其余批次固定在该区块上并行执行
+    """
+
+    def __init__(self, w3: Web3, multicall: Multicall = None, ttl: float = 60.0, max_workers: int = 8):
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3, batch_size=gas_capped_batch_size(TICK_LENS_CALL_GAS_LIMIT),
+                                                call_gas_limit=TICK_LENS_CALL_GAS_LIMIT)
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.tick_lens = w3.eth.contract(address=Web3.to_checksum_address(TICK_LENS_ADDRESS), abi=TICK_LENS_ABI)
+        # {(pool, word): (fetched_at, [(tick, liquidityNet, liquidityGross), ...])}
+        self.words: Dict[Tuple[str, int], Tuple[float, List[Tuple[int, int, int]]]] = {}
+
+    def is_fresh(self, key: Tuple[str, int]) -> bool:
+        """缓存项是否仍在有效期内"""
+        entry = self.words.get(key)
+        return entry is not None and time.time() - entry[0] < self.ttl
+
+    def aggregate(self, calls: list, block_identifier) -> list:
+        """执行多批multicall，第一批之后的批次固定在同一区块并行执行"""
+        size = self.multicall.batch_size
+        block_number, results = self.multicall.aggregate(calls[:size], block_identifier=block_identifier)
+        chunks = [calls[i:i + size] for i in range(size, len(calls), size)]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for _, chunk_results in executor.map(lambda chunk: self.multicall.aggregate(chunk, block_number), chunks):
+                    results.extend(chunk_results)
+        return results
+
+    def fetch_words(self, requests: List[Tuple[str, int]], block_identifier="latest") -> List[Tuple[str, int]]:
+        """批量获取多个 (池子, word) 的tick数据并写入缓存，已缓存且未过期的word会被跳过
+
+        Returns:
+            获取失败的 (池子, word) 列表，这些word不会写入缓存
+        """
+        missing = list(dict.fromkeys(
+            key for key in ((checksum_address(pool_address), word) for pool_address, word in requests)
+            if not self.is_fresh(key)
+        ))
+        if not missing:
+            return []
+
+        calls = [self.tick_lens.functions.getPopulatedTicksInWord(pool, word) for pool, word in missing]
+        results = self.aggregate(calls, block_identifier)
+
+        fetched_at = time.time()
+        failed = []
+        for key, ticks in zip(missing, results):
+            if ticks is None:
+                failed.append(key)
+                continue
+            self.words[key] = (fetched_at, sorted((tick, net, gross) for tick, net, gross in ticks))
+        return failed
+
+    def get_ticks(self, pool_address: str, tick_spacing: int, tick_lower: int, tick_upper: int,
+                  block_identifier="latest") -> List[Tuple[int, int, int]]:
+        """获取池子在 [tick_lower, tick_upper] 范围内的已初始化tick，按tick升序返回
+
+        有word无法获取时抛出ValueError，避免把缺失的word当作没有流动性变化
+        """
+        pool_address = Web3.to_checksum_address(pool_address)
+        word_lower = tick_to_word(tick_lower, tick_spacing)
+        word_upper = tick_to_word(tick_upper, tick_spacing)
+        failed = self.fetch_words([(pool_address, word) for word in range(word_lower, word_upper + 1)],
+                                  block_identifier=block_identifier)
+        if failed:
+            raise ValueError(f"无法获取池子 {pool_address} 的tick数据: word {[word for _, word in failed]}")
+
+        ticks = []
+        for word in range(word_lower, word_upper + 1):
+            entry = self.words.get((pool_address, word))
+            ticks.extend(t for t in entry[1] if tick_lower <= t[0] <= tick_upper)
+        return ticks
+
+    def clear(self, pool_address: str = None):
+        """清除缓存，不指定池子时清除全部"""
+        if pool_address is None:
+            self.words.clear()
+            return
+        pool_address = Web3.to_checksum_address(pool_address)
+        for key in [k for k in self.words if k[0] == pool_address]:
+            del self.words[key]
@@ -0,0 +1,250 @@
+import argparse
+import heapq
+import json
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from web3 import Web3
+from multicall import Multicall, bind_call, gas_capped_batch_size
+from state_store import get_state_store
+from bsc_provider import get_web3
+
+# MixedRouteQuoterV1合约地址 (V3版本)
+MIXED_ROUTE_QUOTER_ADDRESS = "0x678Aa4bF4E210cf2166753e054d5b7c31cc7fa86"
+
+# MixedRouteQuoterV1.quoteExactInput 每一跳的池子类型标记（0: V2, 1: V3, 2/3: StableSwap）
+MIXED_ROUTE_FLAG_V3 = 1
+
+# 多跳报价需要模拟多次swap，每个子调用的gas上限比默认值高
+QUOTE_CALL_GAS_LIMIT = 5000000
+
+# sqrtPriceX96的定点数基数
+Q96 = 2 ** 96
+
+# 加载V3池子ABI
+with open("ABI/PancakeV3Pool.json", "r") as f:
+    POOL_ABI = json.load(f)
+
+# 加载MixedRouteQuoterV1 ABI
+with open("ABI/MixedRouteQuoterV1.json", "r") as f:
+    MIXED_ROUTE_QUOTER_ABI = json.load(f)
+
+def encode_path(tokens: List[str], fees: List[int]) -> bytes:
+    """按V3路径格式编码：token(20字节) + fee(3字节) + token + ..."""
+    if len(tokens) != len(fees) + 1:
+        raise ValueError("路径中代币数量必须比费率数量多1")
+    path = bytes.fromhex(tokens[0][2:])
+    for fee, token in zip(fees, tokens[1:]):
+        path += fee.to_bytes(3, "big") + bytes.fromhex(token[2:])
+    return path
+
+def simulate_swap(reserve_in: float, reserve_out: float, fee: int, amount_in: float) -> float:
+    """用当前tick内的虚拟储备估算输出数量
+
+    V3池子在当前tick区间内等价于虚拟储备 x = L / sqrtP, y = L * sqrtP 的恒定乘积池，
+    跨越tick后的流动性变化不计入，因此大额交易的估算会偏高，仅用于路径排序
+    """
+    amount = amount_in * (1_000_000 - fee) / 1_000_000
+    return reserve_out * amount / (reserve_in + amount)
+
+class TokenGraph:
+    """以代币为节点、池子为边的内存图，边上标注费率和当前价格/活跃流动性
+
+    find_routes 按路径输出数量搜索1~3跳的k条最优路径，数千个池子的图上一次搜索在毫秒级完成
+    """
+
+    def __init__(self, pools: List[Dict]):
+        # {token: [(token_out, pool, fee, zero_for_one), ...]}
+        self.edges: Dict[str, List[Tuple[str, str, int, bool]]] = defaultdict(list)
+        # {(token_in, token_out): [(token_out, pool, fee, zero_for_one), ...]}，用于最后一跳的直接查找
+        self.pair_edges: Dict[Tuple[str, str], List[Tuple[str, str, int, bool]]] = defaultdict(list)
+        # {pool: (token0, token1, fee)}
+        self.pools: Dict[str, Tuple[str, str, int]] = {}
+        # {pool: (reserve0, reserve1, sqrt_price_x96, liquidity)}
+        self.states: Dict[str, Tuple[float, float, int, int]] = {}
+        self.symbols: Dict[str, str] = {}
+
+        for pool in pools:
+            self.add_pool(pool)
+
+    @classmethod
+    def from_state_store(cls, known_only: bool = True) -> "TokenGraph":
+        """从状态库（首次使用时由known_pools.json导入）构建图"""
+        return cls(get_state_store().load_pools(known_only=known_only))
+
+    def add_pool(self, pool: Dict):
+        """添加一个池子，格式与known_pools.json相同"""
+        address = Web3.to_checksum_address(pool["pool"])
+        if address in self.pools:
+            return
+        token0 = Web3.to_checksum_address(pool["token0"])
+        token1 = Web3.to_checksum_address(pool["token1"])
+        fee = int(pool["fee"])
+        self.pools[address] = (token0, token1, fee)
+        for token_in, token_out, zero_for_one in ((token0, token1, True), (token1, token0, False)):
+            edge = (token_out, address, fee, zero_for_one)
+            self.edges[token_in].append(edge)
+            self.pair_edges[(token_in, token_out)].append(edge)
+        if pool.get("token0_symbol"):
+            self.symbols.setdefault(token0, pool["token0_symbol"])
+        if pool.get("token1_symbol"):
+            self.symbols.setdefault(token1, pool["token1_symbol"])
+
+    def symbol(self, token: str) -> str:
+        return self.symbols.get(token, token)
+
+    # ---------- 池子状态 ----------
+
+    def set_pool_state(self, pool: str, sqrt_price_x96: int, liquidity: int):
+        """更新池子的当前价格和活跃流动性，并换算为虚拟储备"""
+        if not sqrt_price_x96 or not liquidity:
+            self.states.pop(pool, None)
+            return
+        sqrt_price = sqrt_price_x96 / Q96
+        self.states[pool] = (liquidity / sqrt_price, liquidity * sqrt_price, sqrt_price_x96, liquidity)
+
+    def refresh_state(self, multicall: Multicall, pools: List[str] = None, block_identifier="latest") -> int:
+        """用multicall批量获取池子的slot0和liquidity，返回所在区块号"""
+        pools = list(pools) if pools is not None else list(self.pools)
+        contract = multicall.w3.eth.contract(abi=POOL_ABI)
+        calls = []
+        for address in pools:
+            calls.extend([bind_call(contract.functions.slot0(), address),
+                          bind_call(contract.functions.liquidity(), address)])
+        block_number, results = multicall.aggregate(calls, block_identifier=block_identifier)
+
+        for index, address in enumerate(pools):
+            slot0, liquidity = results[2 * index], results[2 * index + 1]
+            self.set_pool_state(address, slot0[0] if slot0 else 0, liquidity or 0)
+        return block_number
+
+    # ---------- 路径搜索 ----------
+
+    def find_routes(self, token_in: str, token_out: str, amount_in: int, max_hops: int = 3,
+                    k: int = 5, min_liquidity: int = 0) -> List[Dict]:
+        """搜索token_in到token_out的k条最优路径（按估算输出数量降序）
+
+        逐跳扩展，每个中间代币只保留输出最多的k条部分路径；最后一跳只查找直接连到token_out的池子。
+        没有状态（未刷新或流动性为0）的池子不参与搜索
+
+        Returns:
+            [{"tokens": [...], "pools": [...], "fees": [...], "amount_out": 估算输出}, ...]
+        """
+        token_in = Web3.to_checksum_address(token_in)
+        token_out = Web3.to_checksum_address(token_out)
+
+        # 部分路径: (当前数量, 代币元组, 池子元组, 费率元组)
+        frontier = {token_in: [(float(amount_in), (token_in,), (), ())]}
+        routes = []
+
+        for hop in range(max_hops):
+            last_hop = hop == max_hops - 1
+            next_frontier = defaultdict(list)
+            for token, labels in frontier.items():
+                edges = self.pair_edges.get((token, token_out), ()) if last_hop else self.edges.get(token, ())
+                for next_token, pool, fee, zero_for_one in edges:
+                    state = self.states.get(pool)
+                    if state is None or state[3] < min_liquidity:
+                        continue
+                    reserve_in, reserve_out = (state[0], state[1]) if zero_for_one else (state[1], state[0])
+                    for amount, tokens, pools, fees in labels:
+                        if next_token in tokens:
+                            continue
+                        out = simulate_swap(reserve_in, reserve_out, fee, amount)
+                        if out <= 0:
+                            continue
+                        label = (out, tokens + (next_token,), pools + (pool,), fees + (fee,))
+                        if next_token == token_out:
+                            routes.append(label)
+                        elif not last_hop:
+                            next_frontier[next_token].append(label)
+            frontier = {token: heapq.nlargest(k, labels, key=lambda label: label[0])
+                        for token, labels in next_frontier.items()}
+            if not frontier:
+                break
+
+        return [
+            {"tokens": list(tokens), "pools": list(pools), "fees": list(fees), "amount_out": int(out)}
+            for out, tokens, pools, fees in heapq.nlargest(k, routes, key=lambda label: label[0])
+        ]
+
+    def format_route(self, route: Dict) -> str:
+        """格式化路径，例如 CAKE -(0.25%)-> WBNB -(0.05%)-> USDT"""
+        text = self.symbol(route["tokens"][0])
+        for fee, token in zip(route["fees"], route["tokens"][1:]):
+            text += f" -({fee / 10000}%)-> {self.symbol(token)}"
+        return text
+
+def route_path(route: Dict) -> Tuple[bytes, List[int]]:
+    """返回MixedRouteQuoterV1.quoteExactInput的 (path, flag) 参数"""
+    return encode_path(route["tokens"], route["fees"]), [MIXED_ROUTE_FLAG_V3] * len(route["fees"])
+
+def quote_routes(w3: Web3, routes: List[Dict], amount_in: int, multicall: Multicall = None,
+                 block_identifier="latest") -> Tuple[int, List[Optional[int]]]:
+    """用MixedRouteQuoterV1在同一个区块批量报价，返回 (区块号, 与routes对应的输出数量)，失败的路径为None"""
+    multicall = multicall or Multicall(w3, batch_size=gas_capped_batch_size(QUOTE_CALL_GAS_LIMIT),
+                                       call_gas_limit=QUOTE_CALL_GAS_LIMIT)
+    quoter = w3.eth.contract(address=Web3.to_checksum_address(MIXED_ROUTE_QUOTER_ADDRESS), abi=MIXED_ROUTE_QUOTER_ABI)
+    calls = [quoter.functions.quoteExactInput(*route_path(route), amount_in) for route in routes]
+    block_number, results = multicall.aggregate(calls, block_identifier=block_identifier)
+    return block_number, [result[0] if result else None for result in results]
+
+def resolve_token(identifier: str, tokens: Dict[str, Dict]) -> Optional[str]:
+    """地址直接返回，符号或名称返回rank最小的匹配代币"""
+    if Web3.is_address(identifier):
+        return Web3.to_checksum_address(identifier)
+    identifier = identifier.lower()
+    for address, info in tokens.items():
+        if (info.get("symbol") or "").lower() == identifier or (info.get("name") or "").lower() == identifier:
+            return address
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='在已知池子中搜索多跳兑换路径')
+    parser.add_argument('token_in', help='输入代币符号或地址')
+    parser.add_argument('token_out', help='输出代币符号或地址')
+    parser.add_argument('amount', type=float, help='输入数量（按代币精度换算）')
+    parser.add_argument('--hops', type=int, default=3, help='最大跳数')
+    parser.add_argument('-k', type=int, default=5, help='返回的路径数量')
+    parser.add_argument('--all-pools', action='store_true', help='使用全部池子而不仅是已知代币的池子')
+    parser.add_argument('--quote', action='store_true', help='用MixedRouteQuoterV1对找到的路径进行链上报价')
+    args = parser.parse_args()
+
+    tokens = get_state_store().load_tokens()
+    token_in = resolve_token(args.token_in, tokens)
+    token_out = resolve_token(args.token_out, tokens)
+    if not token_in or not token_out:
+        print(f"未找到代币: {args.token_in if not token_in else args.token_out}")
+        return
+
+    graph = TokenGraph.from_state_store(known_only=not args.all_pools)
+    print(f"代币图: {len(graph.edges)} 个代币, {len(graph.pools)} 个池子")
+
+    w3 = get_web3()
+    multicall = Multicall(w3)
+    started = time.perf_counter()
+    block_number = graph.refresh_state(multicall)
+    print(f"已获取区块 {block_number} 的池子状态，耗时 {time.perf_counter() - started:.2f} 秒")
+
+    decimals_in = tokens.get(token_in, {}).get("decimals") or 18
+    decimals_out = tokens.get(token_out, {}).get("decimals") or 18
+    amount_in = int(args.amount * 10 ** decimals_in)
+
+    started = time.perf_counter()
+    routes = graph.find_routes(token_in, token_out, amount_in, max_hops=args.hops, k=args.k)
+    print(f"路径搜索耗时 {(time.perf_counter() - started) * 1000:.1f} 毫秒，找到 {len(routes)} 条路径")
+    if not routes:
+        return
+
+    quotes = [None] * len(routes)
+    if args.quote:
+        _, quotes = quote_routes(w3, routes, amount_in, block_identifier=block_number)
+
+    for index, (route, quote) in enumerate(zip(routes, quotes), 1):
+        print(f"\n{index}. {graph.format_route(route)}")
+        print(f"   估算输出: {route['amount_out'] / 10 ** decimals_out}")
+        if args.quote:
+            print(f"   链上报价: {quote / 10 ** decimals_out if quote is not None else '失败'}")
+
+if __name__ == "__main__":
+    main()
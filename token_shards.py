@@ -0,0 +1,150 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import Dict, Iterable, Iterator
+import requests
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from log_decoder import TRANSFER_TOPIC
+from bsc_provider import resolve_node_url
+from rpc_metrics import construct_metrics_middleware, get_rpc_metrics, with_size_hook
+
+class RateLimiter:
+    """限制每秒请求数，rate为0时不限制"""
+
+    def __init__(self, rate: float = 0):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+# 工作进程内的Web3实例和请求限速
+worker_w3: Web3 = None
+rate_limiter = RateLimiter()
+
+# 节点是否支持eth_getBlockReceipts，不支持时逐笔获取收据
+block_receipts_supported = True
+
+# 工作进程是否把RPC统计随扫描结果交给主进程
+return_metrics = False
+
+def init_worker(rpc_url: str, max_requests_per_second: float = 0, in_subprocess: bool = True):
+    """工作进程初始化，使用独立的HTTP会话，不复用父进程fork过来的连接
+
+    请求记录到RPC统计中；在子进程中时统计随每个区块的扫描结果返回，由主进程合并
+    """
+    global worker_w3, rate_limiter, return_metrics
+    rate_limiter = RateLimiter(max_requests_per_second)
+    url = resolve_node_url(rpc_url)
+    worker_w3 = Web3(Web3.HTTPProvider(url, request_kwargs=with_size_hook({'timeout': 30}), session=requests.Session()))
+    worker_w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    worker_w3.middleware_onion.inject(construct_metrics_middleware(url), name="rpc_metrics", layer=0)
+    return_metrics = in_subprocess
+    if in_subprocess:
+        # 丢弃fork时从父进程复制的统计
+        get_rpc_metrics().take()
+
+def get_block_receipts(w3: Web3, block) -> list:
+    """获取区块内全部交易收据，优先一次请求取回整个区块"""
+    global block_receipts_supported
+    if block_receipts_supported:
+        rate_limiter.acquire()
+        # 经过中间件发出原始请求，以便读取错误码并记录统计
+        response = w3.provider.request_func(w3, w3.middleware_onion)("eth_getBlockReceipts", [hex(block['number'])])
+        if response.get("result") is not None:
+            return response["result"]
+        error = response.get("error") or {}
+        if error.get("code") == -32601:
+            # 方法不存在
+            block_receipts_supported = False
+        elif error:
+            raise ValueError(error)
+    receipts = []
+    for tx_hash in block['transactions']:
+        rate_limiter.acquire()
+        receipts.append(w3.eth.get_transaction_receipt(tx_hash))
+    return receipts
+
+def count_transfers(receipts: list) -> Dict[str, int]:
+    """统计成功交易中每个代币的ERC20 Transfer次数
+
+    只比较topic0和topic数量，不解码日志数据（3个topic的Transfer为ERC20，4个为NFT）
+    """
+    counts = Counter()
+    for receipt in receipts:
+        status = receipt['status']
+        if (int(status, 16) if isinstance(status, str) else status) != 1:
+            continue
+        for log in receipt['logs']:
+            topics = log['topics']
+            if len(topics) == 3 and HexBytes(topics[0]) == TRANSFER_TOPIC:
+                counts[Web3.to_checksum_address(log['address'])] += 1
+    return dict(counts)
+
+def scan_block(block_number: int) -> Dict:
+    """在工作进程中扫描一个区块，只返回区块哈希和每个代币的计数增量"""
+    rate_limiter.acquire()
+    block = worker_w3.eth.get_block(block_number)
+    counts = count_transfers(get_block_receipts(worker_w3, block)) if block['transactions'] else {}
+    result = {
+        'number': block['number'],
+        'hash': bytes(block['hash']),
+        'parentHash': bytes(block['parentHash']),
+        'counts': counts,
+    }
+    if return_metrics:
+        result['metrics'] = get_rpc_metrics().take()
+    return result
+
+class ShardedScanner:
+    """把区块分配给多个工作进程扫描，按区块号顺序返回结果，由调用方单独写入状态
+
+    同时进行的请求数不超过工作进程数，max_requests_per_second平均分配给各工作进程
+    """
+
+    def __init__(self, rpc_url: str, workers: int = None, max_requests_per_second: float = 0):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker,
+                                         initargs=(rpc_url, max_requests_per_second / self.workers))
+
+    def scan(self, block_numbers: Iterable[int]) -> Iterator[Dict]:
+        """按输入顺序返回扫描结果，各工作进程同时处理不同的区块，工作进程的RPC统计合并到主进程"""
+        results = self.pool.imap(scan_block, block_numbers)
+        metrics = get_rpc_metrics()
+
+        def merged() -> Iterator[Dict]:
+            for result in results:
+                metrics.merge(result.pop('metrics', {}))
+                yield result
+
+        return merged()
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+class ThreadedScanner:
+    """在当前进程中用线程池扫描区块，接口与ShardedScanner相同，适合不需要多进程解码的场景"""
+
+    def __init__(self, rpc_url: str, workers: int = 8, max_requests_per_second: float = 0):
+        self.workers = workers
+        init_worker(rpc_url, max_requests_per_second, in_subprocess=False)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def scan(self, block_numbers: Iterable[int]) -> Iterator[Dict]:
+        return self.executor.map(scan_block, block_numbers)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
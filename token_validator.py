@@ -0,0 +1,237 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from web3 import Web3
+from multicall import Multicall, bind_call, gas_capped_batch_size
+from state_store import TIME_FORMAT, get_state_store
+from bsc_provider import get_web3
+
+# TokenValidator合约地址 (BSC主网)
+TOKEN_VALIDATOR_ADDRESS = "0x864ED564875BdDD6F421e226494a0E7c071C06f8"
+
+# 加载TokenValidator ABI
+with open("ABI/Tokenvalidator.json", "r") as f:
+    TOKEN_VALIDATOR_ABI = json.load(f)
+
+# 从V2交易对闪电借出代币时使用的基础代币：WBNB、USDT、BUSD、USDC
+BASE_TOKENS = [
+    "0xbb4CdB9CBd36B01bD1cBaEBF2De08d9173bc095c",
+    "0x55d398326f99059fF775485246999027B3197955",
+    "0xe9e7CEA3DedcA5984780Bafc599bD69ADd087D56",
+    "0x8AC76a51cc950d9822D68b83fE1Ad97B32Cd580d",
+]
+
+# 闪电借出的代币数量（最小单位）
+AMOUNT_TO_BORROW = 1000
+
+# 每个batchValidate子调用验证的代币数量，以及对应的gas上限（每个代币需要一次闪电兑换和两次转账）
+VALIDATE_CHUNK_SIZE = 20
+VALIDATE_CALL_GAS_LIMIT = 10000000
+
+# 整批失败后逐个重试时单个validate子调用的gas上限
+TOKEN_VALIDATE_GAS_LIMIT = 1000000
+
+# TokenValidator调用失败的代币在该时间（秒）内不再重试
+UNVERIFIED_RETRY_SECONDS = 600
+
+# 验证结果
+VERDICT_OK = "ok"                        # 普通代币（TokenValidator返回UNKN，未检测到异常）
+VERDICT_FOT = "fot"                      # 转账收费代币
+VERDICT_STF = "stf"                      # 转账失败（貔貅或暂停转账）
+VERDICT_BAD_METADATA = "bad_metadata"    # name/symbol/decimals/totalSupply不可读或不合理
+
+# batchValidate返回的状态码
+VALIDATOR_STATUS = {0: VERDICT_OK, 1: VERDICT_FOT, 2: VERDICT_STF}
+
+# 合理的代币精度上限
+MAX_DECIMALS = 36
+
+# ERC20 ABI - 只包含代币元数据
+ERC20_ABI = [
+    {"constant": True, "inputs": [], "name": "name", "outputs": [{"name": "", "type": "string"}], "type": "function"},
+    {"constant": True, "inputs": [], "name": "symbol", "outputs": [{"name": "", "type": "string"}], "type": "function"},
+    {"constant": True, "inputs": [], "name": "decimals", "outputs": [{"name": "", "type": "uint8"}], "type": "function"},
+    {"constant": True, "inputs": [], "name": "totalSupply", "outputs": [{"name": "", "type": "uint256"}], "type": "function"}
+]
+
+def check_metadata(name: Optional[str], symbol: Optional[str], decimals: Optional[int],
+                   total_supply: Optional[int]) -> Optional[str]:
+    """检查代币元数据，返回不合格的原因，合格时返回None"""
+    if not symbol or not symbol.strip():
+        return "symbol不可读"
+    if name is None:
+        return "name不可读"
+    if decimals is None or decimals > MAX_DECIMALS:
+        return f"decimals不合理: {decimals}"
+    if not total_supply:
+        return "totalSupply为0或不可读"
+    return None
+
+class TokenValidator:
+    """批量验证代币：一次multicall读取元数据，并用TokenValidator.batchValidate检测转账收费和转账失败
+
+    验证结果保存在状态库的token_verdicts表中，已验证的代币不会重复请求；
+    TokenValidator调用失败且元数据正常的代币不保存结果，UNVERIFIED_RETRY_SECONDS之后再重试
+    """
+
+    def __init__(self, w3: Web3, multicall: Multicall = None, base_tokens: List[str] = None,
+                 amount_to_borrow: int = AMOUNT_TO_BORROW, chunk_size: int = VALIDATE_CHUNK_SIZE):
+        self.w3 = w3
+        self.multicall = multicall or Multicall(w3)
+        # 验证调用按节点的gas上限拆分批次，不与元数据读取共用500个子调用一批的multicall
+        self.validate_multicall = Multicall(w3, batch_size=gas_capped_batch_size(VALIDATE_CALL_GAS_LIMIT),
+                                            call_gas_limit=VALIDATE_CALL_GAS_LIMIT)
+        self.retry_multicall = Multicall(w3, batch_size=gas_capped_batch_size(TOKEN_VALIDATE_GAS_LIMIT),
+                                         call_gas_limit=TOKEN_VALIDATE_GAS_LIMIT)
+        self.base_tokens = [Web3.to_checksum_address(t) for t in (base_tokens or BASE_TOKENS)]
+        self.amount_to_borrow = amount_to_borrow
+        self.chunk_size = chunk_size
+        self.validator = w3.eth.contract(address=Web3.to_checksum_address(TOKEN_VALIDATOR_ADDRESS),
+                                         abi=TOKEN_VALIDATOR_ABI)
+        self.erc20 = w3.eth.contract(abi=ERC20_ABI)
+        self.verdicts: Dict[str, Dict] = get_state_store().load_token_verdicts()
+        # TokenValidator调用失败的代币 {address: 下次重试时间}，只保存在进程内
+        self.unverified: Dict[str, float] = {}
+
+    def validate(self, tokens: List[str], refresh: bool = False) -> Dict[str, Dict]:
+        """验证多个代币，返回 {address: 验证结果}，本次无法验证的代币不在结果中
+
+        验证结果: {"verdict", "status", "reason", "checked_at"}，新验证的代币还包含
+        name、symbol、decimals、total_supply，可直接用于记录代币信息
+        """
+        tokens = list(dict.fromkeys(Web3.to_checksum_address(t) for t in tokens))
+        missing = [t for t in tokens if refresh or (t not in self.verdicts and not self.retry_pending(t))]
+        if missing:
+            self.verdicts.update(self.check(missing))
+        return {t: self.verdicts[t] for t in tokens if t in self.verdicts}
+
+    def check(self, tokens: List[str]) -> Dict[str, Dict]:
+        """实际发起验证请求并保存结果"""
+        calls = []
+        for token in tokens:
+            calls.extend([
+                bind_call(self.erc20.functions.name(), token),
+                bind_call(self.erc20.functions.symbol(), token),
+                bind_call(self.erc20.functions.decimals(), token),
+                bind_call(self.erc20.functions.totalSupply(), token),
+            ])
+        block_number, results = self.multicall.aggregate(calls)
+
+        # 闪电兑换消耗的gas远高于元数据读取，单独按节点的gas上限分批，并固定在同一个区块
+        chunks = [tokens[i:i + self.chunk_size] for i in range(0, len(tokens), self.chunk_size)]
+        _, chunk_results = self.validate_multicall.aggregate([
+            self.validator.functions.batchValidate(chunk, self.base_tokens, self.amount_to_borrow) for chunk in chunks
+        ], block_identifier=block_number)
+
+        statuses: Dict[str, Optional[int]] = {}
+        failed = []
+        for chunk, result in zip(chunks, chunk_results):
+            if result is None or len(result) != len(chunk):
+                failed.extend(chunk)
+            else:
+                statuses.update(zip(chunk, result))
+        # 整批失败时逐个重试，避免一个异常代币影响同批的其他代币
+        if failed:
+            _, retried = self.retry_multicall.aggregate([
+                self.validator.functions.validate(token, self.base_tokens, self.amount_to_borrow) for token in failed
+            ], block_identifier=block_number)
+            statuses.update(zip(failed, retried))
+
+        checked_at = datetime.now().strftime(TIME_FORMAT)
+        verdicts = {}
+        for index, token in enumerate(tokens):
+            name, symbol, decimals, total_supply = results[4 * index:4 * index + 4]
+            status = statuses.get(token)
+            reason = check_metadata(name, symbol, decimals, total_supply)
+            if reason:
+                verdict = VERDICT_BAD_METADATA
+            elif status is None:
+                # TokenValidator调用失败（节点错误、gas不足或代币本身回滚）时不保存结果，
+                # 在UNVERIFIED_RETRY_SECONDS之后再重试，避免每次出现都重新请求
+                self.unverified[token] = time.time() + UNVERIFIED_RETRY_SECONDS
+                continue
+            else:
+                verdict = VALIDATOR_STATUS.get(status, VERDICT_OK)
+            self.unverified.pop(token, None)
+            verdicts[token] = {
+                "verdict": verdict,
+                "status": status,
+                "reason": reason,
+                "checked_at": checked_at,
+                "name": name,
+                "symbol": symbol,
+                "decimals": decimals,
+                "total_supply": total_supply,
+            }
+
+        get_state_store().upsert_token_verdicts(verdicts)
+        return verdicts
+
+    def retry_pending(self, token: str) -> bool:
+        """代币最近验证失败、尚未到重试时间"""
+        retry_at = self.unverified.get(token)
+        if retry_at is None:
+            return False
+        if time.time() >= retry_at:
+            del self.unverified[token]
+            return False
+        return True
+
+    def is_valid(self, token: str) -> bool:
+        """代币是否通过验证（未验证的代币会先验证，仍无法验证时返回False）"""
+        verdict = self.validate([token]).get(Web3.to_checksum_address(token))
+        return verdict is not None and verdict["verdict"] == VERDICT_OK
+
+    def filter_valid(self, tokens: List[str]) -> List[str]:
+        """返回通过验证的代币"""
+        verdicts = self.validate(tokens)
+        return [t for t, v in verdicts.items() if v["verdict"] == VERDICT_OK]
+
+def load_rejected_tokens() -> Dict[str, Dict]:
+    """读取状态库中未通过验证的代币 {address: 验证结果}，不发起网络请求"""
+    return {address: verdict for address, verdict in get_state_store().load_token_verdicts().items()
+            if verdict["verdict"] != VERDICT_OK}
+
+# 进程内共享的验证器
+token_validator: TokenValidator = None
+
+def get_token_validator(w3: Web3 = None) -> TokenValidator:
+    global token_validator
+    if token_validator is None:
+        token_validator = TokenValidator(w3 or get_web3())
+    return token_validator
+
+def main():
+    parser = argparse.ArgumentParser(description='批量验证代币，识别转账收费、转账失败和元数据异常的代币')
+    parser.add_argument('tokens', nargs='*', help='代币地址，默认验证状态库中的全部代币')
+    parser.add_argument('--refresh', action='store_true', help='忽略已缓存的验证结果重新验证')
+    parser.add_argument('--prune', action='store_true', help='取消包含未通过验证代币的池子的已知标记，并重新导出known_pools.json')
+    args = parser.parse_args()
+
+    store = get_state_store()
+    tokens = args.tokens or list(store.load_tokens())
+    validator = TokenValidator(get_web3())
+
+    started = time.perf_counter()
+    verdicts = validator.validate(tokens, refresh=args.refresh)
+    print(f"已验证 {len(verdicts)}/{len(tokens)} 个代币，耗时 {time.perf_counter() - started:.2f} 秒")
+    if len(verdicts) < len(tokens):
+        print(f"{len(tokens) - len(verdicts)} 个代币的TokenValidator调用失败，未保存结果，下次运行时重试")
+
+    counts = {}
+    for address, verdict in verdicts.items():
+        counts[verdict["verdict"]] = counts.get(verdict["verdict"], 0) + 1
+        if verdict["verdict"] != VERDICT_OK:
+            print(f"{address}: {verdict['verdict']} {verdict.get('reason') or ''}")
+    print(f"验证结果: {counts}")
+
+    if args.prune:
+        rejected = [address for address, verdict in verdicts.items() if verdict["verdict"] != VERDICT_OK]
+        changed = store.unmark_known_pools(rejected)
+        store.export_known_pools_json()
+        print(f"已从已知池子中移除 {changed} 个包含异常代币的池子")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from decimal import Decimal
+from typing import Dict, List
+from web3 import Web3
+from multicall import Multicall
+
+# 原生BNB使用的占位地址
+NATIVE_TOKEN = "0x0000000000000000000000000000000000000000"
+
+# 单次multicall包含的子调用数量，500个代币×10个钱包约两次请求
+SNAPSHOT_BATCH_SIZE = 3000
+
+# ERC20 ABI - 只包含查询余额需要的函数
+ERC20_ABI = [
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    }
+]
+
+# 代币精度缓存（精度不会变化）
+token_decimals_cache: Dict[str, int] = {NATIVE_TOKEN: 18}
+
+def get_portfolio_snapshot(
+    w3: Web3,
+    wallets: List[str],
+    tokens: List[str],
+    block_identifier="latest",
+    batch_size: int = SNAPSHOT_BATCH_SIZE
+) -> Dict:
+    """在同一区块查询多个钱包的多个代币余额
+
+    所有balanceOf、decimals和BNB余额(getEthBalance)打包到multicall中，多批次请求固定在同一区块
+
+    Args:
+        w3: Web3实例
+        wallets: 钱包地址列表
+        tokens: 代币地址列表，NATIVE_TOKEN表示BNB
+        block_identifier: 查询的区块，默认最新区块
+        batch_size: 单次multicall的子调用数量
+
+    Returns:
+        dict: {
+            'block_number': 查询所在区块,
+            'decimals': {token_address: 精度},
+            'balances': {wallet_address: {token_address: 余额(Decimal)}}
+        }
+        查询失败的代币余额为None
+    """
+    multicall = Multicall(w3, batch_size=batch_size)
+    wallets = [Web3.to_checksum_address(w) for w in wallets]
+    tokens = [Web3.to_checksum_address(t) for t in tokens]
+    contracts = {t: w3.eth.contract(address=t, abi=ERC20_ABI) for t in tokens if t != NATIVE_TOKEN}
+
+    # 只查询尚未缓存的代币精度
+    missing_decimals = [t for t in contracts if t not in token_decimals_cache]
+    calls = [contracts[t].functions.decimals() for t in missing_decimals]
+
+    # 余额查询：原生BNB使用getEthBalance，其余使用balanceOf
+    balance_keys = []
+    for wallet in wallets:
+        for token in tokens:
+            balance_keys.append((wallet, token))
+            if token == NATIVE_TOKEN:
+                calls.append(multicall.get_eth_balance(wallet))
+            else:
+                calls.append(contracts[token].functions.balanceOf(wallet))
+
+    block_number, results = multicall.aggregate(calls, block_identifier=block_identifier)
+
+    for token, decimals in zip(missing_decimals, results[:len(missing_decimals)]):
+        if decimals is not None:
+            token_decimals_cache[token] = decimals
+
+    balances: Dict[str, Dict[str, Decimal]] = {wallet: {} for wallet in wallets}
+    for (wallet, token), balance in zip(balance_keys, results[len(missing_decimals):]):
+        decimals = token_decimals_cache.get(token)
+        if balance is None or decimals is None:
+            balances[wallet][token] = None
+        else:
+            balances[wallet][token] = Decimal(balance) / Decimal(10 ** decimals)
+
+    return {
+        'block_number': block_number,
+        'decimals': {t: token_decimals_cache.get(t) for t in tokens},
+        'balances': balances
+    }